@@ -0,0 +1,79 @@
+"""
+Single command-line entry point for all FootSole programs.
+
+Command Line Arguments:
+    python programs <command> [arguments of the command]
+
+    Commands:
+        log       : log_velostat_sensor_h5.py, log sensor data into an HDF5 file
+        live      : live_view.py, show the pressures of a logger started with --live
+        simulate  : sensor_simulator.py, simulate the insoles on pseudo-terminals (synthetic or replayed frames)
+        peaks     : index_find.py, print/plot the peak indices of a recording
+        sync      : auto_sync.py, detect the sync peaks of recordings (or whole folders) and store them next to them
+        gait      : gait_events.py, detect heel strike, flat foot and toe-off events block by block
+        steps     : step_summary.py, per-step peak pressure, pressure-time integral, contact time and CoP path of many recordings
+        map       : pressure_map.py, centre of pressure and heel/midfoot/forefoot loads of a recording
+        recording : recording.py, convert a recording into the compact schema or print its schema and size
+        raw       : raw_capture.py, convert the raw files of a logger started with --raw into an HDF5 recording
+        frames    : viz_generate_frames.py, generate visualization frames synchronized with a video
+        video     : frames_to_video.py, create a video from generated frames
+
+Usage:
+    Run from any directory (the config/ and images/ paths are resolved from the repository root), e.g.
+        python programs peaks data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 --no_plot
+        python programs frames data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 data/2024-07-25_normal_shoes/nrshoes_left_stone2.MOV
+
+    Each command only imports the module that implements it, and that module imports its heavy dependencies
+    (matplotlib, pandas, cv2, scipy, ...) only when it runs, so e.g. `python programs --help` starts instantly.
+
+    The folder is not an importable package (import programs.recording fails): the modules import each other as
+    top-level modules, so other code puts the programs folder on sys.path (e.g. PYTHONPATH=programs) and imports
+    them by name.
+"""
+
+import importlib
+import os
+import sys
+
+# The programs import each other as top-level modules, also when started with `python -m programs`
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    'log': ('log_velostat_sensor_h5', 'Log sensor data into an HDF5 file.'),
+    'live': ('live_view', 'Show the pressures of a running logger (started with --live) live.'),
+    'simulate': ('sensor_simulator', 'Simulate the insoles on pseudo-terminals for testing the logger.'),
+    'peaks': ('index_find', 'Print/plot the peak indices of a recording.'),
+    'sync': ('auto_sync', 'Detect the sync peaks of recordings and store them next to each recording.'),
+    'gait': ('gait_events', 'Detect gait events of a recording block by block.'),
+    'steps': ('step_summary', 'Summarize every step of many recordings in one table.'),
+    'map': ('pressure_map', 'Compute the centre of pressure and regional loads of a recording.'),
+    'recording': ('recording', 'Convert a recording into the compact schema, or print its schema.'),
+    'raw': ('raw_capture', 'Convert raw capture files (logged with --raw) into an HDF5 recording.'),
+    'frames': ('viz_generate_frames', 'Generate visualization frames (PNG files or a video) synchronized with a video.'),
+    'video': ('frames_to_video', 'Create a video from generated frames.'),
+}
+
+
+def print_help():
+    print("usage: python programs <command> [arguments]\n\ncommands:")
+    for command, (module, description) in COMMANDS.items():
+        print(f"  {command:<10} {description} ({module}.py)")
+    print("\nRun 'python programs <command> --help' for the arguments of a command.")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print_help()
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"Unknown command: {argv[0]}\n")
+        print_help()
+        return 2
+    module = importlib.import_module(COMMANDS[argv[0]][0])
+    sys.argv = [f'programs {argv[0]}'] + argv[1:]
+    return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
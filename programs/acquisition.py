@@ -0,0 +1,298 @@
+"""
+This module splits sensor acquisition into three stages that run on their own threads:
+
+    reader (serial -> raw bytes) -> decoder (raw bytes -> sensor values) -> writer (sensor values -> sink)
+
+The stages are connected by bounded queues, so a slow disk write delays the writer only and never the serial
+reads, until the queues are full. Every queue records its fill level and how often and how long a producer had
+to wait for space (backpressure). Readers block on the serial port and the other stages block on their queues,
+so no stage busy-waits. One reader and one decoder run per device, and all devices share one writer, so several
+insoles can be logged by one process. If the sink fails, the writer stops the whole pipeline (stop_event), keeps the
+error in writer.error and counts the frames it drops while the stages shut down; a failing reader or decoder stops
+it the same way. A reader reconnects after serial errors, including the OSError of an unplugged device. Every stage
+passes the stop marker on to the next one when it ends, also when it fails, so stop() always returns. All readers
+timestamp their data with one shared monotonic clock, so the timestamps of different devices can be compared
+directly. An optional publisher (frame_ring.py) receives every decoded block on the decoder thread, before it is
+queued for the writer, so a live view sees frames without waiting for disk writes and can never slow the pipeline
+down.
+
+Usage:
+    The pipeline is used by log_velostat_sensor_h5.py. The sink is any object with a method
+    log_sensor_values(device, timestamps, sensor_values), which is only called from the writer thread.
+
+Example:
+    from acquisition import AcquisitionPipeline
+    pipeline = AcquisitionPipeline({'sensor_left': serial_port}, sink)
+    pipeline.start()
+    ...
+    pipeline.stop()
+"""
+
+import queue
+import threading
+import time
+import numpy as np
+import serial
+from frame_sync import FrameSynchronizer
+from instrumentation import timer, count, enabled, record_ns
+
+RAW_QUEUE_SIZE = 256  # serial reads buffered per device
+FRAME_QUEUE_SIZE = 256  # decoded blocks buffered for the writer
+READ_TIMEOUT = 0.1  # seconds a serial read blocks before the reader checks for a stop request
+RECONNECT_DELAY = 1  # seconds
+
+_STOP = object()  # sentinel that shuts a stage down after the queued items are processed
+
+
+class SessionClock:
+    """
+    A monotonic clock shared by all devices of a session, expressed as Unix time in nanoseconds.
+
+    The wall-clock time is read once at the start; afterwards only the monotonic clock is used, so the
+    timestamps of all devices never jump (e.g. on NTP adjustments) and stay comparable.
+    """
+
+    def __init__(self):
+        self.origin_wall_ns = time.time_ns()
+        self.origin_monotonic_ns = time.monotonic_ns()
+
+    def now_ns(self):
+        return self.origin_wall_ns + (time.monotonic_ns() - self.origin_monotonic_ns)
+
+    def as_dict(self):
+        return {'clock': 'monotonic', 'clock_origin_ns': self.origin_wall_ns}
+
+
+class MeteredQueue(queue.Queue):
+    """
+    A bounded queue that records its high-water mark and the time producers spent waiting for space.
+    """
+
+    def __init__(self, name, maxsize):
+        super().__init__(maxsize)
+        self.name = name
+        self.items = 0
+        self.max_depth = 0
+        self.blocked_puts = 0
+        self.blocked_time = 0.0
+
+    def put(self, item, block=True, timeout=None):
+        try:
+            super().put(item, block=False)
+        except queue.Full:
+            if not block:
+                raise
+            start = time.monotonic()
+            super().put(item, timeout=timeout)
+            self.blocked_puts += 1
+            self.blocked_time += time.monotonic() - start
+        self.items += 1
+        self.max_depth = max(self.max_depth, self.qsize())
+
+    def as_dict(self):
+        return {
+            f'{self.name}_max_depth': self.max_depth,
+            f'{self.name}_blocked_puts': self.blocked_puts,
+            f'{self.name}_blocked_time': self.blocked_time,
+        }
+
+    def summary(self):
+        return (f"{self.name}: {self.qsize()}/{self.maxsize} queued (max {self.max_depth}), "
+                f"{self.blocked_puts} blocked puts ({self.blocked_time:.3f} s)")
+
+
+class SerialReader(threading.Thread):
+    def __init__(self, device, ser, raw_queue, stop_event, clock):
+        super().__init__(name=f'{device}-reader', daemon=True)
+        self.device = device
+        self.ser = ser
+        self.raw_queue = raw_queue
+        self.stop_event = stop_event
+        self.clock = clock
+        self.error = None
+
+    def run(self):
+        # The decoder always gets the stop marker, also if this thread fails, so stop() never waits forever
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    # Blocks until at least one byte arrived or the read timeout expired
+                    waiting = self.ser.in_waiting
+                    start = time.perf_counter_ns() if enabled() else None
+                    data = self.ser.read(max(1, waiting))
+                except (serial.SerialException, OSError) as e:
+                    # e.g. an unplugged device: the in_waiting ioctl raises OSError (EIO)
+                    print(f"Serial port error on {self.device}: {e}")
+                    self.reconnect()
+                    continue
+                if start is not None:
+                    # Only reads of bytes that had already arrived measure the read cost; a read of an empty input
+                    # buffer mostly waits for the device (or the timeout) and is recorded as idle time
+                    record_ns('serial_read' if waiting else 'serial_idle', time.perf_counter_ns() - start)
+                if data:
+                    count('serial_bytes', len(data))
+                    self.raw_queue.put((self.clock.now_ns(), data))
+        except Exception as e:
+            print(f"Reader error on {self.device}: {e}; stopping the acquisition.")
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self.raw_queue.put(_STOP)
+
+    def reconnect(self):
+        print(f"Resetting serial connection of {self.device}...")
+        try:
+            self.ser.close()
+        except (serial.SerialException, OSError):
+            pass
+        while not self.stop_event.wait(RECONNECT_DELAY):
+            try:
+                self.ser.open()
+                print(f"Serial connection of {self.device} re-established on {self.ser.port}.")
+                return
+            except (serial.SerialException, OSError) as e:
+                print(f"Failed to reopen serial port: {e}")
+
+
+class FrameDecoder(threading.Thread):
+    def __init__(self, device, raw_queue, frame_queue, stop_event, publisher=None):
+        super().__init__(name=f'{device}-decoder', daemon=True)
+        self.device = device
+        self.raw_queue = raw_queue
+        self.frame_queue = frame_queue
+        self.stop_event = stop_event
+        self.publisher = publisher
+        self.sync = FrameSynchronizer()
+        self.error = None
+
+    def run(self):
+        # The writer always gets the stop marker, also if this thread fails, so stop() never waits forever
+        try:
+            item = self.raw_queue.get()
+            while item is not _STOP:
+                if self.error is None:
+                    try:
+                        self.decode(*item)
+                    except Exception as e:
+                        # Stop the session; the raw queue is still drained so the reader never blocks on it
+                        print(f"Decoder error on {self.device}: {e}; stopping the acquisition.")
+                        self.error = e
+                        self.stop_event.set()
+                item = self.raw_queue.get()
+        finally:
+            self.frame_queue.put(_STOP)
+
+    def decode(self, timestamp, data):
+        with timer('decode'):
+            sensor_values = self.sync.feed(data)
+        if len(sensor_values):
+            count('frames_decoded', len(sensor_values))
+            # All frames of one serial read share the receive time of that read
+            timestamps = np.full(len(sensor_values), timestamp, dtype=np.int64)
+            if self.publisher is not None:
+                self.publisher.publish(self.device, timestamps, sensor_values)
+            self.frame_queue.put((self.device, timestamps, sensor_values))
+
+
+class SinkWriter(threading.Thread):
+    def __init__(self, frame_queue, sink, n_producers, stop_event):
+        super().__init__(name='writer', daemon=True)
+        self.frame_queue = frame_queue
+        self.sink = sink
+        self.n_producers = n_producers
+        self.stop_event = stop_event
+        self.error = None
+        self.dropped_frames = {}  # device -> frames received after the sink failed
+
+    def run(self):
+        remaining = self.n_producers
+        while remaining:
+            item = self.frame_queue.get()
+            if item is _STOP:
+                remaining -= 1
+                continue
+            if self.error is None:
+                try:
+                    with timer('write'):
+                        self.sink.log_sensor_values(*item)
+                    continue
+                except Exception as e:
+                    # Stop the session; the queue is still drained so the decoders never block on a failed writer
+                    print(f"Writer error: {e}; stopping the acquisition.")
+                    self.error = e
+                    self.stop_event.set()
+            device, timestamps, _ = item
+            self.dropped_frames[device] = self.dropped_frames.get(device, 0) + len(timestamps)
+
+
+class AcquisitionPipeline:
+    def __init__(self, devices, sink, raw_queue_size=RAW_QUEUE_SIZE, frame_queue_size=FRAME_QUEUE_SIZE, clock=None,
+                 publisher=None):
+        """
+        Args:
+            devices (dict): Device name (e.g. 'sensor_left') -> open serial.Serial.
+            sink (object): Receives log_sensor_values(device, timestamps, sensor_values) on the writer thread.
+            raw_queue_size (int): Capacity of each reader -> decoder queue.
+            frame_queue_size (int): Capacity of the shared decoder -> writer queue.
+            clock (SessionClock): Clock shared by all readers. A new one is created if None.
+            publisher (object): Optional, receives publish(device, timestamps, sensor_values) on the decoder threads;
+                it must not block (e.g. frame_ring.RingPublisher).
+        """
+        self.clock = SessionClock() if clock is None else clock
+        self.stop_event = threading.Event()
+        self.frame_queue = MeteredQueue('frame_queue', frame_queue_size)
+        self.raw_queues = {}
+        self.readers = []
+        self.decoders = {}
+        for device, ser in devices.items():
+            ser.timeout = READ_TIMEOUT
+            raw_queue = MeteredQueue('raw_queue', raw_queue_size)
+            self.raw_queues[device] = raw_queue
+            self.readers.append(SerialReader(device, ser, raw_queue, self.stop_event, self.clock))
+            self.decoders[device] = FrameDecoder(device, raw_queue, self.frame_queue, self.stop_event, publisher)
+        self.writer = SinkWriter(self.frame_queue, sink, len(self.decoders), self.stop_event)
+
+    def start(self):
+        self.writer.start()
+        for thread in list(self.decoders.values()) + self.readers:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop reading and wait until every byte already read has been decoded and written.
+        """
+        self.stop_event.set()
+        for thread in self.readers + list(self.decoders.values()) + [self.writer]:
+            thread.join()
+
+    @property
+    def error(self):
+        """
+        The exception that stopped the acquisition (a failed reader, decoder or sink), or None.
+        """
+        errors = [reader.error for reader in self.readers] + [decoder.error for decoder in self.decoders.values()]
+        errors.append(self.writer.error)
+        return next((error for error in errors if error is not None), None)
+
+    def stream_stats(self, device):
+        return self.decoders[device].sync.stats
+
+    def backpressure(self, device):
+        """
+        Returns:
+            dict: Queue metrics of the given device's raw queue and the shared frame queue, and the frames of the
+            device dropped after the sink failed.
+        """
+        return {**self.raw_queues[device].as_dict(), **self.frame_queue.as_dict(),
+                'writer_dropped_frames': self.writer.dropped_frames.get(device, 0)}
+
+    def summary(self):
+        lines = [f"{device}: {decoder.sync.stats.summary()}; {self.raw_queues[device].summary()}"
+                 for device, decoder in self.decoders.items()]
+        lines.append(self.frame_queue.summary())
+        lines += [f"{stage.name} failed ({stage.error})" for stage in self.readers + list(self.decoders.values())
+                  if stage.error is not None]
+        if self.writer.error is not None:
+            dropped = ', '.join(f"{device} {n}" for device, n in self.writer.dropped_frames.items()) or 'none'
+            lines.append(f"writer failed ({self.writer.error}); frames dropped since: {dropped}")
+        return '\n'.join(lines)
@@ -0,0 +1,269 @@
+"""
+This script synchronizes recordings with their walking videos automatically, replacing the manual index_find.py step.
+
+The walking video and the collected data start and end at a flat-foot peak (see index_find.py). This script finds
+the first and last peak of the low-pass filtered average pressure and stores them as index_start / index_end in a
+sidecar file next to the recording (recording.h5 -> recording.sync.json). viz_generate_frames.py reads the sidecar,
+so no indices have to be copied into the code. Optionally, the matching events in the video are detected from the
+frame-difference motion energy. Every stance phase of a step is a short minimum of motion, so, like the sensor events
+must exceed PEAK_HEIGHT, a video event must be a sustained rest: at least REST_MIN_S seconds with the motion below
+REST_THRESHOLD times the median motion of the video. The first and last rest are the sync events. The sidecar stores
+a confidence (0-1) of the video events; viz_generate_frames.py ignores video events below MIN_CONFIDENCE.
+
+Command Line Arguments:
+    paths : HDF5 recordings and/or folders; folders are searched recursively for *.h5 files (batch mode).
+    --video : Also detect the sync events in the video with the same name as each recording (e.g. .MOV, .mp4).
+    --overwrite : Recompute recordings that already have a sidecar file.
+    --dry_run : Only print the detected indices, do not write sidecar files.
+
+Usage:
+    python auto_sync.py data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5
+    python auto_sync.py data --video
+
+    The sidecar is plain JSON and can be edited by hand if a detection is wrong:
+    {"dataset": "sensor_left", "peaks": [27, 70, 110, 151], "index_start": 27, "index_end": 151, ...,
+     "video": {"start_frame": 35, "end_frame": 912, "confidence": 0.87, ...}}
+    Set the confidence to 1 after correcting or checking the video frames by hand.
+"""
+
+import argparse
+import glob
+import json
+import os
+
+SYNC_SUFFIX = '.sync.json'
+VIDEO_EXTENSIONS = ('.MOV', '.mov', '.mp4', '.MP4', '.avi')
+PEAK_HEIGHT = 25  # minimum filtered average sensor value of a flat-foot peak, as in index_find.py
+CUTOFF_HZ = 1.5  # low-pass cut-off of the average pressure
+SAMPLE_RATE_HZ = 21  # sample rate assumed by the filter, as in index_find.py
+MOTION_WIDTH = 160  # width in pixels the video is scaled to for the motion energy
+MOTION_SMOOTHING_S = 0.2  # moving average window of the motion energy
+REST_MIN_S = 0.5  # a video sync event is a rest at least this long, longer than the stance phase of a step
+REST_THRESHOLD = 0.2  # the video is at rest while its motion is below this fraction of its median motion
+MIN_CONFIDENCE = 0.5  # video events with a lower confidence are not used by viz_generate_frames.py
+
+
+def sync_path(recording_path):
+    return os.path.splitext(recording_path)[0] + SYNC_SUFFIX
+
+
+def read_sync(recording_path):
+    """
+    Returns:
+        dict: The sync sidecar of a recording, or None if it has not been synchronized.
+    """
+    path = sync_path(recording_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_sync(recording_path, sync):
+    with open(sync_path(recording_path), 'w') as f:
+        json.dump(sync, f, indent=2)
+
+
+def find_sync_peaks(sensor_values):
+    """
+    Find the flat-foot peaks of the low-pass filtered average pressure, exactly like index_find.py.
+
+    Args:
+        sensor_values (numpy.ndarray): (N, 208) raw sensor values.
+
+    Returns:
+        numpy.ndarray: Row indices of the peaks.
+    """
+    import numpy as np
+    from scipy.signal import find_peaks
+    from index_find import butter_lowpass_filter
+
+    filtered_data = butter_lowpass_filter(np.mean(sensor_values, axis=1), cutoff=CUTOFF_HZ, fs=SAMPLE_RATE_HZ, order=5)
+    peaks, _ = find_peaks(filtered_data, height=PEAK_HEIGHT)
+    return peaks
+
+
+def detect_sensor_sync(timestamps, sensor_values):
+    """
+    Returns:
+        dict: peaks, index_start and index_end (first and last peak) and their timestamps in ns.
+
+    Raises:
+        ValueError: If fewer than two peaks are found.
+    """
+    peaks = find_sync_peaks(sensor_values)
+    if len(peaks) < 2:
+        raise ValueError(f"Found {len(peaks)} flat-foot peaks, at least two are needed to synchronize.")
+    index_start, index_end = int(peaks[0]), int(peaks[-1])
+    return {
+        'peaks': [int(peak) for peak in peaks],
+        'index_start': index_start,
+        'index_end': index_end,
+        'start_time_ns': int(timestamps[index_start]),
+        'end_time_ns': int(timestamps[index_end]),
+    }
+
+
+def motion_energy(video_path, width=MOTION_WIDTH):
+    """
+    Returns:
+        tuple: (energy, fps) with the mean absolute difference of each downscaled grayscale frame to the previous
+        one (0 for the first frame) and the frame rate of the video.
+    """
+    import cv2
+    import numpy as np
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {video_path}.")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    energy = []
+    previous = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        gray = cv2.cvtColor(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        gray = gray.astype(np.int16)
+        energy.append(0.0 if previous is None else float(np.mean(np.abs(gray - previous))))
+        previous = gray
+    cap.release()
+    return np.array(energy), fps
+
+
+def rest_periods(energy, fps):
+    """
+    Find the sustained rests of a video.
+
+    Args:
+        energy (numpy.ndarray): Motion energy of every frame (see motion_energy).
+        fps (float): Frame rate of the video.
+
+    Returns:
+        list: (start, stop, confidence) of every rest of at least REST_MIN_S seconds, in frames. The confidence is
+        1 for a motionless rest of twice the minimum length and lower for shorter or less still ones.
+    """
+    import numpy as np
+
+    if len(energy) < 2:
+        return []
+    energy = energy.copy()
+    energy[0] = energy[1]  # the first frame has no previous frame to differ from
+    window = max(1, round(MOTION_SMOOTHING_S * (fps or 30)))
+    # Padded with the edge values, so the ends of the video do not look like rests
+    padded = np.pad(energy, (window // 2, window - 1 - window // 2), mode='edge')
+    smoothed = np.convolve(padded, np.ones(window) / window, mode='valid')
+    median = np.median(smoothed)
+    if median <= 0:
+        return []
+    at_rest = np.concatenate([[0], (smoothed < REST_THRESHOLD * median).astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(at_rest))
+    min_frames = max(1, round(REST_MIN_S * (fps or 30)))
+    rests = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        if stop - start >= min_frames:
+            stillness = 1 - smoothed[start:stop].mean() / (REST_THRESHOLD * median)
+            confidence = stillness * min(1.0, (stop - start) / (2 * min_frames))
+            rests.append((int(start), int(stop), round(float(confidence), 2)))
+    return rests
+
+
+def detect_video_sync(video_path):
+    """
+    Find the first and last sustained rest in the video, which match the first and last flat-foot peak.
+
+    Returns:
+        dict: video path, rests (start and stop frame of every rest), start_frame and end_frame (the middle of the
+        first and last rest) and the confidence of the weaker of the two events.
+
+    Raises:
+        ValueError: If fewer than two rests are found.
+    """
+    energy, fps = motion_energy(video_path)
+    rests = rest_periods(energy, fps)
+    if len(rests) < 2:
+        raise ValueError(f"Found {len(rests)} rests of at least {REST_MIN_S} s in {video_path}, "
+                         f"at least two are needed to synchronize.")
+    first, last = rests[0], rests[-1]
+    return {
+        'path': os.path.basename(video_path),
+        'rests': [[start, stop] for start, stop, _ in rests],
+        'start_frame': (first[0] + first[1]) // 2,
+        'end_frame': (last[0] + last[1]) // 2,
+        'confidence': min(first[2], last[2]),
+    }
+
+
+def find_video(recording_path):
+    stem = os.path.splitext(recording_path)[0]
+    for extension in VIDEO_EXTENSIONS:
+        if os.path.exists(stem + extension):
+            return stem + extension
+    return None
+
+
+def sync_recording(recording_path, video_path=None):
+    """
+    Detect the sync points of a recording (and optionally of its video).
+
+    Returns:
+        dict: The content of the sync sidecar.
+    """
+    import h5py
+    from recording import sensor_recordings
+
+    with h5py.File(recording_path, 'r') as file:
+        # The first foot defines the timeline, as in viz_generate_frames.py
+        recording = sensor_recordings(file)[0]
+        sync = {'dataset': recording.name}
+        sync.update(detect_sensor_sync(recording.timestamps, recording.view().values()))
+    if video_path:
+        sync['video'] = detect_video_sync(video_path)
+    return sync
+
+
+def recording_paths(paths):
+    recordings = []
+    for path in paths:
+        if os.path.isdir(path):
+            recordings.extend(sorted(glob.glob(os.path.join(path, '**', '*.h5'), recursive=True)))
+        else:
+            recordings.append(path)
+    return recordings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect the sync peaks of recordings and store them next to each recording.')
+    parser.add_argument('paths', nargs='+', help='HDF5 recordings or folders containing recordings.')
+    parser.add_argument('--video', action='store_true', help='Also detect the sync events in the matching video.')
+    parser.add_argument('--overwrite', action='store_true', help='Recompute recordings that already have a sidecar file.')
+    parser.add_argument('--dry_run', action='store_true', help='Only print the detected indices.')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for recording_path in recording_paths(args.paths):
+        if not args.overwrite and not args.dry_run and read_sync(recording_path) is not None:
+            print(f"{recording_path}: already synchronized, skipped")
+            continue
+        video_path = find_video(recording_path) if args.video else None
+        if args.video and video_path is None:
+            print(f"{recording_path}: no matching video found, only the sensor data is synchronized")
+        try:
+            sync = sync_recording(recording_path, video_path)
+        except ValueError as e:
+            print(f"{recording_path}: {e}")
+            failed += 1
+            continue
+        message = f"{recording_path}: index_start {sync['index_start']}, index_end {sync['index_end']}"
+        if 'video' in sync:
+            message += (f", video frames {sync['video']['start_frame']}-{sync['video']['end_frame']} "
+                        f"(confidence {sync['video']['confidence']:.2f})")
+        print(message)
+        if not args.dry_run:
+            write_sync(recording_path, sync)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+"""
+This script compares the pressure conversion of lookup_pressure (scipy interp1d) with the lookup-table based
+PressureCalibration on a synthetic multi-hour recording.
+
+Command Line Arguments:
+    --hours : Length of the synthetic recording in hours (default 1).
+    --rate : Frame rate of the synthetic recording in Hz (default 20).
+
+Usage:
+    python benchmark_calibration.py --hours 3
+
+    Both variants convert the same (N, 208) block of raw sensor values (stored as float64, like the HDF5 files
+    written by log_velostat_sensor_h5.py) and the converted values/second of each variant are printed.
+"""
+
+import argparse
+import time
+import numpy as np
+from velostat_sensor_to_pressure import lookup_pressure, DEFAULT_CALIBRATION, N_SENSORS
+
+
+def run(name, function, sensor_values):
+    start = time.perf_counter()
+    result = function(sensor_values)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {sensor_values.size:,} values in {elapsed:.3f} s -> {sensor_values.size / elapsed:,.0f} values/s, "
+          f"output {result.nbytes / 1e6:,.0f} MB")
+    return elapsed, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark interp1d against lookup-table pressure conversion.')
+    parser.add_argument('--hours', type=float, default=1, help='Length of the synthetic recording in hours')
+    parser.add_argument('--rate', type=float, default=20, help='Frame rate of the synthetic recording in Hz')
+    args = parser.parse_args()
+
+    n_frames = int(args.hours * 3600 * args.rate)
+    sensor_values = np.random.default_rng(0).integers(0, 256, size=(n_frames, N_SENSORS)).astype('float64')
+
+    before, expected = run('interp1d', lookup_pressure, sensor_values)
+    after, result = run('lookup', DEFAULT_CALIBRATION.convert, sensor_values)
+    after_uint8, _ = run('lookup uint8', DEFAULT_CALIBRATION.convert, sensor_values.astype(np.uint8))
+    print(f"Max difference: {np.abs(expected - result).max():.4f} Pa")
+    print(f"Speedup: {before / after:.1f}x (float64 input), {before / after_uint8:.1f}x (uint8 input)")
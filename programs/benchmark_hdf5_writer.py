@@ -0,0 +1,72 @@
+"""
+This script compares the HDF5 write throughput of the old per-packet logging with the buffered writer.
+
+Command Line Arguments:
+    --rows : Number of synthetic packets to replay (default 20000).
+    --flush_rows : Buffer size of the buffered writer (default 1024).
+    --compression : Optional compression filter for the buffered writer, 'gzip' or 'lzf'.
+
+Usage:
+    python benchmark_hdf5_writer.py --rows 50000
+
+    Both variants write the same synthetic rows (nanosecond timestamp + 208 sensor values) into a temporary
+    file, and the rows/second of each variant are printed.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import h5py
+import numpy as np
+from hdf5_writer import BufferedH5Writer, COMPRESSION_FILTERS
+
+
+def synthetic_rows(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.empty((n_rows, 209), dtype='float64')
+    rows[:, 0] = time.time_ns() + np.arange(n_rows) * 50_000_000  # ~20 Hz packet rate
+    rows[:, 1:] = rng.integers(0, 256, size=(n_rows, 208))
+    return rows
+
+
+def write_per_packet(path, rows):
+    # The logging strategy used before the buffered writer: one resize and one write per packet
+    with h5py.File(path, 'w') as hdf5:
+        ds = hdf5.create_dataset('sensor_left', shape=(0, 209), maxshape=(None, 209), dtype='float64')
+        for row in rows:
+            ds.resize(ds.shape[0] + 1, axis=0)
+            ds[-1:] = row[np.newaxis]
+
+
+def write_buffered(path, rows, flush_rows, compression):
+    with h5py.File(path, 'w') as hdf5:
+        writer = BufferedH5Writer(hdf5, 'sensor_left', flush_rows=flush_rows, flush_interval=0, compression=compression)
+        for row in rows:
+            writer.append(row)
+        writer.close()
+
+
+def run(name, function, *args):
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    n_rows = len(args[1])
+    print(f"{name:<12} {n_rows} rows in {elapsed:.3f} s -> {n_rows / elapsed:,.0f} rows/s")
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-packet against buffered HDF5 logging.')
+    parser.add_argument('--rows', type=int, default=20000, help='Number of synthetic packets to replay')
+    parser.add_argument('--flush_rows', type=int, default=1024, help='Buffer size of the buffered writer')
+    parser.add_argument('--compression', choices=COMPRESSION_FILTERS, default=None, help='Compression filter of the buffered writer')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        before = run('per-packet', write_per_packet, os.path.join(tmp_dir, 'per_packet.h5'), rows)
+        after = run('buffered', write_buffered, os.path.join(tmp_dir, 'buffered.h5'), rows, args.flush_rows, args.compression)
+        with h5py.File(os.path.join(tmp_dir, 'buffered.h5'), 'r') as hdf5:
+            assert np.array_equal(hdf5['sensor_left'][:], rows)
+    print(f"Speedup: {before / after:.1f}x")
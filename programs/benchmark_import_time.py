@@ -0,0 +1,89 @@
+"""
+This script guards the start-up time of the command-line programs.
+
+Every module is imported in a fresh interpreter with `python -X importtime`. The script reports the cumulative
+import time of each module, fails if a module exceeds its budget, and fails if a module pulls in a heavy
+dependency (matplotlib, pandas, cv2, scipy, moviepy) at import time.
+
+Command Line Arguments:
+    --scale : Multiply all budgets by this factor, e.g. on a slow laptop (default 1.0).
+
+Usage:
+    python benchmark_import_time.py
+
+    The exit code is 1 if any module is over budget or imports a heavy dependency.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROGRAMS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Import-time budgets in milliseconds
+BUDGETS_MS = {
+    'index_find': 50,
+    'auto_sync': 50,
+    'viz_generate_frames': 50,
+    'frames_to_video': 50,
+    'instrumentation': 50,  # standard library only, imported by every hot path
+    'video_source': 50,  # standard library only, cv2 is imported when a video is opened
+    'velostat_sensor_to_pressure': 300,  # numpy only
+    'step_summary': 300,  # numpy only
+    'pressure_map': 300,  # numpy only, scipy is imported when the weights are computed
+    'gait_events': 300,  # numpy only, scipy is imported by the detector
+    'live_view': 300,  # numpy only, matplotlib is imported when the window opens
+    'frame_ring': 300,  # numpy only, imported by the logger with --live
+    'sensor_simulator': 300,  # numpy only
+    'raw_capture': 300,  # numpy only, h5py is imported by the converter
+    'recording': 600,  # numpy and h5py
+    'log_velostat_sensor_h5': 600,  # numpy, h5py and pyserial are needed to log at all
+}
+
+HEAVY_MODULES = ('matplotlib', 'pandas', 'cv2', 'scipy', 'moviepy')
+
+
+def import_time(module):
+    """
+    Returns:
+        tuple: (cumulative import time of the module in ms, set of all imported top-level packages)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=PROGRAMS_DIR,
+                            capture_output=True, text=True, check=True)
+    cumulative_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        imported.add(name.split('.')[0])
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1e3, imported
+
+
+def cli_help_time():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, PROGRAMS_DIR, '--help'], capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the import time of the command-line programs.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply all budgets by this factor')
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        elapsed, imported = import_time(module)
+        heavy = sorted(imported.intersection(HEAVY_MODULES))
+        over = elapsed > budget * args.scale
+        failed |= over or bool(heavy)
+        status = 'FAIL' if over or heavy else 'ok'
+        note = f", imports {', '.join(heavy)}" if heavy else ''
+        print(f"{status:<4} {module:<28} {elapsed:7.1f} ms (budget {budget * args.scale:.0f} ms){note}")
+
+    print(f"     python programs --help       {cli_help_time():7.1f} ms wall time (incl. interpreter start-up)")
+    sys.exit(1 if failed else 0)
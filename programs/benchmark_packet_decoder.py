@@ -0,0 +1,69 @@
+"""
+This script compares the frame decoding speed of struct.unpack per packet with the vectorized packet_decoder.
+
+Command Line Arguments:
+    --frames : Number of synthetic frames to decode (default 50000).
+    --error_rate : Fraction of frames with a corrupted checksum (default 0.01).
+
+Usage:
+    python benchmark_packet_decoder.py --frames 100000
+
+    Both variants decode the same synthetic byte stream and the frames/second of each variant are printed.
+"""
+
+import argparse
+import struct
+import time
+import numpy as np
+from packet_decoder import decode_frames, encode_frames, PACKET_SIZE, N_SENSORS
+
+
+def synthetic_stream(n_frames, error_rate, seed=0):
+    rng = np.random.default_rng(seed)
+    stream = bytearray(encode_frames(rng.integers(0, 256, size=(n_frames, N_SENSORS))))
+    # Corrupt one sensor byte in a few frames so that their checksum fails
+    for index in rng.choice(n_frames, size=int(n_frames * error_rate), replace=False):
+        stream[index * PACKET_SIZE + 10] ^= 0xFF
+    return stream
+
+
+def decode_struct(stream):
+    # The per-packet decoding used before packet_decoder: slice, rebuild the buffer, unpack, Python-level sum
+    buffer = bytearray(stream)
+    rows = []
+    while len(buffer) >= PACKET_SIZE:
+        packet = buffer[:PACKET_SIZE]
+        buffer = buffer[PACKET_SIZE:]
+        frame_head, frame_type, frame_length, package_type, *sensor_values, checksum = struct.unpack('<HBHB208BH', packet)
+        if sum(packet[:-2]) & 0xFFFF == checksum:
+            rows.append(sensor_values)
+    return np.array(rows, dtype=np.uint8)
+
+
+def decode_vectorized(stream):
+    buffer = bytearray(stream)
+    sensor_values, valid, n_bytes = decode_frames(buffer)
+    del buffer[:n_bytes]
+    return sensor_values
+
+
+def run(name, function, stream):
+    n_frames = len(stream) // PACKET_SIZE
+    start = time.perf_counter()
+    result = function(stream)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {n_frames} frames in {elapsed:.3f} s -> {n_frames / elapsed:,.0f} frames/s")
+    return elapsed, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark struct-based against vectorized frame decoding.')
+    parser.add_argument('--frames', type=int, default=50000, help='Number of synthetic frames to decode')
+    parser.add_argument('--error_rate', type=float, default=0.01, help='Fraction of frames with a corrupted checksum')
+    args = parser.parse_args()
+
+    stream = synthetic_stream(args.frames, args.error_rate)
+    before, expected = run('struct', decode_struct, stream)
+    after, result = run('vectorized', decode_vectorized, stream)
+    assert np.array_equal(expected, result)
+    print(f"Speedup: {before / after:.1f}x")
@@ -0,0 +1,108 @@
+"""
+This script compares the frame rate of the previous rendering (one scatter per sensor, colours set per point,
+full savefig per frame) with FrameRenderer (one collection per foot, cached background, blitting).
+
+Command Line Arguments:
+    --frames : Number of frames to render with each variant (default 10).
+    --rows : Number of rows of the synthetic reference recording (default 2000, ~100 s at 20 Hz).
+    --both : Render both feet, like a recording logged with --log_both.
+
+Usage:
+    Run from any directory (the config/ and images/ paths are resolved from the repository root):
+        python programs/benchmark_render.py --frames 20
+
+    Both variants render the same synthetic recording and a synthetic 1280x720 video frame into PNG files in a
+    temporary directory, and the frames/second of each variant are printed.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+from matplotlib.gridspec import GridSpec
+from pressure_renderer import FrameRenderer
+from sensor_layout import load_layout
+from velostat_sensor_to_pressure import DEFAULT_CALIBRATION
+
+
+def synthetic_recording(n_rows, n_feet, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = 1_700_000_000_000_000_000 + np.arange(n_rows, dtype=np.int64) * 50_000_000
+    phase = np.sin(2 * np.pi * np.arange(n_rows) / 22)[:, np.newaxis]
+    sensor_values = [DEFAULT_CALIBRATION.convert(np.clip(120 + 100 * phase + rng.normal(0, 10, (n_rows, 208)), 0, 255)) / 1e3
+                     for _ in range(n_feet)]
+    return timestamps, sensor_values
+
+
+def render_per_sensor(timestamps, sensor_values, layouts, video_frame, rows, output_dir):
+    # The rendering used before FrameRenderer: one scatter per sensor, per-point colours and a full savefig
+    fig = plt.figure(figsize=(14.6, 8))
+    gs = GridSpec(2, 11, figure=fig)
+    ax0 = fig.add_subplot(gs[0, :5])
+    ax1 = fig.add_subplot(gs[1, :5])
+    foot_axes = [fig.add_subplot(gs[:, 5:8]), fig.add_subplot(gs[:, 8:11])][:len(sensor_values)]
+    im_video = ax0.imshow(video_frame)
+    ax0.axis('off')
+    for values in sensor_values:
+        ax1.plot(timestamps, np.mean(values, axis=1))
+    vline = ax1.axvline(timestamps[0], color='r')
+    norm = LogNorm(vmin=min(values.min() for values in sensor_values) * 3.0, vmax=65)
+    foot_scatters = []
+    for ax, layout, values in zip(foot_axes, layouts, sensor_values):
+        points_df, image_path, image_height_mm, scatter_size, label = layout
+        image = plt.imread(image_path)
+        ax.imshow(image, extent=[0, image.shape[1] / image.shape[0] * image_height_mm, 0, image_height_mm], alpha=0.2)
+        foot_scatters.append([(ax.scatter(row['X_in_mm'], row['Y_in_mm'], color=plt.cm.jet(norm(values[0, int(row['ID']) - 1])),
+                                          s=scatter_size), int(row['ID']) - 1) for _, row in points_df.iterrows()])
+    plt.colorbar(plt.cm.ScalarMappable(cmap='jet', norm=norm), ax=foot_axes[-1])
+    plt.tight_layout()
+    for frame_number, row in enumerate(rows):
+        im_video.set_data(video_frame)
+        for scatters, values in zip(foot_scatters, sensor_values):
+            for scatter, sensor_id in scatters:
+                scatter.set_facecolor(plt.cm.jet(norm(values[row, sensor_id])))
+                scatter.set_edgecolor(plt.cm.jet(norm(values[row, sensor_id])))
+        vline.set_xdata([timestamps[row], timestamps[row]])
+        plt.savefig(os.path.join(output_dir, f'frame_{frame_number:04d}.png'), dpi=200)
+    plt.close(fig)
+
+
+def render_blitting(timestamps, sensor_values, layouts, video_frame, rows, output_dir):
+    renderer = FrameRenderer(timestamps, sensor_values, layouts, video_frame)
+    for frame_number, row in enumerate(rows):
+        renderer.render(row, video_frame)
+        renderer.save_png(os.path.join(output_dir, f'frame_{frame_number:04d}.png'))
+    renderer.close()
+
+
+def run(name, function, *args):
+    rows = args[4]
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {len(rows)} frames in {elapsed:.2f} s -> {len(rows) / elapsed:.2f} frames/s (incl. figure setup)")
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-sensor scatter rendering against FrameRenderer.')
+    parser.add_argument('--frames', type=int, default=10, help='Number of frames to render with each variant')
+    parser.add_argument('--rows', type=int, default=2000, help='Number of rows of the synthetic recording')
+    parser.add_argument('--both', action='store_true', help='Render both feet')
+    args = parser.parse_args()
+
+    dataset_names = ['sensor_left', 'sensor_right'] if args.both else ['sensor_left']
+    layouts = [load_layout(name) for name in dataset_names]
+    timestamps, sensor_values = synthetic_recording(args.rows, len(dataset_names))
+    video_frame = np.random.default_rng(1).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    rows = np.linspace(0, args.rows - 1, args.frames).astype(int)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        before = run('per-sensor', render_per_sensor, timestamps, sensor_values, layouts, video_frame, rows, tmp_dir)
+        after = run('blitting', render_blitting, timestamps, sensor_values, layouts, video_frame, rows, tmp_dir)
+    print(f"Speedup: {before / after:.1f}x")
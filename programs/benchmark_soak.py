@@ -0,0 +1,205 @@
+"""
+This script measures the throughput and the long-term stability of the logger with simulated devices.
+
+The logger (FootSoleLogger with its acquisition pipeline) reads from pseudo-terminals that sensor_simulator.py
+feeds with synthetic frames, so no controller has to be connected. Two measurements are made:
+
+    ramp : the logger runs for --step_duration seconds at each of the --rates, from the lowest to the highest. For
+           every rate the frames sent, the valid frames received and the loss rate are printed. The ramp stops at the
+           first rate whose loss exceeds --max_loss, and the maximum sustained rate is the last rate before it.
+    soak : with --soak, the logger runs for that many seconds at --soak_rate (e.g. 7200 for two hours). The resident
+           memory is sampled every --sample_interval seconds, and the growth in MB per hour is the slope of a line
+           fitted to the samples after the first tenth of the run (start-up allocations excluded).
+
+The loss rate counts the frames the logger did not receive, except the frames damaged on purpose with --drop_rate or
+--corrupt_rate. Note that the serial line limits a real controller to ~213 frames/s at 460800 baud; higher rates
+show the headroom of the logger itself.
+
+Command Line Arguments:
+    --rates : Frame rates of the ramp in frames per second (default 21 100 250 500 1000 2000).
+    --step_duration : Seconds per rate of the ramp (default 10).
+    --soak : Seconds of the soak run (default 0, no soak run).
+    --soak_rate : Frame rate of the soak run (default 21).
+    --sample_interval : Seconds between memory samples of the soak run (default 10).
+    --log_both : Simulate and log both insoles.
+    --compact : Log in the compact schema (recording.py).
+    --raw : Capture into memory-mapped raw files (raw_capture.py) instead of HDF5.
+    --drop_rate, --corrupt_rate : Faults injected by the simulator (fractions of frames).
+    --max_loss : Loss rate up to which a rate counts as sustained (default 0.001).
+
+Usage:
+    python benchmark_soak.py --rates 21 200 1000 --step_duration 5
+    python benchmark_soak.py --rates --soak 7200 --log_both --compact
+
+    The recordings are written to a temporary folder and deleted afterwards.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from sensor_simulator import SimulatedDevice, FaultInjector, synthetic_gait, open_pty, LOOP_SECONDS
+
+DRAIN_TIMEOUT = 5.0  # seconds to wait for the logger to process the last frames after the simulators stopped
+SETTLE_TIME = 0.5  # the logger has drained when no frame arrived for this long
+
+
+def rss_mb():
+    """
+    Returns:
+        float: Resident memory of this process in MB (the peak where /proc is not available, e.g. on macOS).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if os.uname().sysname == 'Darwin' else peak / 2**10
+
+
+def run_session(rate, duration, args, sample_interval=None):
+    """
+    Log simulated devices at the given rate for duration seconds.
+
+    Returns:
+        dict: Frames sent, received and damaged, overflowed bytes, rows written, loss rate and the memory samples
+        ((seconds, MB) pairs).
+    """
+    from log_velostat_sensor_h5 import FootSoleLogger
+
+    devices = ['sensor_left', 'sensor_right'] if args.log_both else ['sensor_left']
+    stop_event = threading.Event()
+    ptys = {device: open_pty() for device in devices}
+    simulators = []
+    for seed, device in enumerate(devices):
+        values = synthetic_gait(max(1, round(LOOP_SECONDS * rate)), rate, seed)
+        faults = FaultInjector(args.drop_rate, args.corrupt_rate, seed) if args.drop_rate or args.corrupt_rate else None
+        simulators.append(SimulatedDevice(device, ptys[device][0], values, np.arange(len(values)) / rate, stop_event, faults))
+
+    # The logger prints its connection messages and statistics; only the results of the benchmark are shown
+    with contextlib.redirect_stdout(io.StringIO()):
+        logger = FootSoleLogger(use_left_sensor=True, log_both=args.log_both,
+                                ports={device: port for device, (_, _, port) in ptys.items()},
+                                stats_interval=duration, compact=args.compact, raw=args.raw)
+    pipeline = logger.pipeline
+    samples = []
+    try:
+        pipeline.start()
+        for simulator in simulators:
+            simulator.start()
+        start = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - start
+            if sample_interval:
+                samples.append((elapsed, rss_mb()))
+            if elapsed >= duration:
+                break
+            time.sleep(min(sample_interval or duration, duration - elapsed))
+        stop_event.set()
+        for simulator in simulators:
+            simulator.join()
+
+        # Wait until the bytes still in the pseudo-terminals have been logged
+        received = -1
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while time.monotonic() < deadline:
+            total = sum(pipeline.stream_stats(device).valid_frames for device in devices)
+            if total == received:
+                break
+            received = total
+            time.sleep(SETTLE_TIME)
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pipeline.stop()
+            logger.close()
+        for master_fd, slave_fd, _ in ptys.values():
+            os.close(master_fd)
+            os.close(slave_fd)
+        for path in logger.raw_files if args.raw else [logger.hdf5_file]:
+            os.remove(path)
+
+    result = {'sent': 0, 'received': 0, 'damaged': 0, 'overflowed': 0, 'checksum_errors': 0, 'resyncs': 0,
+              'rows_written': 0, 'samples': samples}
+    for simulator in simulators:
+        stats = pipeline.stream_stats(simulator.device)
+        result['sent'] += simulator.frames_sent
+        result['received'] += stats.valid_frames
+        result['damaged'] += simulator.faults.damaged_frames if simulator.faults else 0
+        result['overflowed'] += simulator.bytes_overflowed
+        result['checksum_errors'] += stats.checksum_errors
+        result['resyncs'] += stats.resync_events
+        result['rows_written'] += logger.writers[simulator.device].rows_written
+    expected = result['sent'] - result['damaged']
+    result['loss'] = max(0.0, 1 - result['received'] / expected) if expected else 0.0
+    return result
+
+
+def memory_growth(samples):
+    """
+    Returns:
+        float: Slope in MB per hour of a line fitted to the memory samples after the first tenth of the run.
+    """
+    samples = np.array(samples)
+    samples = samples[samples[:, 0] >= samples[-1, 0] / 10]
+    if len(samples) < 2:
+        return 0.0
+    slope, _ = np.polyfit(samples[:, 0], samples[:, 1], 1)
+    return slope * 3600
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the sustained frame rate, loss and memory growth of the logger.')
+    parser.add_argument('--rates', type=float, nargs='*', default=[21, 100, 250, 500, 1000, 2000], help='Frame rates of the ramp')
+    parser.add_argument('--step_duration', type=float, default=10, help='Seconds per rate of the ramp')
+    parser.add_argument('--soak', type=float, default=0, help='Seconds of the soak run')
+    parser.add_argument('--soak_rate', type=float, default=21, help='Frame rate of the soak run')
+    parser.add_argument('--sample_interval', type=float, default=10, help='Seconds between memory samples of the soak run')
+    parser.add_argument('--log_both', action='store_true', help='Simulate and log both insoles')
+    parser.add_argument('--compact', action='store_true', help='Log in the compact schema')
+    parser.add_argument('--raw', action='store_true', help='Capture into memory-mapped raw files instead of HDF5')
+    parser.add_argument('--drop_rate', type=float, default=0.0, help='Fraction of frames in which one byte is dropped')
+    parser.add_argument('--corrupt_rate', type=float, default=0.0, help='Fraction of frames in which one byte is corrupted')
+    parser.add_argument('--max_loss', type=float, default=0.001, help='Loss rate up to which a rate counts as sustained')
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The logger names its file after the current time in the working directory
+        os.chdir(tmp_dir)
+        try:
+            sustained, failed = None, None
+            if args.rates:
+                print(f"{'rate':>8} {'sent':>9} {'received':>9} {'loss':>8} {'overflow B':>11} {'checksum':>9} {'written':>9}")
+            for rate in sorted(args.rates):
+                result = run_session(rate, args.step_duration, args)
+                print(f"{rate:8.0f} {result['sent']:9d} {result['received']:9d} {result['loss']:8.2%} "
+                      f"{result['overflowed']:11d} {result['checksum_errors']:9d} {result['rows_written']:9d}")
+                # A higher rate that happens to pass after a failing one is not sustained
+                if result['loss'] > args.max_loss:
+                    failed = rate
+                    break
+                sustained = rate
+            if args.rates:
+                limit = f", first failing rate {failed:.0f} frames/s" if failed is not None else ''
+                print(f"Max sustained rate: {sustained or 0:.0f} frames/s per device (loss <= {args.max_loss:.2%}{limit})")
+
+            if args.soak:
+                result = run_session(args.soak_rate, args.soak, args, sample_interval=args.sample_interval)
+                memory = np.array([mb for _, mb in result['samples']])
+                print(f"Soak {args.soak:.0f} s at {args.soak_rate:.0f} frames/s: {result['received']} of {result['sent']} "
+                      f"frames received, loss {result['loss']:.3%}, {result['checksum_errors']} checksum errors, "
+                      f"{result['resyncs']} resyncs")
+                print(f"Memory: {memory[0]:.1f} MB at the start, {memory.max():.1f} MB peak, {memory[-1]:.1f} MB at the end, "
+                      f"growth {memory_growth(result['samples']):+.2f} MB/hour")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+This module passes the decoded frames of the logger to other processes (e.g. live_view.py) through shared memory.
+
+Each device gets one ring buffer in a named shared-memory block (multiprocessing.shared_memory), laid out as
+
+    header     : 5 int64 - number of slots, number of rows written so far, clock origin (wall, monotonic) in ns,
+                 process ID of the writer
+    timestamps : (slots,) int64 - receive time of each row in ns (acquisition.SessionClock)
+    values     : (slots, 208) uint8 - raw sensor values
+
+The logger writes every decoded block into the ring and then advances the row counter. Writing never waits for a
+reader: a reader that falls behind by more than the ring size simply loses the oldest rows. Readers poll the counter
+and copy the rows they have not seen yet; rows that were overwritten while they were copied are dropped. Blocks are
+written in pieces of at most a quarter of the ring, so a reader knows which of its copied rows could have been hit.
+The clock origin in the header lets a reader compute the current time on the logger's clock, so the end-to-end
+latency from the serial read to the screen can be measured in another process.
+
+A ring left behind by a crashed logger is replaced when the next logger starts. A ring whose writer process is still
+running is never taken over: a second logger started by mistake fails instead of cutting off the live view of the
+first one.
+
+Usage:
+    Writer (log_velostat_sensor_h5.py --live):
+        publisher = RingPublisher(['sensor_left'], clock)
+        publisher.publish('sensor_left', timestamps, sensor_values)
+        publisher.close()
+
+    Reader (live_view.py):
+        ring = FrameRing.attach('sensor_left')
+        timestamps, values = ring.read_new()
+        latency_ns = ring.now_ns() - timestamps[-1]
+        ring.close()
+"""
+
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from packet_decoder import N_SENSORS
+
+RING_PREFIX = 'footsole_'  # shared-memory name of a device: RING_PREFIX + device, e.g. footsole_sensor_left
+DEFAULT_SLOTS = 4096  # rows kept per device, ~3 minutes at 21 Hz
+HEADER_FIELDS = 5
+_SLOTS, _COUNT, _ORIGIN_WALL, _ORIGIN_MONOTONIC, _WRITER_PID = range(HEADER_FIELDS)
+STALE_CHECK_S = 1.0  # without a writer PID, a ring whose row counter does not advance for this long is stale
+
+
+def ring_name(device):
+    return RING_PREFIX + device
+
+
+class FrameRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.slots = int(self.header[_SLOTS])
+        offset = self.header.nbytes
+        self.timestamps = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.timestamps.nbytes
+        self.values = np.ndarray((self.slots, N_SENSORS), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        self.read_count = 0
+        self.dropped_rows = 0
+
+    @classmethod
+    def create(cls, device, slots=DEFAULT_SLOTS, clock=None):
+        """
+        Create the ring of a device (writer side). A stale ring of a crashed logger with the same name is replaced.
+
+        Args:
+            clock (acquisition.SessionClock): Clock of the timestamps; its origin is stored for the readers.
+
+        Raises:
+            FileExistsError: If the ring of the device is still written by a running logger.
+        """
+        size = HEADER_FIELDS * 8 + slots * (8 + N_SENSORS)
+        try:
+            shm = shared_memory.SharedMemory(ring_name(device), create=True, size=size)
+        except FileExistsError:
+            existing = shared_memory.SharedMemory(ring_name(device))
+            try:
+                writer_pid = cls.running_writer(existing)
+            finally:
+                existing.close()
+            if writer_pid is not None:
+                raise FileExistsError(
+                    f"The live ring of {device} is already in use by a running logger ({writer_pid}). Stop that logger "
+                    f"first, or remove /dev/shm/{ring_name(device)} if it is not a logger.") from None
+            existing.unlink()
+            shm = shared_memory.SharedMemory(ring_name(device), create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_SLOTS] = slots
+        header[_WRITER_PID] = os.getpid()
+        if clock is not None:
+            header[_ORIGIN_WALL] = clock.origin_wall_ns
+            header[_ORIGIN_MONOTONIC] = clock.origin_monotonic_ns
+        del header
+        return cls(shm, owner=True)
+
+    @staticmethod
+    def running_writer(shm):
+        """
+        Check whether the writer of an existing ring is still running.
+
+        Returns:
+            str: Description of the running writer (e.g. 'PID 1234'), or None if the ring is stale.
+        """
+        if shm.size < HEADER_FIELDS * 8:
+            return None
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        try:
+            pid = int(header[_WRITER_PID])
+            if pid > 0:
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    return None
+                except PermissionError:
+                    pass  # the process exists, but belongs to another user
+                return f"PID {pid}"
+            # No writer PID (e.g. a ring of an older logger): it is in use while its row counter advances
+            count = int(header[_COUNT])
+            time.sleep(STALE_CHECK_S)
+            return "row counter still advancing" if int(header[_COUNT]) != count else None
+        finally:
+            del header
+
+    @classmethod
+    def attach(cls, device):
+        """
+        Attach to the ring of a running logger (reader side).
+
+        Raises:
+            FileNotFoundError: If no logger publishes this device.
+        """
+        try:
+            shm = shared_memory.SharedMemory(ring_name(device), track=False)
+        except TypeError:
+            # Before Python 3.13 the resource tracker would unlink the logger's ring when the reader exits
+            from multiprocessing import resource_tracker
+
+            shm = shared_memory.SharedMemory(ring_name(device))
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        ring = cls(shm, owner=False)
+        # Start with the rows that are already in the ring, so a rolling plot is filled at once
+        ring.read_count = max(0, ring.count - ring.slots)
+        return ring
+
+    @property
+    def count(self):
+        return int(self.header[_COUNT])
+
+    def write(self, timestamps, sensor_values):
+        """
+        Append a block of rows. Never blocks; the oldest rows are overwritten when the ring is full.
+        """
+        n = len(sensor_values)
+        if n == 0:
+            return
+        if n > self.slots:
+            timestamps, sensor_values, n = timestamps[-self.slots:], sensor_values[-self.slots:], self.slots
+        # The readers assume that at most a quarter of the ring is being written beyond the counter (see read_new),
+        # so larger blocks are written and counted in pieces of that size
+        piece = max(1, self.slots // 4)
+        for start in range(0, n, piece):
+            stop = min(start + piece, n)
+            count = self.count
+            index = (count + np.arange(stop - start)) % self.slots
+            self.timestamps[index] = timestamps[start:stop]
+            self.values[index] = sensor_values[start:stop]
+            # The counter is advanced only after the rows are complete
+            self.header[_COUNT] = count + stop - start
+
+    def read_new(self, max_rows=None):
+        """
+        Copy the rows written since the last call.
+
+        Args:
+            max_rows (int): Only return the newest max_rows rows (older unread rows are skipped).
+
+        Returns:
+            tuple: (timestamps, values) copies, oldest row first.
+        """
+        count = self.count
+        start = max(self.read_count, count - self.slots)
+        if max_rows is not None:
+            start = max(start, count - max_rows)
+        index = np.arange(start, count) % self.slots
+        timestamps = self.timestamps[index]
+        values = self.values[index]
+        # Rows the writer may have overwritten while they were copied: a block of at most a quarter of the ring
+        # can be in progress beyond the counter read now
+        safe_from = self.count + self.slots // 4 - self.slots
+        if start < safe_from:
+            keep = np.arange(start, count) >= safe_from
+            timestamps, values = timestamps[keep], values[keep]
+        self.dropped_rows += (start - self.read_count) + (count - start - len(values))
+        self.read_count = count
+        return timestamps, values
+
+    def now_ns(self):
+        """
+        Returns:
+            int: The current time on the writer's SessionClock, comparable to the timestamps of the rows.
+        """
+        origin_wall, origin_monotonic = int(self.header[_ORIGIN_WALL]), int(self.header[_ORIGIN_MONOTONIC])
+        if origin_wall == 0:
+            return time.time_ns()
+        return origin_wall + (time.monotonic_ns() - origin_monotonic)
+
+    def close(self):
+        # The numpy views must be released before the shared memory can be closed
+        del self.header, self.timestamps, self.values
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingPublisher:
+    def __init__(self, devices, clock=None, slots=DEFAULT_SLOTS):
+        """
+        One FrameRing per device, written by the acquisition pipeline as soon as a block is decoded.
+
+        Raises:
+            FileExistsError: If the ring of a device is still written by a running logger.
+        """
+        self.rings = {}
+        try:
+            for device in devices:
+                self.rings[device] = FrameRing.create(device, slots, clock)
+        except FileExistsError:
+            self.close()
+            raise
+
+    def publish(self, device, timestamps, sensor_values):
+        self.rings[device].write(timestamps, sensor_values)
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
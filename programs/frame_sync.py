@@ -0,0 +1,148 @@
+"""
+This module keeps the serial byte stream aligned to frame boundaries and counts how healthy the stream is.
+
+After a dropped or corrupted byte, the frames in the buffer no longer start at multiples of the packet size.
+FrameSynchronizer then searches for the next offset at which a valid frame (matching frame_head marker and
+checksum) starts and continues from there, so only the damaged bytes are discarded instead of every later frame.
+The frame_head marker is learned from the first valid frame, so it does not have to be known in advance.
+The bytes discarded while searching are counted as damaged frames (checksum_errors, one per PACKET_SIZE bytes or
+part of it), so a burst of corrupted frames counts as many errors as frames were lost, not as one.
+
+Usage:
+    The synchronizer is used by log_velostat_sensor_h5.py:
+
+Example:
+    from frame_sync import FrameSynchronizer
+    sync = FrameSynchronizer()
+    sensor_values = sync.feed(ser.read(ser.in_waiting))
+    print(sync.stats.summary())
+"""
+
+import time
+import numpy as np
+from packet_decoder import decode_frames, find_frame_start, PACKET_SIZE, N_SENSORS
+
+MAX_BUFFER_SIZE = 1024 * 10  # 10 KB maximum buffer size
+RESYNC_ATTEMPTS = 5  # resyncs in a row without a valid frame before the learned frame_head is dropped
+
+
+class StreamStats:
+    def __init__(self):
+        self.valid_frames = 0
+        self.checksum_errors = 0
+        self.resync_events = 0
+        self.bytes_received = 0
+        self.bytes_skipped = 0
+        self.start_time = time.monotonic()
+
+    def frame_rate(self):
+        """
+        Returns:
+            float: Average number of valid frames per second since the statistics were created.
+        """
+        elapsed = time.monotonic() - self.start_time
+        return self.valid_frames / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: All counters and the effective frame rate, e.g. to store them as HDF5 attributes.
+        """
+        return {
+            'valid_frames': self.valid_frames,
+            'checksum_errors': self.checksum_errors,
+            'resync_events': self.resync_events,
+            'bytes_received': self.bytes_received,
+            'bytes_skipped': self.bytes_skipped,
+            'frame_rate': self.frame_rate(),
+        }
+
+    def summary(self):
+        return (f"{self.valid_frames} valid frames ({self.frame_rate():.1f} Hz), "
+                f"{self.checksum_errors} checksum errors, {self.resync_events} resyncs, "
+                f"{self.bytes_skipped} of {self.bytes_received} bytes skipped")
+
+
+class FrameSynchronizer:
+    def __init__(self, frame_head=None, max_buffer_size=MAX_BUFFER_SIZE, resync_attempts=RESYNC_ATTEMPTS):
+        """
+        Args:
+            frame_head (int): Expected frame_head marker. If None, it is learned from the first valid frame.
+            max_buffer_size (int): Maximum number of undecodable bytes kept between calls; older bytes are discarded.
+            resync_attempts (int): Number of resyncs in a row without a valid frame after which a learned
+                frame_head is dropped and learned again.
+        """
+        self.frame_head = frame_head
+        self.learn_frame_head = frame_head is None
+        self.max_buffer_size = max(max_buffer_size, 2 * PACKET_SIZE)
+        self.resync_attempts = resync_attempts
+        self.failed_resyncs = 0
+        self.discarded = 0  # bytes discarded since the last valid frame
+        self.buffer = bytearray()
+        self.stats = StreamStats()
+
+    def feed(self, data):
+        """
+        Add received bytes and return the sensor values of all complete, valid frames.
+
+        Args:
+            data (bytes): Newly received bytes.
+
+        Returns:
+            numpy.ndarray: uint8 array of shape (N, 208).
+        """
+        self.buffer.extend(data)
+        self.stats.bytes_received += len(data)
+
+        blocks = []
+        while len(self.buffer) >= PACKET_SIZE:
+            sensor_values, valid, n_bytes = decode_frames(self.buffer, frame_head=self.frame_head)
+            n_aligned = len(valid) if valid.all() else int(np.argmin(valid))
+            if n_aligned:
+                if self.frame_head is None:
+                    self.frame_head = int.from_bytes(self.buffer[:2], 'little')
+                blocks.append(sensor_values[:n_aligned])
+                del self.buffer[:n_aligned * PACKET_SIZE]
+                self.stats.valid_frames += n_aligned
+                self.failed_resyncs = 0
+                self.discarded = 0
+            if n_aligned < len(valid):
+                if not self._resync():
+                    break
+
+        # Cap the bytes left over for the next call; a large read is decoded completely first, so only bytes that
+        # could not be decoded are ever discarded
+        overflow = len(self.buffer) - self.max_buffer_size
+        if overflow > 0:
+            self._skip(overflow)
+
+        if not blocks:
+            return np.empty((0, N_SENSORS), dtype=np.uint8)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+    def _resync(self):
+        # The buffer starts with an invalid frame; search for the next valid one
+        offset, n_scanned = find_frame_start(self.buffer, start=1, frame_head=self.frame_head)
+        if offset is None:
+            # Keep only the bytes that can still become the start of a frame
+            self._discard(1 + n_scanned)
+            self.failed_resyncs += 1
+            if self.learn_frame_head and self.failed_resyncs >= self.resync_attempts:
+                self.frame_head = None
+            return False
+        if offset != PACKET_SIZE:
+            # A frame that is not simply the next one means bytes were lost or inserted
+            self.stats.resync_events += 1
+        self._discard(offset)
+        return True
+
+    def _discard(self, n_bytes):
+        # Damaged frames: every started PACKET_SIZE bytes discarded since the last valid frame count as one
+        before = -(-self.discarded // PACKET_SIZE)
+        self.discarded += n_bytes
+        self.stats.checksum_errors += -(-self.discarded // PACKET_SIZE) - before
+        self._skip(n_bytes)
+
+    def _skip(self, n_bytes):
+        del self.buffer[:n_bytes]
+        self.stats.bytes_skipped += n_bytes
@@ -2,24 +2,34 @@
 This script generates an animation from multiple frames.
 
 Command Line Arguments:
-    python frames_to_video.py
+    python frames_to_video.py [frame_folder] [output_file] [--fps 25]
     
 Usage:
     After running "viz_generate_frames.py" and generating all the frames, please use this file to create an animation
-    Remember to customize the folder paths in lines 22 and 23
+    Remember to customize the folder paths, or pass them on the command line
 """
-from moviepy.editor import ImageSequenceClip
+import argparse
 import os
 
 
 def create_video_from_frames(frame_folder, output_file, fps=25):
+    from moviepy.editor import ImageSequenceClip
+
     frame_files = [os.path.join(frame_folder, f) for f in sorted(os.listdir(frame_folder)) if f.endswith('.png')]
     clip = ImageSequenceClip(frame_files, fps=fps)
     clip.write_videofile(output_file, codec='libx264')
 
 
-frame_folder = 'frames/nrshoes_stone2'
-output_file = 'nrshoes_stone2.mp4'
-# frame_folder = 'frames/fullsoul_stone1'
-# output_file = 'fullsoul_stone1.mp4'
-create_video_from_frames(frame_folder, output_file, fps=25)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create a video from the frames generated by viz_generate_frames.py.')
+    parser.add_argument('frame_folder', nargs='?', default='frames/nrshoes_stone2', help='Folder with the PNG frames.')
+    parser.add_argument('output_file', nargs='?', default='nrshoes_stone2.mp4', help='Path of the video to create.')
+    # frame_folder = 'frames/fullsoul_stone1'
+    # output_file = 'fullsoul_stone1.mp4'
+    parser.add_argument('--fps', type=int, default=25, help='Frame rate of the video.')
+    args = parser.parse_args(argv)
+    create_video_from_frames(args.frame_folder, args.output_file, fps=args.fps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+This module detects gait events incrementally, on a live sensor stream or on recordings of any length.
+
+index_find.py filters the whole recording at once with the zero-phase filtfilt, which needs the complete recording in
+memory and the future of every sample. The StreamingGaitDetector instead processes blocks of rows as they arrive:
+the average pressure is low-pass filtered with a causal second-order-sections filter (sosfilt) whose state is carried
+from block to block, and a small state machine with hysteresis emits
+
+    heel_strike : the filtered average pressure rises above the contact threshold
+    flat_foot   : the maximum of a contact phase (at least PEAK_HEIGHT, like the peaks of index_find.py), confirmed
+                  as soon as the pressure has dropped PEAK_DROP below it, at the latest at toe-off
+    toe_off     : the filtered average pressure falls below the release threshold
+
+Memory is constant (filter state plus a few scalars), and the latency of an event is bounded by the filter delay,
+and for flat_foot, by the time the pressure needs to drop PEAK_DROP below the peak. Events are numpy records
+(EVENT_DTYPE) with the row index, the timestamp and the filtered value.
+
+Command Line Arguments:
+    hdf5_path : Recording to analyse; every foot of the file is analysed.
+    --chunk_rows : Rows read from the file per block (default 4096).
+    --save : Store the events in the recording (group gait_events, one dataset per foot).
+    --print_events : Print every event instead of only the summary.
+
+Usage:
+    python gait_events.py data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 --save
+
+    detector = StreamingGaitDetector()
+    events = detector.process(timestamps, sensor_values)  # call with every new block of rows
+
+    The logger runs a detector per foot during acquisition with log_velostat_sensor_h5.py --gait.
+"""
+
+import argparse
+import numpy as np
+
+GAIT_EVENTS_GROUP = 'gait_events'
+EVENT_KINDS = ('heel_strike', 'flat_foot', 'toe_off')
+EVENT_DTYPE = np.dtype([
+    ('kind', 'u1'),  # index into EVENT_KINDS
+    ('row', '<i8'),  # row of the event in the recording
+    ('timestamp', '<i8'),  # ns
+    ('value', '<f4'),  # filtered average sensor value
+    ('latency_rows', '<i4'),  # rows between the event and the row at which it was emitted
+])
+
+SAMPLE_RATE_HZ = 21  # as in index_find.py
+CUTOFF_HZ = 1.5
+FILTER_ORDER = 2  # a low order keeps the delay of the causal filter short
+CONTACT_ON = 12  # filtered average sensor value above which the foot is on the ground
+CONTACT_OFF = 8  # ... and below which it is lifted again (hysteresis)
+PEAK_HEIGHT = 25  # minimum height of a flat-foot peak, as in index_find.py
+PEAK_DROP = 3  # drop below the running maximum that confirms a flat-foot peak
+DEFAULT_CHUNK_ROWS = 4096
+
+
+class StreamingGaitDetector:
+    def __init__(self, fs=SAMPLE_RATE_HZ, cutoff=CUTOFF_HZ, order=FILTER_ORDER, contact_on=CONTACT_ON,
+                 contact_off=CONTACT_OFF, peak_height=PEAK_HEIGHT, peak_drop=PEAK_DROP):
+        """
+        Args:
+            fs (float): Sample rate of the rows in Hz.
+            cutoff (float): Cut-off frequency of the low-pass filter in Hz.
+            order (int): Order of the Butterworth filter.
+            contact_on, contact_off (float): Hysteresis thresholds of heel strike and toe-off.
+            peak_height (float): Minimum height of a flat-foot peak.
+            peak_drop (float): Drop below the running maximum that confirms a flat-foot peak.
+        """
+        from scipy.signal import butter, sosfilt_zi
+
+        self.sos = butter(order, cutoff / (0.5 * fs), btype='low', output='sos')
+        self.zi_unit = sosfilt_zi(self.sos)
+        self.zi = None  # set from the first sample, so the filter does not start with a step from zero
+        self.contact_on = contact_on
+        self.contact_off = contact_off
+        self.peak_height = peak_height
+        self.peak_drop = peak_drop
+
+        self.rows_processed = 0
+        self.in_contact = False
+        self.peak_value = -np.inf
+        self.peak_row = -1
+        self.peak_timestamp = 0
+        self.peak_emitted = False
+
+    def filter(self, signal):
+        from scipy.signal import sosfilt
+
+        if self.zi is None:
+            self.zi = self.zi_unit * signal[0]
+        filtered, self.zi = sosfilt(self.sos, signal, zi=self.zi)
+        return filtered
+
+    def process(self, timestamps, sensor_values):
+        """
+        Process the next block of rows.
+
+        Args:
+            timestamps (numpy.ndarray): Timestamps in ns of the rows.
+            sensor_values (numpy.ndarray): (N, 208) raw sensor values.
+
+        Returns:
+            numpy.ndarray: The events emitted in this block (EVENT_DTYPE), in order.
+        """
+        events = []
+        if len(sensor_values) == 0:
+            return np.array(events, dtype=EVENT_DTYPE)
+        timestamps = np.asarray(timestamps).astype(np.int64)
+        filtered = self.filter(np.mean(sensor_values, axis=1, dtype=np.float64))
+        offset = self.rows_processed
+        n = len(filtered)
+
+        def emit(kind, i, emitted_at, value=None):
+            value = filtered[i] if value is None else value
+            events.append((EVENT_KINDS.index(kind), offset + i, timestamps[i], value, emitted_at - i))
+
+        i = 0
+        while i < n:
+            if not self.in_contact:
+                above = np.flatnonzero(filtered[i:] > self.contact_on)
+                if len(above) == 0:
+                    break
+                i += above[0]
+                emit('heel_strike', i, i)
+                self.in_contact = True
+                self.peak_value, self.peak_emitted = -np.inf, False
+                continue
+
+            # Rows of this block that still belong to the contact phase
+            below = np.flatnonzero(filtered[i:] < self.contact_off)
+            end = i + below[0] if len(below) else n
+            if not self.peak_emitted and end > i:
+                segment = filtered[i:end]
+                top = int(np.argmax(segment))
+                if segment[top] > self.peak_value:
+                    self.peak_value = segment[top]
+                    self.peak_row, self.peak_timestamp = offset + i + top, timestamps[i + top]
+                    confirm_from = i + top
+                else:
+                    confirm_from = i
+                if self.peak_value >= self.peak_height:
+                    dropped = np.flatnonzero(filtered[confirm_from:end] < self.peak_value - self.peak_drop)
+                    if len(dropped):
+                        self.emit_peak(events, offset + confirm_from + dropped[0])
+            if end == n:
+                break
+            if not self.peak_emitted and self.peak_value >= self.peak_height:
+                self.emit_peak(events, offset + end)
+            emit('toe_off', end, end)
+            self.in_contact = False
+            i = end + 1
+
+        self.rows_processed += n
+        return np.array(events, dtype=EVENT_DTYPE)
+
+    def emit_peak(self, events, emitted_at):
+        # The peak may lie in an earlier block, so it is stored with its absolute row and timestamp
+        events.append((EVENT_KINDS.index('flat_foot'), self.peak_row, self.peak_timestamp, self.peak_value,
+                       emitted_at - self.peak_row))
+        self.peak_emitted = True
+
+
+def detect_events(recording, chunk_rows=DEFAULT_CHUNK_ROWS, **detector_args):
+    """
+    Args:
+        recording (recording.SensorRecording): The foot to analyse; it is read one block of chunk_rows at a time.
+
+    Returns:
+        numpy.ndarray: All events of the recording (EVENT_DTYPE).
+    """
+    detector = StreamingGaitDetector(**detector_args)
+    events = [detector.process(timestamps, sensor_values) for timestamps, sensor_values in recording.view().chunks(chunk_rows)]
+    return np.concatenate(events) if events else np.zeros(0, dtype=EVENT_DTYPE)
+
+
+def save_events(hdf5, dataset_name, events):
+    name = f'{GAIT_EVENTS_GROUP}/{dataset_name}'
+    if name in hdf5:
+        del hdf5[name]
+    hdf5.create_dataset(name, data=events)
+
+
+def summarize(events):
+    """
+    Returns:
+        str: Number of steps, cadence and the largest emission latency of a list of events.
+    """
+    kinds = events['kind']
+    strikes = events['timestamp'][kinds == EVENT_KINDS.index('heel_strike')]
+    summary = f"{len(strikes)} steps"
+    if len(strikes) > 1:
+        summary += f", {60e9 / np.median(np.diff(strikes)):.1f} steps/min"
+    if len(events):
+        summary += f", max latency {events['latency_rows'].max()} rows"
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect heel strike, flat foot and toe-off events block by block.')
+    parser.add_argument('hdf5_path', help='Path to the HDF5 file containing force data.')
+    parser.add_argument('--chunk_rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows read per block.')
+    parser.add_argument('--save', action='store_true', help='Store the events in the recording.')
+    parser.add_argument('--print_events', action='store_true', help='Print every event.')
+    args = parser.parse_args(argv)
+
+    import h5py
+    from sensor_layout import SENSOR_LAYOUTS
+    from recording import sensor_recordings
+
+    with h5py.File(args.hdf5_path, 'r+' if args.save else 'r') as file:
+        for recording in sensor_recordings(file):
+            dataset_name = recording.name
+            events = detect_events(recording, args.chunk_rows)
+            if args.print_events:
+                for event in events:
+                    print(f"{dataset_name} {EVENT_KINDS[event['kind']]:<12} row {event['row']:>8} value {event['value']:7.1f}")
+            print(f"{SENSOR_LAYOUTS[dataset_name]['label']}: {summarize(events)}")
+            if args.save:
+                save_events(file, dataset_name, events)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+This module provides a buffered writer for appending sensor rows to an HDF5 dataset.
+
+Instead of resizing the dataset and writing a single row for every packet, rows are collected in a
+preallocated in-memory block and written to the file in one resize/write per block. The dataset is
+created with an explicit chunk shape and an optional compression filter.
+
+Usage:
+    The writer is used by log_velostat_sensor_h5.py, but it can be used by any script that appends rows:
+
+Example:
+    import h5py
+    from hdf5_writer import BufferedH5Writer
+
+    with h5py.File('sensor_left.h5', 'a') as hdf5:
+        writer = BufferedH5Writer(hdf5, 'sensor_left', n_columns=209, flush_rows=512)
+        writer.append(row)
+        writer.close()
+"""
+
+import time
+import numpy as np
+from instrumentation import timer
+
+DEFAULT_FLUSH_ROWS = 1024  # rows kept in memory before they are written to the file
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds, so a slow stream still reaches the disk regularly
+COMPRESSION_FILTERS = ('gzip', 'lzf')
+
+
+class BufferedH5Writer:
+    def __init__(self, hdf5, dataset_name, n_columns=209, dtype='float64', flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, chunk_rows=None, compression=None):
+        """
+        Open (or create) a resizable dataset and prepare the in-memory row buffer.
+
+        Args:
+            hdf5 (h5py.File or h5py.Group): The open file to write into.
+            dataset_name (str): Name of the dataset, e.g. 'sensor_left'.
+            n_columns (int): Number of columns per row (timestamp + sensor values), or None for a 1-D dataset with
+                one value per row (e.g. the timestamps of the compact schema in recording.py).
+            dtype (str): Data type of the dataset.
+            flush_rows (int): Number of buffered rows that triggers a write to the file.
+            flush_interval (float): Maximum time in seconds a row stays in memory. Use 0 to disable.
+            chunk_rows (int): Number of rows per HDF5 chunk. Defaults to flush_rows.
+            compression (str): Optional compression filter, 'gzip' or 'lzf'.
+        """
+        if compression is not None and compression not in COMPRESSION_FILTERS:
+            raise ValueError(f"Unsupported compression filter: {compression}")
+
+        self.hdf5 = hdf5
+        self.dataset_name = dataset_name
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        chunk_rows = self.flush_rows if chunk_rows is None else max(1, int(chunk_rows))
+
+        row_shape = () if n_columns is None else (n_columns,)
+        if dataset_name not in hdf5:
+            hdf5.create_dataset(dataset_name, shape=(0,) + row_shape, maxshape=(None,) + row_shape, dtype=dtype,
+                                chunks=(chunk_rows,) + row_shape, compression=compression)
+        self.dataset = hdf5[dataset_name]
+        if self.dataset.shape[1:] != row_shape:
+            raise ValueError(f"Dataset {dataset_name} has rows of shape {self.dataset.shape[1:]}, expected {row_shape}.")
+
+        # Preallocated block that is filled row by row and written in one go
+        self.buffer = np.empty((self.flush_rows,) + row_shape, dtype=self.dataset.dtype)
+        self.buffered_rows = 0
+        self.rows_written = self.dataset.shape[0]
+        self.last_flush = time.monotonic()
+
+    def append(self, row):
+        """
+        Add a single row to the buffer and write the buffer to the file if it is full or too old.
+
+        Args:
+            row (sequence): One row with n_columns values.
+        """
+        self.buffer[self.buffered_rows] = row
+        self.buffered_rows += 1
+        if self.buffered_rows == self.flush_rows:
+            self.flush()
+        else:
+            self._flush_if_due()
+
+    def append_block(self, rows):
+        """
+        Add several rows at once. Blocks larger than the buffer are written through in buffer-sized pieces.
+
+        Args:
+            rows (numpy.ndarray): Array of shape (N, n_columns).
+        """
+        rows = np.asarray(rows)
+        start = 0
+        while start < len(rows):
+            count = min(len(rows) - start, self.flush_rows - self.buffered_rows)
+            self.buffer[self.buffered_rows:self.buffered_rows + count] = rows[start:start + count]
+            self.buffered_rows += count
+            start += count
+            if self.buffered_rows == self.flush_rows:
+                self.flush()
+        self._flush_if_due()
+
+    def _flush_if_due(self):
+        if self.flush_interval and self.buffered_rows and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered rows to the dataset with a single resize and flush the file.
+        """
+        self.last_flush = time.monotonic()
+        if not self.buffered_rows:
+            return
+        with timer('hdf5_flush'):
+            end = self.rows_written + self.buffered_rows
+            self.dataset.resize(end, axis=0)
+            self.dataset[self.rows_written:end] = self.buffer[:self.buffered_rows]
+            self.rows_written = end
+            self.buffered_rows = 0
+            self.hdf5.file.flush()
+
+    def close(self):
+        """
+        Write the remaining rows. The HDF5 file itself is closed by its owner.
+        """
+        self.flush()
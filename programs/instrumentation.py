@@ -0,0 +1,263 @@
+"""
+This module measures where the time of the logger and of the frame rendering goes.
+
+Instrumented code wraps its hot paths in named timers (and counts events) with
+
+    with timer('decode'):
+        ...
+    count('frames_decoded', n)
+
+Instrumentation is disabled by default, and a disabled timer is a shared no-op context manager, so the hot paths
+cost next to nothing unless a program is started with --instrument. When enabled, every timer aggregates its
+durations into a histogram with fixed 1-2-5 buckets from 1 us to 100 s, so memory stays constant over hours of
+logging. At the end of a run the histograms and counters are written to a JSON report (count, total, mean, min, max,
+approximate percentiles and the bucket counts of every timer). Worker processes send their measurements back with
+collect(), and the calling process adds them with merge().
+
+Timers used by the programs:
+    logger    : serial_read (reads of bytes that had already arrived), serial_idle (reads that waited for the device
+                or the read timeout), decode, checksum, write (sink of the pipeline), hdf5_flush, raw_sync (with --raw)
+    rendering : timestamp_lookup, video_seek, video_read, scatter_update, draw, encode (PNG file or video encoder),
+                encode_queue_wait (rendering waits for the background encoder)
+
+For profiling, --profile writes cProfile statistics of all threads (inspect them with `python -m pstats` or
+snakeviz). Sampling profilers such as py-spy need no support from the programs, e.g.
+`py-spy record -o profile.svg --subprocesses -- python programs frames ...`; the threads of the logger are named
+after their stage and device, so they can be told apart in its output.
+
+Usage:
+    python log_velostat_sensor_h5.py --instrument logger_report.json
+    python viz_generate_frames.py recording.h5 video.MOV --instrument render_report.json --profile render.prof
+"""
+
+import bisect
+import contextlib
+import sys
+import threading
+import time
+
+# Upper bucket edges in ns: 1, 2, 5, 10, ... us up to 100 s; longer durations fall into a last, open bucket
+BUCKET_EDGES_NS = [int(mantissa * 10 ** exponent) for exponent in range(3, 12) for mantissa in (1, 2, 5)][:-2]
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_EDGES_NS) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    def add(self, duration_ns):
+        self.counts[bisect.bisect_left(BUCKET_EDGES_NS, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self.min_ns = duration_ns if self.min_ns is None else min(self.min_ns, duration_ns)
+        self.max_ns = max(self.max_ns, duration_ns)
+
+    def percentile(self, fraction):
+        """
+        Returns:
+            int: Upper edge in ns of the bucket that contains the given fraction of the durations (capped at max).
+        """
+        target = fraction * self.count
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(BUCKET_EDGES_NS[bucket], self.max_ns) if bucket < len(BUCKET_EDGES_NS) else self.max_ns
+        return self.max_ns
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_s': self.total_ns / 1e9,
+            'mean_us': self.total_ns / self.count / 1e3 if self.count else 0.0,
+            'min_us': (self.min_ns or 0) / 1e3,
+            'max_us': self.max_ns / 1e3,
+            'p50_us': self.percentile(0.5) / 1e3,
+            'p95_us': self.percentile(0.95) / 1e3,
+            'p99_us': self.percentile(0.99) / 1e3,
+            'bucket_edges_us': [edge / 1e3 for edge in BUCKET_EDGES_NS],
+            'bucket_counts': list(self.counts),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = list(data['bucket_counts'])
+        histogram.count = data['count']
+        histogram.total_ns = round(data['total_s'] * 1e9)
+        histogram.min_ns = round(data['min_us'] * 1e3) if data['count'] else None
+        histogram.max_ns = round(data['max_us'] * 1e3)
+        return histogram
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ns += other.total_ns
+        if other.min_ns is not None:
+            self.min_ns = other.min_ns if self.min_ns is None else min(self.min_ns, other.min_ns)
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_ns(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def timer(name):
+    """
+    Returns:
+        A context manager that adds the duration of its block to the histogram of name (a no-op when disabled).
+    """
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def record_ns(name, duration_ns):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(duration_ns)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def report():
+    """
+    Returns:
+        dict: {'timers': {name: histogram summary}, 'counters': {name: value}}, sorted by name.
+    """
+    with _lock:
+        return {
+            'timers': {name: _histograms[name].as_dict() for name in sorted(_histograms)},
+            'counters': dict(sorted(_counters.items())),
+        }
+
+
+def collect():
+    """
+    Returns:
+        dict: The report of the measurements since the last call (they are reset), or None when disabled. Used by
+        worker processes to send their measurements to the calling process.
+    """
+    if not _enabled:
+        return None
+    data = report()
+    reset()
+    return data
+
+
+def merge(data):
+    """
+    Add a report of another process (see collect) to the measurements of this process.
+    """
+    if not data:
+        return
+    with _lock:
+        for name, summary in data['timers'].items():
+            histogram = Histogram.from_dict(summary)
+            if name in _histograms:
+                _histograms[name].merge(histogram)
+            else:
+                _histograms[name] = histogram
+        for name, value in data['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def summary():
+    """
+    Returns:
+        str: One line per timer (count, total, mean and p95) and one line with all counters.
+    """
+    data = report()
+    lines = [f"{name:<18} {stats['count']:>9} x {stats['mean_us']:>10.1f} us mean, p95 {stats['p95_us']:>10.1f} us, "
+             f"{stats['total_s']:8.3f} s total" for name, stats in data['timers'].items()]
+    if data['counters']:
+        lines.append(', '.join(f"{name} {value}" for name, value in data['counters'].items()))
+    return '\n'.join(lines)
+
+
+def write_report(path, **metadata):
+    """
+    Write the report as JSON, together with e.g. the command line or the duration of the run.
+    """
+    import json
+
+    with open(path, 'w') as f:
+        json.dump({**metadata, **report()}, f, indent=2)
+
+
+class Profiler:
+    def __init__(self, path):
+        """
+        cProfile all threads of the process until stop(); the statistics are saved to path (pstats format).
+        """
+        self.path = path
+        self.profiles = []
+
+    def start(self):
+        import cProfile
+
+        self.profiles = [cProfile.Profile()]
+        self.profiles[0].enable()
+        if sys.version_info < (3, 12):
+            # Before Python 3.12 a profile only sees the thread that enabled it, so every thread started from now
+            # on enables its own (from 3.12 on, one profile covers all threads)
+            threading.setprofile(self._profile_thread)
+
+    def _profile_thread(self, frame, event, arg):
+        import cProfile
+
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def stop(self, top=20):
+        import pstats
+
+        threading.setprofile(None)
+        self.profiles[0].disable()
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(self.path)
+        print(f"Profile saved to {self.path}; the {top} functions with the highest cumulative time:")
+        stats.sort_stats('cumulative').print_stats(top)
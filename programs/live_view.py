@@ -0,0 +1,234 @@
+"""
+This script shows the pressures of a running logger live: the pressure at each sensor on the foot scan (one plot per
+foot) and the average pressure of the last seconds.
+
+The logger (log_velostat_sensor_h5.py --live) publishes every decoded block in a shared-memory ring buffer per foot
+(frame_ring.py). This script runs in its own process and polls the rings, so the logger never waits for the display.
+The display is redrawn at most --fps times per second, whatever the frame rate of the sensors; only the newest
+frame of each foot is drawn, and the rows in between only extend the average pressure plot. The axes, foot images
+and colorbar are drawn once and restored from a cached background, and only the scatter colours, the average
+pressure lines and the latency text are redrawn and blitted.
+
+The end-to-end latency is the time from the serial read of the newest displayed frame (its timestamp on the logger's
+clock) to the moment it is on the screen. It is shown in the figure and its statistics are printed periodically.
+
+Command Line Arguments:
+    --fps : Maximum display rate in frames per second (default 30).
+    --window : Seconds shown in the average pressure plot (default 10).
+    --calibration : Optional calibration file with one pressure curve per sensor cell.
+    --duration : Stop after this many seconds (default: until the window is closed).
+
+Usage:
+    Start the logger with --live, then the live view in a second terminal:
+        python log_velostat_sensor_h5.py --log_both --live
+        python live_view.py --fps 20
+"""
+
+import argparse
+import time
+import numpy as np
+from packet_decoder import N_SENSORS
+from sensor_layout import SENSOR_LAYOUTS
+
+DISPLAY_FPS = 30
+WINDOW_S = 10.0
+REPORT_INTERVAL_S = 5.0
+STALE_S = 1.0  # the view reports that the logger stopped when no rows arrived for this long
+MAX_PRESSURE_KPA = 65  # upper end of the colour scale, as in pressure_renderer.py
+
+
+class LiveView:
+    def __init__(self, rings, calibration, window_s=WINDOW_S):
+        """
+        Build the figure and cache its static background.
+
+        Args:
+            rings (dict): Device name -> frame_ring.FrameRing to display.
+            calibration (velostat_sensor_to_pressure.PressureCalibration): Converts raw values to pressures.
+            window_s (float): Seconds shown in the average pressure plot.
+        """
+        import matplotlib.image as mpimg
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import LogNorm
+        from matplotlib.gridspec import GridSpec
+        from sensor_layout import load_layout
+
+        self.plt = plt
+        self.rings = rings
+        self.calibration = calibration
+        self.window_s = window_s
+        self.history = {device: (np.zeros(0, dtype=np.int64), np.zeros(0)) for device in rings}
+        self.last_row_time = time.monotonic()
+        self.latencies_ms = []
+
+        self.fig = plt.figure(figsize=(5 + 4 * len(rings), 7))
+        gs = GridSpec(1, 2 + 2 * len(rings), figure=self.fig)
+        ax_mean = self.fig.add_subplot(gs[0, :2])
+        foot_axes = [self.fig.add_subplot(gs[0, 2 + 2 * foot:4 + 2 * foot]) for foot in range(len(rings))]
+
+        # The lowest pressure of the calibration times 3, like the colour scale of pressure_renderer.py
+        minimum = calibration.convert(np.zeros((1, N_SENSORS), dtype=np.uint8)).min() / 1e3
+        self.norm = LogNorm(vmin=minimum * 3.0, vmax=MAX_PRESSURE_KPA)
+
+        self.lines = {}
+        self.scatters = {}
+        self.sensor_indices = {}
+        for ax, device in zip(foot_axes, rings):
+            points_df, image_path, image_height_mm, scatter_size, label = load_layout(device)
+            image = mpimg.imread(image_path)
+            image_width_mm = (image.shape[1] / image.shape[0]) * image_height_mm
+            ax.imshow(image, extent=[0, image_width_mm, 0, image_height_mm], cmap='gray', alpha=0.2)
+            ax.set_title(label)
+            ax.set_xlabel('Width (mm)')
+            ax.set_ylabel('Height (mm)')
+            sensor_index = points_df['ID'].to_numpy().astype(int) - 1
+            self.scatters[device] = ax.scatter(points_df['X_in_mm'], points_df['Y_in_mm'],
+                                               c=np.full(len(sensor_index), self.norm.vmin), cmap='jet', norm=self.norm,
+                                               s=scatter_size, edgecolors='face', animated=True)
+            self.sensor_indices[device] = sensor_index
+            self.lines[device] = ax_mean.plot([], [], label=label, animated=True)[0]
+        self.fig.colorbar(self.scatters[device], ax=foot_axes[-1], label='Pressure (kPa)')
+
+        ax_mean.set_title('Average Pressure')
+        ax_mean.set_xlabel('Time (s)')
+        ax_mean.set_ylabel('Average Pressure (kPa)')
+        ax_mean.set_xlim(-window_s, 0)
+        ax_mean.set_ylim(0, 8)
+        ax_mean.grid(True)
+        ax_mean.legend(loc='upper left')
+        self.status = self.fig.text(0.01, 0.01, 'waiting for frames...', animated=True)
+
+        self.fig.tight_layout(rect=(0, 0.04, 1, 1))
+        self.canvas = self.fig.canvas
+        self.dynamic_artists = list(self.scatters.values()) + list(self.lines.values()) + [self.status]
+        # The background is captured again whenever the window is resized or redrawn completely
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        plt.show(block=False)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def update(self):
+        """
+        Read the new rows of every ring and redraw the dynamic artists.
+
+        Returns:
+            int: Number of new rows.
+        """
+        newest = []
+        new_rows = 0
+        for device, ring in self.rings.items():
+            timestamps, values = ring.read_new()
+            if len(values) == 0:
+                continue
+            new_rows += len(values)
+            newest.append((ring, int(timestamps[-1])))
+            pressures = self.calibration.convert(values) / 1e3
+            self.scatters[device].set_array(pressures[-1, self.sensor_indices[device]])
+            history_ts, history_mean = self.history[device]
+            history_ts = np.concatenate([history_ts, timestamps])
+            history_mean = np.concatenate([history_mean, pressures.mean(axis=1)])
+            keep = history_ts >= history_ts[-1] - int(self.window_s * 1e9)
+            self.history[device] = history_ts[keep], history_mean[keep]
+
+        now_ns = next(iter(self.rings.values())).now_ns()
+        for device, (history_ts, history_mean) in self.history.items():
+            self.lines[device].set_data((history_ts - now_ns) / 1e9, history_mean)
+
+        if new_rows:
+            self.last_row_time = time.monotonic()
+        elif time.monotonic() - self.last_row_time > STALE_S:
+            self.status.set_text(f'no new frames for {time.monotonic() - self.last_row_time:.0f} s')
+
+        self.draw()
+        # Latency of the newest frame of each foot, measured once it has been blitted (shown with the next redraw)
+        for ring, timestamp in newest:
+            latency_ms = (ring.now_ns() - timestamp) / 1e6
+            self.latencies_ms.append(latency_ms)
+            self.status.set_text(f'serial read to screen: {latency_ms:.0f} ms')
+        return new_rows
+
+    def draw(self):
+        if self.background is None or not self.canvas.supports_blit:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            for artist in self.dynamic_artists:
+                self.fig.draw_artist(artist)
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def is_open(self):
+        return self.plt.fignum_exists(self.fig.number)
+
+    def latency_report(self):
+        """
+        Returns:
+            str: Mean, 95th percentile and maximum latency since the last report (and resets them).
+        """
+        if not self.latencies_ms:
+            return 'no frames displayed'
+        latencies = np.array(self.latencies_ms)
+        self.latencies_ms = []
+        return (f"{len(latencies)} frames displayed, latency mean {latencies.mean():.1f} ms, "
+                f"p95 {np.percentile(latencies, 95):.1f} ms, max {latencies.max():.1f} ms")
+
+    def run(self, fps=DISPLAY_FPS, duration=None, report_interval=REPORT_INTERVAL_S):
+        period = 1.0 / fps
+        start = next_report = time.monotonic()
+        next_report += report_interval
+        while self.is_open():
+            tick = time.monotonic()
+            if duration is not None and tick - start >= duration:
+                break
+            self.update()
+            if tick >= next_report:
+                dropped = ', '.join(f"{device} {ring.dropped_rows} rows skipped" for device, ring in self.rings.items())
+                print(f"{self.latency_report()}; {dropped}")
+                next_report += report_interval
+            # Cap the display rate; the remaining time is left to the GUI event loop (plt.pause would redraw the
+            # whole figure)
+            remaining = period - (time.monotonic() - tick)
+            if remaining > 0:
+                self.canvas.start_event_loop(remaining)
+        print(self.latency_report())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the pressures of a running logger live.')
+    parser.add_argument('--fps', type=float, default=DISPLAY_FPS, help='Maximum display rate in frames per second.')
+    parser.add_argument('--window', type=float, default=WINDOW_S, help='Seconds shown in the average pressure plot.')
+    parser.add_argument('--calibration', default=None, help='Calibration file with per-cell pressure curves.')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds.')
+    args = parser.parse_args(argv)
+
+    from frame_ring import FrameRing
+    from velostat_sensor_to_pressure import DEFAULT_CALIBRATION, PressureCalibration
+
+    rings = {}
+    for device in SENSOR_LAYOUTS:
+        try:
+            rings[device] = FrameRing.attach(device)
+        except FileNotFoundError:
+            pass
+    if not rings:
+        print("No live frames found. Start the logger with --live first.")
+        return 1
+    print(f"Showing {', '.join(rings)}")
+
+    calibration = PressureCalibration.from_file(args.calibration) if args.calibration else DEFAULT_CALIBRATION
+    view = LiveView(rings, calibration, args.window)
+    try:
+        view.run(args.fps, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for ring in rings.values():
+            ring.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -4,6 +4,20 @@ This script is designed to log sensor data from the FootSole sensors into an HDF
 
 Command Line Arguments:
     --log_left : When this flag is specified, the script logs data from the left sensor and connects via '/dev/ttyUSB1' instead of the default right sensor on '/dev/ttyUSB0'.
+    --log_both : Log the left and the right sensor at the same time into one file.
+    --port_left, --port_right : Override the serial port of the left or right sensor.
+    --flush_rows : Number of rows kept in memory before they are written to the HDF5 file (default 1024).
+    --flush_interval : Maximum time in seconds before buffered rows are written to the HDF5 file (default 1.0).
+    --chunk_rows : Number of rows per HDF5 chunk (defaults to --flush_rows).
+    --compression : Optional HDF5 compression filter, 'gzip' or 'lzf'.
+    --stats_interval : Seconds between printed stream statistics (default 5).
+    --compact : Store timestamps (int64) and sensor values (uint8) in separate datasets, ~8x smaller (recording.py).
+    --gait : Detect heel strike, flat foot and toe-off events while logging (gait_events.py).
+    --live : Publish the decoded frames in shared memory for live_view.py (frame_ring.py).
+    --raw : Capture the frames into a preallocated, memory-mapped raw file per foot instead of the HDF5 file
+        (raw_capture.py); convert it afterwards with raw_capture.py convert.
+    --instrument : Time serial reads, decoding, checksums, writes and HDF5 flushes and save a JSON report to this file.
+    --profile : cProfile all threads of the logger and save the statistics to this file (instrumentation.py).
 
 Usage:
     Run the script without any arguments to start logging from the right sensor which must be connected first:
@@ -11,126 +25,281 @@ Usage:
 
     Run the script with the --log_left flag to start logging from the left sensor which must be connected after the right sensor:
         log_velostat_sensor_h5.py --log_left
-        
-    Remember to modify port name to adapt your computer in line 55
+
+    Run the script with the --log_both flag to log both insoles into one file (sensor_both_<date>.h5):
+        log_velostat_sensor_h5.py --log_both --port_left /dev/ttyUSB1 --port_right /dev/ttyUSB0
+
+    Run live_view.py in a second terminal to watch a recording that is logged with --live:
+        log_velostat_sensor_h5.py --log_both --live
+        live_view.py
+
+    Run the script with the --raw flag for the cheapest writes, e.g. on a laptop in the field, and convert the raw files
+    into the HDF5 file afterwards:
+        log_velostat_sensor_h5.py --log_both --raw
+        raw_capture.py convert sensor_both_<date>_sensor_left.raw sensor_both_<date>_sensor_right.raw
+
+    Remember to modify DEFAULT_PORTS to adapt your computer, or pass --port_left/--port_right
 
 Features:
     - Dynamic filename generation based on sensor side and current timestamp.
     - Continuous data acquisition and logging until interrupted by the user.
     - Automatic handling of serial connection issues and dataset creation within the HDF5 file.
     - Real-time processing and logging of sensor data based on packet integrity.
+    - Serial reads, frame decoding and HDF5 writes run on separate threads connected by bounded queues (acquisition.py),
+      so slow disk writes do not delay the serial reads. Queue fill levels and waiting times are reported with the statistics.
+    - Resynchronization to the frame_head marker after dropped or corrupted bytes. Stream statistics (valid frames,
+      checksum errors, resyncs, skipped bytes, frame rate) are printed periodically and stored as HDF5 attributes.
+    - With --log_both, both devices are timestamped with one shared monotonic clock, and on close the file gets an
+      'alignment' group with the closest sensor_right row for every sensor_left row and vice versa. If the logger
+      crashes before, sensor_layout.read_alignment computes the missing alignment from the timestamps when it is read.
+    - If the file cannot be written (e.g. a full disk), logging stops with the error instead of discarding the frames
+      silently; the final statistics show the frames dropped after the failure.
+    - Buffered, chunked HDF5 writes; buffered rows are always written when the logger is closed or stopped with Ctrl-C.
+    - With --compact, each foot is a group with int64 timestamps and uint8 sensor values instead of one float64 dataset.
+    - With --gait, gait events are detected block by block as the rows arrive; the step count is printed with the
+      statistics and the events are stored in the gait_events group of the file.
+    - With --live, every decoded block is also written into a shared-memory ring buffer per foot. The write never
+      waits for the live view, so a slow or frozen display cannot delay the logging.
+    - With --raw, each decoded block is only copied into a memory-mapped file (216 bytes per frame instead of a
+      1672-byte float64 row). The row count in its header is advanced after the rows, so the file is readable up to
+      the last block after a crash.
+    - With --instrument, the time spent in each stage is aggregated into histograms, printed with the statistics and
+      saved as a JSON report when the logger is closed.
 """
 
 import sys
 import serial
-import struct
 import time
 import h5py
 import numpy as np
 import datetime
 import argparse
+import instrumentation
+from sensor_layout import alignment_name
+from timestamp_index import nearest_indices
+from acquisition import AcquisitionPipeline, SessionClock
+from recording import RecordingWriter
+from hdf5_writer import DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL, COMPRESSION_FILTERS
+
+STATS_INTERVAL = 5  # seconds
 
-MAX_BUFFER_SIZE = 1024 * 10  # 10 KB maximum buffer size
-TIMEOUT_THRESHOLD = 5  # seconds
-RESYNC_ATTEMPTS = 5
-PACKET_SIZE = 216
+# Remember to modify port name to adapt your computer
+# DEFAULT_PORTS = {'sensor_left': '/dev/ttyUSB1', 'sensor_right': '/dev/ttyUSB0'}
+DEFAULT_PORTS = {'sensor_left': '/dev/tty.usbserial-10', 'sensor_right': '/dev/ttyUSB0'}
+# /dev/tty.Bluetooth-Incoming-Port 
 
 class FootSoleLogger:
-    def __init__(self, use_left_sensor):
+    def __init__(self, use_left_sensor, log_both=False, ports=None, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, chunk_rows=None, compression=None, stats_interval=STATS_INTERVAL,
+                 gait=False, compact=False, live=False, raw=False):
+        if raw and gait:
+            raise ValueError("Gait events are stored in the HDF5 file; detect them after converting the raw files.")
         self.use_left_sensor = use_left_sensor
+        self.log_both = log_both
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.stats_interval = stats_interval
+        self.compact = compact
+        self.raw = raw
+        if log_both:
+            self.dataset_names = ['sensor_left', 'sensor_right']
+        else:
+            self.dataset_names = ["sensor_left" if self.use_left_sensor else "sensor_right"]
+        self.gait_detectors = {}
+        self.gait_events = {}
+        if gait:
+            from gait_events import StreamingGaitDetector
+
+            self.gait_detectors = {name: StreamingGaitDetector() for name in self.dataset_names}
+            self.gait_events = {name: [] for name in self.dataset_names}
+        self.ports = {name: (ports or {}).get(name) or DEFAULT_PORTS[name] for name in self.dataset_names}
         self.init_serial()
         self.generate_filename()
-        self.init_hdf5()
+        clock = SessionClock()
+        self.publisher = None
+        if live:
+            # Before any file is created, so a logger that is already publishing stops this one without an empty file
+            from frame_ring import RingPublisher
+
+            self.publisher = RingPublisher(self.dataset_names, clock)
+            print(f"Publishing live frames of {', '.join(self.dataset_names)}; start live_view.py to watch them.")
+        if raw:
+            self.init_raw(clock)
+        else:
+            self.init_hdf5()
+        self.pipeline = AcquisitionPipeline(self.serial_ports, self, clock=clock, publisher=self.publisher)
 
     def generate_filename(self):
         # Get current date and time
         current_time = datetime.datetime.now()
         # Format filename based on the sensor side
-        sensor_side = "sensor_left" if self.use_left_sensor else "sensor_right"
+        sensor_side = "sensor_both" if self.log_both else self.dataset_names[0]
         self.hdf5_file = current_time.strftime(f"{sensor_side}_%Y-%m-%d-%H-%M-%S.h5")
 
     def init_serial(self):
-        # Remember to modify port name to adapt your computer
-        # port = '/dev/ttyUSB1' if self.use_left_sensor else '/dev/ttyUSB0'
-        port = '/dev/tty.usbserial-10' if self.use_left_sensor else '/dev/ttyUSB0'
-        # /dev/tty.Bluetooth-Incoming-Port 
-        try:
-            self.ser = serial.Serial(port, baudrate=460800, timeout=0.001)
-            self.buffer = bytearray()
-            print(f"Serial connection established on {port}.")
-        except serial.SerialException as e:
-            print(f"Failed to open serial port: {e}")
-            sys.exit(1)
+        self.serial_ports = {}
+        for dataset_name, port in self.ports.items():
+            try:
+                self.serial_ports[dataset_name] = serial.Serial(port, baudrate=460800)
+                print(f"Serial connection established on {port}.")
+            except serial.SerialException as e:
+                print(f"Failed to open serial port: {e}")
+                for ser in self.serial_ports.values():
+                    ser.close()
+                sys.exit(1)
 
     def init_hdf5(self):
-        # Initialize the HDF5 file and dataset
+        # Initialize the HDF5 file and one dataset per device
         self.hdf5 = h5py.File(self.hdf5_file, 'a')
-        dataset_name = "sensor_left" if self.use_left_sensor else "sensor_right"
-        if dataset_name not in self.hdf5:
-            self.hdf5.create_dataset(dataset_name, shape=(0, 209), maxshape=(None, 209), dtype='float64')
+        self.writers = {}
+        for dataset_name in self.dataset_names:
+            self.writers[dataset_name] = RecordingWriter(self.hdf5, dataset_name, compact=self.compact,
+                                                         flush_rows=self.flush_rows, flush_interval=self.flush_interval,
+                                                         chunk_rows=self.chunk_rows, compression=self.compression)
+
+    def init_raw(self, clock):
+        # One raw file per device instead of the HDF5 file; raw_capture.py converts them into self.hdf5_file
+        from raw_capture import RawCaptureWriter, raw_path
 
-    def update_data(self):
+        self.hdf5 = None
+        self.writers = {}
+        for dataset_name in self.dataset_names:
+            path = raw_path(self.hdf5_file, dataset_name, len(self.dataset_names))
+            self.writers[dataset_name] = RawCaptureWriter(path, dataset_name, clock.origin_wall_ns,
+                                                          flush_interval=self.flush_interval)
+        self.raw_files = [writer.path for writer in self.writers.values()]
+        print(f"Capturing raw frames into {', '.join(self.raw_files)}.")
+
+    def run(self):
+        # The acquisition runs on its own threads; this thread only reports statistics until Ctrl-C
+        self.pipeline.start()
         try:
-            while self.ser.in_waiting:
-                new_data = self.ser.read(self.ser.in_waiting)
-                self.buffer.extend(new_data)
+            while not self.pipeline.stop_event.wait(self.stats_interval):
+                self.report_stats()
+        finally:
+            self.pipeline.stop()
+        # The writer stops the pipeline when the file cannot be written (e.g. a full disk), a decoder on any error
+        if self.pipeline.error is not None:
+            raise RuntimeError(f"Logging failed: {self.pipeline.error}") from self.pipeline.error
 
-                while len(self.buffer) >= PACKET_SIZE:
-                    if self.process_packet():
-                        print("Valid packet processed.")
-                    else:
-                        print("Error processing packet.")
+    def report_stats(self):
+        if self.hdf5 is not None:
+            self.hdf5.attrs.update(self.pipeline.clock.as_dict())
+        for dataset_name, writer in self.writers.items():
+            stats = self.pipeline.stream_stats(dataset_name)
+            writer.attrs.update({**stats.as_dict(), **self.pipeline.backpressure(dataset_name)})
+        print(self.pipeline.summary())
+        if instrumentation.enabled():
+            print(instrumentation.summary())
+        if self.gait_detectors:
+            from gait_events import summarize
 
-        except serial.SerialException as e:
-            print(f"Serial port error: {e}")
-            self.reset_connection()
+            for dataset_name in self.dataset_names:
+                print(f"{dataset_name} gait: {summarize(self.collected_gait_events(dataset_name))}")
 
-    def process_packet(self):
-        packet = self.buffer[:PACKET_SIZE]
-        self.buffer = self.buffer[PACKET_SIZE:]
+    def log_sensor_values(self, device, timestamps, sensor_values):
+        # Called from the writer thread of the pipeline
+        self.writers[device].append_block(timestamps, sensor_values)
+        if self.gait_detectors:
+            events = self.gait_detectors[device].process(timestamps, sensor_values)
+            if len(events):
+                self.gait_events[device].append(events)
 
-        try:
-            frame_head, frame_type, frame_length, package_type, *sensor_values, checksum = struct.unpack('<HBHB208BH', packet)
-            calculated_checksum = sum(packet[:-2]) & 0xFFFF
-
-            if calculated_checksum == checksum:
-                self.log_sensor_values(sensor_values)
-                return True
-            else:
-                print(f"Checksum error. Calculated: {calculated_checksum:04X}, Received: {checksum:04X}")
-
-        except struct.error:
-            print("Struct unpacking error")
-
-        return False
-
-    def log_sensor_values(self, sensor_values):
-        timestamp = time.time_ns()
-        data = np.array([[timestamp] + sensor_values], dtype='float64')
-        dataset_name = "sensor_left" if self.use_left_sensor else "sensor_right"
-        ds = self.hdf5[dataset_name]
-        ds.resize(ds.shape[0] + 1, axis=0)
-        ds[-1:] = data
-
-    def reset_connection(self):
-        print("Resetting serial connection...")
-        self.ser.close()
-        time.sleep(1)
-        self.init_serial()
+    def collected_gait_events(self, dataset_name):
+        from gait_events import EVENT_DTYPE
+
+        events = list(self.gait_events[dataset_name])
+        return np.concatenate(events) if events else np.zeros(0, dtype=EVENT_DTYPE)
+
+    def write_alignment(self):
+        # Map every row of one device to the row of the other device with the closest timestamp
+        for source in self.dataset_names:
+            for target in self.dataset_names:
+                if source == target:
+                    continue
+                source_ts = self.writers[source].timestamps()
+                target_ts = self.writers[target].timestamps()
+                name = alignment_name(source, target)
+                if name in self.hdf5:
+                    del self.hdf5[name]
+                if len(source_ts) and len(target_ts):
+                    self.hdf5.create_dataset(name, data=nearest_indices(target_ts, source_ts))
 
     def close(self):
-        self.hdf5.close()
-        print("HDF5 file closed.")
+        # Write the buffered rows and the final statistics before the file is closed
+        try:
+            if self.raw:
+                # The statistics are stored in the headers of the raw files when they are closed
+                self.report_stats()
+            for writer in self.writers.values():
+                writer.close()
+            if not self.raw:
+                self.report_stats()
+            if self.log_both and not self.raw:
+                self.write_alignment()
+            if self.gait_detectors:
+                from gait_events import save_events
 
-if __name__ == '__main__':
+                for dataset_name in self.dataset_names:
+                    save_events(self.hdf5, dataset_name, self.collected_gait_events(dataset_name))
+        finally:
+            if self.hdf5 is not None:
+                self.hdf5.close()
+            for ser in self.serial_ports.values():
+                ser.close()
+            if self.publisher is not None:
+                self.publisher.close()
+        print("Raw files closed." if self.raw else "HDF5 file closed.")
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Process sensor data for FootSole Logger.")
     parser.add_argument('--log_left', action='store_true', help='Log data from the left sensor and connect via ttyUSB1')
-    args = parser.parse_args()
+    parser.add_argument('--log_both', action='store_true', help='Log the left and the right sensor into one file')
+    parser.add_argument('--port_left', default=None, help='Serial port of the left sensor')
+    parser.add_argument('--port_right', default=None, help='Serial port of the right sensor')
+    parser.add_argument('--flush_rows', type=int, default=DEFAULT_FLUSH_ROWS, help='Rows buffered in memory before writing to the HDF5 file')
+    parser.add_argument('--flush_interval', type=float, default=DEFAULT_FLUSH_INTERVAL, help='Maximum seconds before buffered rows are written')
+    parser.add_argument('--chunk_rows', type=int, default=None, help='Rows per HDF5 chunk (defaults to --flush_rows)')
+    parser.add_argument('--compression', choices=COMPRESSION_FILTERS, default=None, help='Optional HDF5 compression filter')
+    parser.add_argument('--stats_interval', type=float, default=STATS_INTERVAL, help='Seconds between printed stream statistics')
+    parser.add_argument('--compact', action='store_true', help='Store int64 timestamps and uint8 sensor values in separate datasets')
+    parser.add_argument('--gait', action='store_true', help='Detect gait events while logging')
+    parser.add_argument('--live', action='store_true', help='Publish the decoded frames for live_view.py')
+    parser.add_argument('--raw', action='store_true', help='Capture the frames into memory-mapped raw files instead of HDF5')
+    parser.add_argument('--instrument', default=None, help='Time the acquisition stages and save a JSON report to this file')
+    parser.add_argument('--profile', default=None, help='cProfile all threads and save the statistics to this file')
+    args = parser.parse_args(argv)
+    if args.raw and (args.compact or args.gait):
+        parser.error("--raw writes raw files only; choose --compact when converting them, and detect gait events afterwards")
 
-    logger = FootSoleLogger(use_left_sensor=args.log_left)
+    instrumentation.enable(args.instrument is not None)
+    profiler = instrumentation.Profiler(args.profile) if args.profile else None
+    if profiler:
+        profiler.start()
+    start = time.monotonic()
+
+    ports = {'sensor_left': args.port_left, 'sensor_right': args.port_right}
+    logger = FootSoleLogger(use_left_sensor=args.log_left, log_both=args.log_both, ports=ports, flush_rows=args.flush_rows,
+                            flush_interval=args.flush_interval, chunk_rows=args.chunk_rows, compression=args.compression,
+                            stats_interval=args.stats_interval, gait=args.gait, compact=args.compact, live=args.live,
+                            raw=args.raw)
     try:
-        while True:
-            logger.update_data()
+        logger.run()
     except KeyboardInterrupt:
-        logger.close()
         print("Logging stopped by user.")
+    finally:
+        logger.close()
+        if profiler:
+            profiler.stop()
+        if args.instrument:
+            files = logger.raw_files if args.raw else logger.hdf5_file
+            instrumentation.write_report(args.instrument, program='log_velostat_sensor_h5', file=files,
+                                         duration_s=time.monotonic() - start)
+            print(f"Instrumentation report saved to {args.instrument}")
+
+
+if __name__ == '__main__':
+    main()
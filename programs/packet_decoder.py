@@ -0,0 +1,149 @@
+"""
+This module decodes the 216-byte serial frames sent by the FootSole controller, many frames at once.
+
+Frame layout (little endian):
+    frame_head (uint16), frame_type (uint8), frame_length (uint16), package_type (uint8),
+    208 sensor values (uint8), checksum (uint16) = sum of the first 214 bytes & 0xFFFF
+
+Instead of unpacking every frame into a Python list with struct, the buffer is viewed as a NumPy structured
+array (no copy), the checksums of all frames are validated with one array operation and the sensor values
+are returned as one (N, 208) uint8 block.
+
+Usage:
+    The decoder is used by log_velostat_sensor_h5.py. It can be imported by any script that reads raw frames:
+
+Example:
+    from packet_decoder import decode_frames
+    values, valid, n_bytes = decode_frames(buffer)
+    del buffer[:n_bytes]
+"""
+
+import numpy as np
+from instrumentation import timer
+
+PACKET_SIZE = 216
+N_SENSORS = 208
+CHECKSUM_SIZE = 2
+
+FRAME_DTYPE = np.dtype([
+    ('frame_head', '<u2'),
+    ('frame_type', 'u1'),
+    ('frame_length', '<u2'),
+    ('package_type', 'u1'),
+    ('sensor_values', 'u1', (N_SENSORS,)),
+    ('checksum', '<u2'),
+])
+assert FRAME_DTYPE.itemsize == PACKET_SIZE
+
+
+def frame_checksums(frame_bytes):
+    """
+    Calculate the checksum of every frame.
+
+    Args:
+        frame_bytes (numpy.ndarray): uint8 array of shape (N, 216).
+
+    Returns:
+        numpy.ndarray: uint16 array with the calculated checksum of each frame.
+    """
+    return (frame_bytes[:, :-CHECKSUM_SIZE].sum(axis=1, dtype=np.uint32) & 0xFFFF).astype(np.uint16)
+
+
+def decode_frames(buffer, n_frames=None, frame_head=None):
+    """
+    Decode all complete frames at the start of a buffer.
+
+    Args:
+        buffer (bytes, bytearray or memoryview): Raw bytes starting at a frame boundary.
+        n_frames (int): Maximum number of frames to decode. Defaults to all complete frames.
+        frame_head (int): If given, frames with a different frame_head are treated as invalid as well.
+
+    Returns:
+        tuple: (sensor_values, valid, n_bytes)
+            sensor_values (numpy.ndarray): uint8 array of shape (N_valid, 208) with the values of the valid frames.
+            valid (numpy.ndarray): Boolean array with one entry per decoded frame, False on checksum (or frame_head) errors.
+            n_bytes (int): Number of bytes that were decoded and can be removed from the buffer.
+    """
+    available = len(buffer) // PACKET_SIZE
+    n_frames = available if n_frames is None else min(n_frames, available)
+    n_bytes = n_frames * PACKET_SIZE
+    if n_frames == 0:
+        return np.empty((0, N_SENSORS), dtype=np.uint8), np.empty(0, dtype=bool), 0
+
+    # Views over the caller's buffer; only the selected sensor values are copied
+    with memoryview(buffer) as view:
+        frame_bytes = np.frombuffer(view[:n_bytes], dtype=np.uint8).reshape(n_frames, PACKET_SIZE)
+        frames = frame_bytes.view(FRAME_DTYPE)[:, 0]
+        with timer('checksum'):
+            valid = frame_checksums(frame_bytes) == frames['checksum']
+        if frame_head is not None:
+            valid &= frames['frame_head'] == frame_head
+        sensor_values = frames['sensor_values'][valid]
+        del frame_bytes, frames
+    return sensor_values, valid, n_bytes
+
+
+def find_frame_start(buffer, start=0, frame_head=None):
+    """
+    Find the first offset at which a complete, valid frame starts.
+
+    The checksums of the frames starting at every candidate offset are calculated at once from a cumulative
+    sum of the buffer, so a misaligned stream can be searched without decoding one offset at a time.
+
+    Args:
+        buffer (bytes, bytearray or memoryview): Raw bytes.
+        start (int): First offset to consider.
+        frame_head (int): If given, only offsets where this frame_head marker starts are considered.
+
+    Returns:
+        tuple: (offset, n_scanned)
+            offset (int): Offset of the first valid frame, or None if there is none yet.
+            n_scanned (int): Number of offsets that were checked. If no frame was found, these bytes can be discarded.
+    """
+    stop = len(buffer) - PACKET_SIZE + 1
+    if stop <= start:
+        return None, 0
+
+    with memoryview(buffer) as view:
+        data = np.frombuffer(view, dtype=np.uint8)
+        cumulative = np.zeros(len(data) + 1, dtype=np.int64)
+        np.cumsum(data, dtype=np.int64, out=cumulative[1:])
+        offsets = np.arange(start, stop)
+        end = offsets + PACKET_SIZE - CHECKSUM_SIZE
+        calculated = (cumulative[end] - cumulative[offsets]) & 0xFFFF
+        received = data[end].astype(np.int64) | (data[end + 1].astype(np.int64) << 8)
+        candidates = calculated == received
+        if frame_head is not None:
+            candidates &= (data[offsets].astype(np.int64) | (data[offsets + 1].astype(np.int64) << 8)) == frame_head
+        del data
+
+    matches = np.flatnonzero(candidates)
+    if len(matches) == 0:
+        return None, stop - start
+    return start + int(matches[0]), int(matches[0]) + 1
+
+
+def encode_frames(sensor_values, frame_head=0x5AA5, frame_type=0x01, package_type=0x01):
+    """
+    Build well-formed frames from sensor values, e.g. for benchmarks or replaying recordings.
+
+    The header values are placeholders; the logger locks onto whatever frame_head the stream uses.
+
+    Args:
+        sensor_values (numpy.ndarray): Array of shape (N, 208) with values between 0 and 255.
+        frame_head (int): Value of the frame_head field.
+        frame_type (int): Value of the frame_type field.
+        package_type (int): Value of the package_type field.
+
+    Returns:
+        bytes: N * 216 bytes of encoded frames.
+    """
+    sensor_values = np.asarray(sensor_values, dtype=np.uint8).reshape(-1, N_SENSORS)
+    frames = np.zeros(len(sensor_values), dtype=FRAME_DTYPE)
+    frames['frame_head'] = frame_head
+    frames['frame_type'] = frame_type
+    frames['frame_length'] = PACKET_SIZE
+    frames['package_type'] = package_type
+    frames['sensor_values'] = sensor_values
+    frames['checksum'] = frame_checksums(frames.view(np.uint8).reshape(-1, PACKET_SIZE))
+    return frames.tobytes()
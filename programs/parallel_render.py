@@ -0,0 +1,221 @@
+"""
+This module renders the frames of viz_generate_frames.py on several cores.
+
+The timeline is split into contiguous segments of video frames. Every worker process builds its own FrameRenderer
+(figure) and its own video_source.VideoSource, which seeks once to the start of a segment (not at all when the
+segment follows the previous one of the worker) and then decodes the video sequentially on a background thread,
+ahead of the rendering and downscaled to the display size of the video. Frames are named by their global frame
+number, and segments are collected in timeline order, so the output does not depend on the number of workers. With
+one worker everything runs in the calling process.
+
+When a video sink (see video_sink.py) is given, the frames are not saved as PNG files: workers send the RGB frames of
+each segment back in timeline order and the calling process streams them into the encoder. Only a bounded number of
+segments is in flight at a time, so the frames waiting for the encoder do not pile up in memory.
+
+With instrumentation enabled (instrumentation.py), the workers send their timings back with every segment, so the
+report of the calling process covers all workers.
+
+Usage:
+    from parallel_render import RenderJob, render_frames
+    job = RenderJob(video_path, timestamps, sensor_values, layouts, frame_rows, output_dir)
+    render_frames(job, workers=4, chunk_size=200, memory_limit_mb=4000)
+    render_frames(job, workers=4, sink=open_sink('walk.mp4', fps, size))
+"""
+
+import math
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
+from video_sink import PngSink
+
+WORKER_BASE_MB = 250  # interpreter, matplotlib, cv2 and the figure of one worker
+DEFAULT_CHUNK_SIZE = 250  # frames per segment
+STREAM_CHUNK_SIZE = 8  # frames per segment sent back to the encoding process
+
+
+class RenderJob:
+    def __init__(self, video_path, timestamps, sensor_values, layouts, frame_rows, output_dir, interpolation=None,
+                 first_frame=0, pressure_maps=None):
+        """
+        Everything a worker needs to render any frame of the timeline.
+
+        Args:
+            video_path (str): Path to the video file.
+            timestamps (numpy.ndarray): int64 timestamps in ns of the sensor rows.
+            sensor_values (list): One (N, 208) array of pressures in kPa per foot.
+            layouts (list): One (points_df, image_path, image_height_mm, scatter_size, label) tuple per foot.
+            frame_rows (numpy.ndarray): Sensor row of every video frame.
+            output_dir (str): Folder the PNG frames are written to when no video sink is used.
+            interpolation (tuple): Optional (lower, upper, weight) arrays from TimestampIndex.bracket to interpolate
+                the sensor values of each frame between two rows.
+            first_frame (int): Video frame shown in output frame 0, e.g. the start frame found by auto_sync.py.
+            pressure_maps (list): Optional pressure_map.PressureMap per foot to draw heatmaps and centre of pressure.
+        """
+        self.video_path = video_path
+        self.timestamps = timestamps
+        self.sensor_values = sensor_values
+        self.layouts = layouts
+        self.frame_rows = frame_rows
+        self.output_dir = output_dir
+        self.interpolation = interpolation
+        self.first_frame = first_frame
+        self.pressure_maps = pressure_maps
+
+    @property
+    def n_frames(self):
+        return len(self.frame_rows)
+
+    def foot_values(self, frame_number):
+        if self.interpolation is None:
+            return None
+        lower, upper, weight = (array[frame_number] for array in self.interpolation)
+        return [values[lower] * (1 - weight) + values[upper] * weight for values in self.sensor_values]
+
+
+class SegmentRenderer:
+    def __init__(self, job):
+        from pressure_renderer import FrameRenderer
+        from video_source import VideoSource
+
+        self.job = job
+        self.video = VideoSource(job.video_path, job.first_frame, job.n_frames)
+        # The full-size first frame defines the layout; the following frames are decoded at the display size
+        self.renderer = FrameRenderer(job.timestamps, job.sensor_values, job.layouts, self.video.read(0),
+                                      pressure_maps=job.pressure_maps)
+        self.video.size = self.renderer.video_display_size()
+
+    def render(self, frame_number, frame):
+        return self.renderer.render(self.job.frame_rows[frame_number], frame, self.job.foot_values(frame_number))
+
+    def render_segment(self, start, stop, sink):
+        for frame_number, frame in self.video.frames(start, stop):
+            sink.write(frame_number, self.render(frame_number, frame))
+        return start, stop
+
+    def render_segment_frames(self, start, stop):
+        # Copies, since the renderer reuses its canvas buffer for the next frame
+        return start, stop, [self.render(frame_number, frame).copy() for frame_number, frame in self.video.frames(start, stop)]
+
+    def close(self):
+        self.video.close()
+        self.renderer.close()
+
+
+_segment_renderer = None  # one per worker process
+_png_sink = None
+
+
+def _init_worker(job, streaming, instrument):
+    global _segment_renderer, _png_sink
+    # Forked workers inherit the measurements of the calling process, which would be counted twice
+    instrumentation.reset()
+    instrumentation.enable(instrument)
+    _segment_renderer = SegmentRenderer(job)
+    _png_sink = None if streaming else PngSink(job.output_dir)
+
+
+def _render_segment(segment):
+    return _segment_renderer.render_segment(*segment, _png_sink), instrumentation.collect()
+
+
+def _render_segment_frames(segment):
+    return _segment_renderer.render_segment_frames(*segment), instrumentation.collect()
+
+
+def _ordered_results(executor, function, segments, max_pending):
+    # Like executor.map, but submits a segment only when fewer than max_pending results are waiting
+    pending = deque()
+    for segment in segments:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, segment))
+    while pending:
+        yield pending.popleft().result()
+
+
+def plan_segments(n_frames, chunk_size):
+    """
+    Returns:
+        list: Contiguous (start, stop) frame ranges covering the timeline in order.
+    """
+    return [(start, min(start + chunk_size, n_frames)) for start in range(0, n_frames, chunk_size)]
+
+
+def worker_memory_mb(job):
+    """
+    Rough memory estimate of one worker: baseline, its copy of the sensor data and the figure buffers.
+    """
+    from pressure_renderer import FIGURE_SIZE, DPI
+
+    data_mb = (job.timestamps.nbytes + sum(values.nbytes for values in job.sensor_values)) / 1e6
+    canvas_mb = FIGURE_SIZE[0] * FIGURE_SIZE[1] * DPI ** 2 * 4 * 3 / 1e6  # canvas, background, RGB copy
+    return WORKER_BASE_MB + data_mb + canvas_mb
+
+
+def frame_memory_mb():
+    from pressure_renderer import FIGURE_SIZE, DPI
+
+    return FIGURE_SIZE[0] * FIGURE_SIZE[1] * DPI ** 2 * 3 / 1e6
+
+
+def render_frames(job, workers=1, chunk_size=None, memory_limit_mb=None, sink=None):
+    """
+    Render all frames of a job into job.output_dir, or stream them into a video sink.
+
+    Args:
+        job (RenderJob): The frames to render.
+        workers (int): Number of worker processes; 1 renders in the calling process.
+        chunk_size (int): Frames per segment. Defaults to an even split of the timeline across the workers,
+            capped at DEFAULT_CHUNK_SIZE, or STREAM_CHUNK_SIZE when frames are sent back to a sink.
+        memory_limit_mb (float): Optional memory limit for all workers together; fewer workers are started if the
+            estimated memory of the requested number of workers exceeds it. When streaming, the segment size is
+            also reduced so that the frames in flight fit into what the workers leave free.
+        sink: Optional sink with write(frame_number, rgb) and close() (see video_sink.open_sink). It is closed
+            when all frames are rendered.
+    """
+    if memory_limit_mb:
+        workers = max(1, min(workers, int(memory_limit_mb // worker_memory_mb(job))))
+    streaming = sink is not None and workers > 1
+    max_pending = 2 * workers  # segments rendered or being rendered ahead of the encoder
+    if chunk_size is None:
+        chunk_size = min(STREAM_CHUNK_SIZE if streaming else DEFAULT_CHUNK_SIZE, max(1, math.ceil(job.n_frames / workers)))
+    if streaming and memory_limit_mb:
+        free_mb = memory_limit_mb - workers * worker_memory_mb(job)
+        chunk_size = max(1, min(chunk_size, int(free_mb // (max_pending * frame_memory_mb()))))
+    segments = plan_segments(job.n_frames, chunk_size)
+    started = time.monotonic()
+
+    def progress(stop):
+        elapsed = time.monotonic() - started
+        print(f"Rendered frames up to {stop}/{job.n_frames} ({stop / elapsed:.1f} frames/s)")
+
+    if workers <= 1:
+        renderer = SegmentRenderer(job)
+        sink = sink or PngSink(job.output_dir)
+        try:
+            for segment in segments:
+                renderer.render_segment(*segment, sink)
+                progress(segment[1])
+        finally:
+            renderer.close()
+            sink.close()
+        return
+
+    print(f"Rendering {job.n_frames} frames in {len(segments)} segments with {workers} workers")
+    initargs = (job, streaming, instrumentation.enabled())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        if not streaming:
+            # map yields the segments in timeline order, whatever worker finished first
+            for (start, stop), timings in executor.map(_render_segment, segments):
+                instrumentation.merge(timings)
+                progress(stop)
+            return
+        try:
+            for (start, stop, frames), timings in _ordered_results(executor, _render_segment_frames, segments, max_pending):
+                instrumentation.merge(timings)
+                for frame_number, frame in zip(range(start, stop), frames):
+                    sink.write(frame_number, frame)
+                progress(stop)
+        finally:
+            sink.close()
@@ -0,0 +1,237 @@
+"""
+This module turns the pressures of the discrete sensor cells into continuous pressure maps, the centre of pressure
+and the loads of the heel, midfoot and forefoot.
+
+For every layout (config/foil_sensor_positions_*.csv) a sparse weight matrix from the 208 sensor cells to a
+millimetre grid is computed once: each grid cell inside the foot outline (the convex hull of the sensors plus a
+margin) is the inverse-distance weighted mean of its nearest sensors. The matrix is cached on disk, keyed by a hash
+of the layout file and the grid parameters, so it is only recomputed when the layout changes. A heatmap of one
+frame, or of a whole block of frames, is then a single sparse matrix product. Centre of pressure and regional loads
+are matrix products over the sensor axis as well.
+
+Command Line Arguments:
+    hdf5_path : Recording to analyse; every foot of the file is analysed.
+    --csv : Write the centre of pressure and the regional loads of every row to this CSV file.
+    --calibration : Optional calibration file with one pressure curve per sensor cell.
+
+Usage:
+    python pressure_map.py data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 --csv nrshoes_left_stone2_cop.csv
+
+    pressure_map = PressureMap.for_layout('sensor_left')
+    heatmaps = pressure_map.heatmap(pressures)  # (N, 208) kPa -> (N, height, width), NaN outside the foot
+    cop = pressure_map.centre_of_pressure(pressures)  # (N, 2) in mm
+    loads = pressure_map.region_loads(pressures)  # (N, 3) summed pressure of heel, midfoot and forefoot
+"""
+
+import argparse
+import hashlib
+import os
+import numpy as np
+from packet_decoder import N_SENSORS
+from sensor_layout import REPOSITORY_ROOT, SENSOR_LAYOUTS
+
+CACHE_DIR = os.path.join(REPOSITORY_ROOT, 'cache', 'pressure_map')
+RESOLUTION_MM = 2.0  # size of a grid cell
+NEIGHBOURS = 4  # sensors interpolated into each grid cell
+POWER = 2  # inverse-distance weighting exponent
+MARGIN_MM = 5.0  # the outline extends this far beyond the outermost sensors
+# Regions as fractions of the length of the sensor area, from the heel (low Y) to the toes (high Y)
+REGIONS = (('heel', 0.0, 0.3), ('midfoot', 0.3, 0.6), ('forefoot', 0.6, 1.0))
+
+
+def sensor_positions(points_csv):
+    """
+    Returns:
+        tuple: ((208, 2) X/Y positions in mm indexed by sensor ID - 1, (208,) bool mask of the sensors in the layout)
+    """
+    ids, x, y = np.loadtxt(points_csv, delimiter=',', skiprows=1, unpack=True)
+    index = ids.astype(int) - 1
+    positions = np.zeros((N_SENSORS, 2))
+    positions[index] = np.column_stack([x, y])
+    present = np.zeros(N_SENSORS, dtype=bool)
+    present[index] = True
+    return positions, present
+
+
+def compute_weights(positions, present, resolution_mm=RESOLUTION_MM, neighbours=NEIGHBOURS, power=POWER,
+                    margin_mm=MARGIN_MM):
+    """
+    Compute the inverse-distance weights from the sensors to the grid cells inside the foot outline.
+
+    Returns:
+        tuple: (weights, mask, origin) with the (n_cells, 208) CSR weight matrix whose rows sum to 1, the (height,
+        width) bool mask of the cells inside the outline and the X/Y position in mm of the centre of cell (0, 0).
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import cKDTree, Delaunay
+
+    sensor_index = np.flatnonzero(present)
+    points = positions[sensor_index]
+    low = np.floor(points.min(axis=0) - margin_mm)
+    high = np.ceil(points.max(axis=0) + margin_mm)
+    xs = np.arange(low[0], high[0] + resolution_mm / 2, resolution_mm)
+    ys = np.arange(low[1], high[1] + resolution_mm / 2, resolution_mm)
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)  # row-major, row 0 at the lowest Y
+
+    tree = cKDTree(points)
+    distances, nearest = tree.query(grid, k=min(neighbours, len(points)))
+    distances, nearest = distances.reshape(len(grid), -1), nearest.reshape(len(grid), -1)
+    inside = (Delaunay(points).find_simplex(grid) >= 0) | (distances[:, 0] <= margin_mm)
+
+    distances, nearest = distances[inside], nearest[inside]
+    weights = 1.0 / np.maximum(distances, 1e-6) ** power
+    weights /= weights.sum(axis=1, keepdims=True)
+    n_cells, k = weights.shape
+    matrix = csr_matrix((weights.ravel(), sensor_index[nearest].ravel(), np.arange(0, n_cells * k + 1, k)),
+                        shape=(n_cells, N_SENSORS))
+    return matrix, inside.reshape(len(ys), len(xs)), low
+
+
+def layout_key(points_csv, *params):
+    digest = hashlib.sha1()
+    with open(points_csv, 'rb') as f:
+        digest.update(f.read())
+    digest.update(repr(params).encode())
+    return digest.hexdigest()[:16]
+
+
+class PressureMap:
+    def __init__(self, positions, present, weights, mask, origin, resolution_mm=RESOLUTION_MM):
+        self.positions = positions
+        self.present = present
+        self.weights = weights
+        self.mask = mask
+        self.origin = origin
+        self.resolution_mm = resolution_mm
+        self.cells = np.flatnonzero(mask.ravel())
+
+        # Sensors of each region, as a (208, n_regions) matrix so all region sums are one product
+        y = positions[:, 1]
+        self.y_range = y[present].min(), y[present].max()
+        self.region_names = [name for name, _, _ in REGIONS]
+        self.region_matrix = np.zeros((N_SENSORS, len(REGIONS)))
+        self.region_matrix[np.arange(N_SENSORS), self.region_index(y)] = present
+
+    @classmethod
+    def for_layout(cls, dataset_name, resolution_mm=RESOLUTION_MM, neighbours=NEIGHBOURS, power=POWER,
+                   margin_mm=MARGIN_MM, cache_dir=CACHE_DIR):
+        """
+        Build (or load from the cache) the pressure map of 'sensor_left' or 'sensor_right'.
+        """
+        points_csv = SENSOR_LAYOUTS[dataset_name]['points_csv']
+        positions, present = sensor_positions(points_csv)
+        params = (resolution_mm, neighbours, power, margin_mm)
+        cache_path = os.path.join(cache_dir, f'{dataset_name}_{layout_key(points_csv, *params)}.npz') if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            from scipy.sparse import csr_matrix
+
+            cached = np.load(cache_path)
+            weights = csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=tuple(cached['shape']))
+            return cls(positions, present, weights, cached['mask'], cached['origin'], resolution_mm)
+
+        weights, mask, origin = compute_weights(positions, present, *params)
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(cache_path, data=weights.data, indices=weights.indices, indptr=weights.indptr,
+                     shape=np.array(weights.shape), mask=mask, origin=origin)
+        return cls(positions, present, weights, mask, origin, resolution_mm)
+
+    @property
+    def extent(self):
+        """
+        Returns:
+            list: [left, right, bottom, top] in mm, for imshow(heatmap, extent=..., origin='lower').
+        """
+        half = self.resolution_mm / 2
+        height, width = self.mask.shape
+        return [self.origin[0] - half, self.origin[0] + (width - 0.5) * self.resolution_mm,
+                self.origin[1] - half, self.origin[1] + (height - 0.5) * self.resolution_mm]
+
+    def heatmap(self, values):
+        """
+        Args:
+            values (numpy.ndarray): (208,) or (N, 208) pressures.
+
+        Returns:
+            numpy.ndarray: (height, width) or (N, height, width) float32 maps, NaN outside the foot outline.
+        """
+        values = np.asarray(values)
+        single = values.ndim == 1
+        block = np.atleast_2d(values)
+        cell_values = self.weights @ block.T  # (n_cells, N), one sparse product for the whole block
+        maps = np.full((len(block), self.mask.size), np.nan, dtype=np.float32)
+        maps[:, self.cells] = cell_values.T
+        maps = maps.reshape((len(block),) + self.mask.shape)
+        return maps[0] if single else maps
+
+    def centre_of_pressure(self, values):
+        """
+        Returns:
+            numpy.ndarray: (2,) or (N, 2) X/Y in mm of the pressure-weighted mean sensor position, NaN without load.
+        """
+        values = np.where(self.present, np.asarray(values, dtype=np.float64), 0.0)
+        total = values.sum(axis=-1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, (values @ self.positions) / total, np.nan)
+
+    def region_index(self, y):
+        """
+        Returns:
+            numpy.ndarray: Index into REGIONS of each Y position in mm (positions beyond the sensors are clipped).
+        """
+        y_min, y_max = self.y_range
+        fraction = (np.asarray(y, dtype=np.float64) - y_min) / (y_max - y_min)
+        bounds = [start for _, start, _ in REGIONS[1:]]
+        return np.searchsorted(bounds, np.nan_to_num(fraction), side='right')
+
+    def region_loads(self, values):
+        """
+        Returns:
+            numpy.ndarray: (3,) or (N, 3) summed pressure of the heel, midfoot and forefoot sensors (REGIONS).
+        """
+        return np.asarray(values, dtype=np.float64) @ self.region_matrix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute the centre of pressure and regional loads of a recording.')
+    parser.add_argument('hdf5_path', help='Path to the HDF5 file containing force data.')
+    parser.add_argument('--csv', default=None, help='Write the centre of pressure and loads of every row to this file.')
+    parser.add_argument('--calibration', default=None, help='Calibration file with per-cell pressure curves.')
+    args = parser.parse_args(argv)
+
+    import h5py
+    from recording import sensor_recordings
+    from velostat_sensor_to_pressure import DEFAULT_CALIBRATION, PressureCalibration
+
+    calibration = PressureCalibration.from_file(args.calibration) if args.calibration else DEFAULT_CALIBRATION
+    csv = open(args.csv, 'w') if args.csv else None
+    try:
+        if csv:
+            csv.write('foot,row,timestamp_ns,cop_x_mm,cop_y_mm,' + ','.join(f'{name}_kpa' for name, _, _ in REGIONS) + '\n')
+        with h5py.File(args.hdf5_path, 'r') as file:
+            for recording in sensor_recordings(file):
+                pressure_map = PressureMap.for_layout(recording.name)
+                # The foot is a constant prefix of every row of the chunk
+                csv_format = f'{recording.name},%d,%d,%.2f,%.2f,' + ','.join(['%.3f'] * len(REGIONS))
+                totals = np.zeros(len(REGIONS))
+                row = 0
+                for timestamps, values in recording.view().chunks():
+                    pressures = calibration.convert(values) / 1e3
+                    cop = pressure_map.centre_of_pressure(pressures)
+                    loads = pressure_map.region_loads(pressures)
+                    totals += loads.sum(axis=0)
+                    if csv:
+                        # One formatted write per chunk. The integer columns are stacked as objects, because a float64
+                        # stack would round the nanosecond timestamps (above 2**53)
+                        rows = np.arange(row, row + len(values)).astype(object)
+                        np.savetxt(csv, np.column_stack([rows, timestamps.astype(object), cop, loads]), fmt=csv_format)
+                    row += len(values)
+                shares = ', '.join(f'{name} {share:.0%}' for name, share in zip(pressure_map.region_names, totals / totals.sum()))
+                print(f"{SENSOR_LAYOUTS[recording.name]['label']}: {shares} of the total pressure")
+    finally:
+        if csv:
+            csv.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+This module renders the visualization frames of viz_generate_frames.py: the walking video (top left), the average
+pressure over time (bottom left) and the pressure at each sensor on the foot scan (right, one plot per foot).
+
+The figure is drawn completely only once. Everything that does not change between frames (foot scan images,
+colorbar, axes, time series) is cached as a background image, and for every frame only the dynamic artists are
+redrawn on top of it: the video image, one scatter collection per foot whose colours are set from a value array,
+and the time marker. The frame is returned as an RGB array straight from the canvas.
+
+Optionally (pressure_maps), each foot also shows the interpolated pressure map of pressure_map.py below the sensor
+dots and its centre of pressure.
+
+Usage:
+    renderer = FrameRenderer(timestamps, sensor_values, layouts, first_video_frame)
+    rgb = renderer.render(row, video_frame)
+    renderer.save_png('frame_0000.png')
+"""
+
+import math
+from datetime import datetime
+import numpy as np
+import matplotlib.dates as mdates
+import matplotlib.image as mpimg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.figure import Figure
+from matplotlib.colors import LogNorm
+from matplotlib.gridspec import GridSpec
+from matplotlib.ticker import LogLocator, ScalarFormatter
+from instrumentation import timer
+
+FIGURE_SIZE = (14.6, 8)
+DPI = 200
+
+
+def frame_size(dpi=DPI):
+    """
+    Returns:
+        tuple: (width, height) in pixels of the frames rendered at dpi, without building the figure.
+    """
+    return FigureCanvasAgg(Figure(figsize=FIGURE_SIZE, dpi=dpi)).get_width_height()
+
+
+class FrameRenderer:
+    def __init__(self, timestamps, sensor_values, layouts, first_video_frame, dpi=DPI, pressure_maps=None):
+        """
+        Build the figure and cache its static background.
+
+        Args:
+            timestamps (numpy.ndarray): int64 timestamps in ns of the rows of sensor_values.
+            sensor_values (list): One (N, 208) array of pressures in kPa per foot.
+            layouts (list): One (points_df, image_path, image_height_mm, scatter_size, label) tuple per foot.
+            first_video_frame (numpy.ndarray): RGB image; defines the size of the video display.
+            dpi (int): Resolution of the rendered frames.
+            pressure_maps (list): Optional pressure_map.PressureMap per foot to draw heatmaps and centre of pressure.
+        """
+        self.sensor_values = sensor_values
+        self.plot_times = [datetime.fromtimestamp(ts / 1e9) for ts in timestamps]
+
+        # Create main figure and subplots, drawn off-screen on their own Agg canvas independent of the pyplot backend
+        self.fig = Figure(figsize=FIGURE_SIZE, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        gs = GridSpec(2, 11, figure=self.fig)
+        ax0 = self.fig.add_subplot(gs[0, :5])
+        ax1 = self.fig.add_subplot(gs[1, :5])
+        ax2 = self.fig.add_subplot(gs[:, 5:8])
+        # Second foot of a recording logged with --log_both
+        foot_axes = [ax2, self.fig.add_subplot(gs[:, 8:11])] if len(sensor_values) > 1 else [ax2]
+
+        # Video display in ax0
+        self.im_video = ax0.imshow(first_video_frame, animated=True)
+        ax0.axis('off')  # Hide axes
+
+        # Plotting the time series in ax1
+        for values, layout in zip(sensor_values, layouts):
+            ax1.plot(self.plot_times, np.mean(values, axis=1), label=layout[4])
+        ax1.set_title('Average Pressure Over Time')
+        ax1.set_xlabel('UTC Time')
+        ax1.set_ylabel('Average Pressure (kPa)')
+        locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
+        formatter = mdates.ConciseDateFormatter(locator)
+        ax1.xaxis.set_major_locator(locator)
+        ax1.xaxis.set_major_formatter(formatter)
+        ax1.grid(True)
+        ax1.legend()
+
+        # Set the y-axis limit
+        ax1.set_ylim(top=8)
+
+        # Vertical line on the time series plot
+        self.vline = ax1.axvline(self.plot_times[0], color='r', animated=True)
+
+        # Color normalization
+        self.norm = LogNorm(vmin=min(values.min() for values in sensor_values) * 3.0, vmax=65)
+
+        # One scatter collection per foot; the colours are mapped from its value array when it is drawn
+        self.scatters = []
+        self.sensor_indices = []
+        self.pressure_maps = pressure_maps or []
+        self.heatmaps = []
+        self.cop_markers = []
+        for ax, layout, values in zip(foot_axes, layouts, sensor_values):
+            points_df, image_path, image_height_mm, scatter_size, label = layout
+            image = mpimg.imread(image_path)
+            image_width_mm = (image.shape[1] / image.shape[0]) * image_height_mm
+            ax.imshow(image, extent=[0, image_width_mm, 0, image_height_mm], cmap='gray', alpha=0.2)
+            ax.set_title(label)
+            ax.set_xlabel('Width (mm)')
+            ax.set_ylabel('Height (mm)')
+
+            if self.pressure_maps:
+                pressure_map = self.pressure_maps[len(self.scatters)]
+                limits = ax.get_xlim(), ax.get_ylim()
+                self.heatmaps.append(ax.imshow(np.full(pressure_map.mask.shape, np.nan), extent=pressure_map.extent,
+                                               origin='lower', cmap='jet', norm=self.norm, alpha=0.8,
+                                               interpolation='bilinear', animated=True))
+                self.cop_markers.append(ax.plot([], [], 'o', color='white', markeredgecolor='black', animated=True)[0])
+                ax.set_xlim(limits[0])
+                ax.set_ylim(limits[1])
+
+            sensor_index = points_df['ID'].to_numpy().astype(int) - 1
+            scatter = ax.scatter(points_df['X_in_mm'], points_df['Y_in_mm'], c=values[0, sensor_index], cmap='jet',
+                                 norm=self.norm, s=scatter_size, edgecolors='face', animated=True)
+            self.scatters.append(scatter)
+            self.sensor_indices.append(sensor_index)
+
+        # Colorbar setup
+        sm = ScalarMappable(cmap='jet', norm=self.norm)
+        cbar = self.fig.colorbar(sm, ax=foot_axes[-1], label='Pressure (kPa)')
+
+        # Define the number of ticks using LogLocator
+        cbar.ax.yaxis.set_major_locator(LogLocator(subs='all'))
+
+        # Formatter for the Colorbar ticks
+        formatter = ScalarFormatter()
+        formatter.set_scientific(False)
+        cbar.ax.yaxis.set_major_formatter(formatter)
+
+        self.fig.tight_layout()
+
+        # Draw the static parts once and keep them as the background of every frame
+        self.canvas = self.fig.canvas
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.dynamic_artists = [self.im_video, self.vline] + self.heatmaps + self.scatters + self.cop_markers
+
+    @property
+    def size(self):
+        """
+        Returns:
+            tuple: (width, height) of the rendered frames in pixels.
+        """
+        width, height = self.canvas.get_width_height()
+        return width, height
+
+    def video_display_size(self):
+        """
+        Returns:
+            tuple: (width, height) in pixels the video is drawn at; larger video frames are downscaled to this size
+            before they are drawn (see video_source.py).
+        """
+        height, width = self.im_video.get_size()
+        box = self.im_video.get_window_extent()
+        scale = min(box.width / width, box.height / height)
+        return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+    def render(self, row, video_frame=None, foot_values=None):
+        """
+        Render one frame.
+
+        Args:
+            row (int): Row of the sensor values (and time marker) to show.
+            video_frame (numpy.ndarray): RGB image for the video display; the previous image is kept if None.
+            foot_values (list): Optional values to show instead of row, one array per foot (e.g. interpolated).
+
+        Returns:
+            numpy.ndarray: (height, width, 3) uint8 RGB view of the canvas. It is overwritten by the next render.
+        """
+        if video_frame is not None:
+            self.im_video.set_data(video_frame)
+        with timer('scatter_update'):
+            for foot, (scatter, sensor_index) in enumerate(zip(self.scatters, self.sensor_indices)):
+                values = self.sensor_values[foot][row] if foot_values is None else foot_values[foot]
+                scatter.set_array(values[sensor_index])
+                if self.pressure_maps:
+                    pressure_map = self.pressure_maps[foot]
+                    self.heatmaps[foot].set_data(pressure_map.heatmap(values))
+                    cop_x, cop_y = pressure_map.centre_of_pressure(values)
+                    self.cop_markers[foot].set_data([cop_x], [cop_y])
+            self.vline.set_xdata([self.plot_times[row], self.plot_times[row]])
+
+        with timer('draw'):
+            self.canvas.restore_region(self.background)
+            for artist in self.dynamic_artists:
+                artist.axes.draw_artist(artist)
+        return self.rgb()
+
+    def rgb(self):
+        return np.asarray(self.canvas.buffer_rgba())[:, :, :3]
+
+    def save_png(self, path):
+        import cv2
+
+        cv2.imwrite(path, cv2.cvtColor(self.rgb(), cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        self.fig.clear()
@@ -0,0 +1,303 @@
+"""
+This module captures the decoded frames of the logger into a compact binary file and converts it into HDF5.
+
+In HDF5 the logger stores every frame as a float64 row (timestamp and 208 values, 1672 bytes). With
+log_velostat_sensor_h5.py --raw, each foot is captured into its own raw file instead, and the writer thread only
+copies every decoded block into a memory mapping:
+
+    header  : 4096 bytes - magic, format version, record size, capacity, number of rows, clock origin, device name,
+              state (open or closed) and, once the file is closed, the stream statistics as JSON
+    records : 216 bytes per row - int64 receive timestamp in ns and the 208 uint8 values of one validated frame
+
+The file is preallocated in steps of GROW_ROWS records (with posix_fallocate where available, so a full disk fails
+when the file grows and not while a block is copied into the mapping). Rows are copied first and the row count in the
+header is advanced afterwards, so the count never includes a partially written row and a crash of the logger loses
+nothing that was decoded before it. The mapping is synced to disk every flush_interval seconds; rows that had not
+reached the disk before a power loss read back as zeros and are dropped when the file is opened. On close, the rows
+and statistics are synced before the state is set to closed, and the file is truncated to its rows.
+
+The converter reads the records as one structured array and writes them block by block through
+recording.RecordingWriter, in the legacy layout or the compact schema, into the same chunked datasets the logger
+writes. Like the logger, it stores the alignment of the two feet of a session.
+
+Command Line Arguments:
+    convert raw_files : Convert the raw files of one session (one per foot) into one HDF5 recording.
+        --output : HDF5 file to create (default: the name of the raw files without the device and .raw).
+        --compact : Write the compact schema (recording.py) instead of float64 rows.
+        --chunk_rows : Rows per HDF5 chunk and per write (default 4096).
+    info raw_files : Print the device, rows, duration and size of raw files.
+
+Usage:
+    python log_velostat_sensor_h5.py --log_both --raw
+        sensor_both_2024-07-25-10-00-00_sensor_left.raw, sensor_both_2024-07-25-10-00-00_sensor_right.raw
+    python raw_capture.py convert sensor_both_2024-07-25-10-00-00_sensor_*.raw --compact
+        sensor_both_2024-07-25-10-00-00.h5
+"""
+
+import argparse
+import json
+import mmap
+import os
+import time
+import numpy as np
+from packet_decoder import N_SENSORS, PACKET_SIZE
+from hdf5_writer import DEFAULT_FLUSH_INTERVAL
+from instrumentation import timer
+
+MAGIC = b'FSRAW001'
+FORMAT_VERSION = 2
+HEADER_SIZE = 4096  # one page, so the records start page-aligned
+ATTRS_OFFSET = 128  # the statistics (JSON) follow the header fields up to HEADER_SIZE
+GROW_ROWS = 65536  # records added whenever the file is full, 14 MB or ~50 minutes at 21 Hz
+DEFAULT_CHUNK_ROWS = 4096
+STATE_OPEN = 1  # the logger is (or was, after a crash) still writing
+STATE_CLOSED = 2  # all rows and the statistics were synced by close()
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('record_size', '<u4'),
+    ('capacity', '<i8'),
+    ('count', '<i8'),
+    ('clock_origin_ns', '<i8'),
+    ('device', 'S32'),
+    ('attrs_size', '<u4'),
+    ('state', '<u4'),
+])
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('values', 'u1', (N_SENSORS,)),
+])
+# The timestamp replaces frame head, lengths and checksum: a row is as large as the frame on the wire
+assert RECORD_DTYPE.itemsize == PACKET_SIZE
+assert HEADER_DTYPE.itemsize <= ATTRS_OFFSET
+
+
+def raw_path(hdf5_file, device, n_devices=1):
+    """
+    Returns:
+        str: Raw file of a device, named after the HDF5 file the logger would write (with the device if there are
+        several), e.g. sensor_both_2024-07-25-10-00-00_sensor_left.raw.
+    """
+    stem = hdf5_file[:-len('.h5')] if hdf5_file.endswith('.h5') else hdf5_file
+    return f"{stem}.raw" if n_devices == 1 else f"{stem}_{device}.raw"
+
+
+class RawCaptureWriter:
+    def __init__(self, path, device, clock_origin_ns=0, flush_interval=DEFAULT_FLUSH_INTERVAL, grow_rows=GROW_ROWS):
+        """
+        Create a raw file and preallocate its first GROW_ROWS records.
+
+        Args:
+            path (str): File to create; an existing file is overwritten.
+            device (str): 'sensor_left' or 'sensor_right'.
+            clock_origin_ns (int): Wall-clock origin of the timestamps (acquisition.SessionClock).
+            flush_interval (float): Maximum time in seconds before written rows are synced to disk. Use 0 to sync
+                only on close.
+            grow_rows (int): Records added whenever the file is full.
+        """
+        self.path = path
+        self.device = device
+        self.flush_interval = flush_interval
+        self.grow_rows = max(1, int(grow_rows))
+        self.attrs = {}  # stored in the header on close, e.g. the stream statistics
+        self.file = open(path, 'w+b')
+        self.capacity = 0
+        self.rows_written = 0
+        self._grow(self.grow_rows)
+        self.header['magic'] = MAGIC
+        self.header['version'] = FORMAT_VERSION
+        self.header['record_size'] = RECORD_DTYPE.itemsize
+        self.header['clock_origin_ns'] = clock_origin_ns
+        self.header['device'] = device.encode()
+        self.header['state'] = STATE_OPEN
+        self.sync()
+
+    def _grow(self, rows):
+        # Only complete rows are counted, so the mapping can be replaced between two blocks
+        if self.capacity:
+            self.sync()
+            self._unmap()
+        self.capacity += rows
+        size = HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self.file.fileno(), 0, size)
+        else:
+            self.file.truncate(size)
+        # numpy views of a plain mmap, which can be closed explicitly once the views are dropped
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        self.mapping = np.frombuffer(self.mmap, dtype=np.uint8)
+        self.header = self.mapping[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        self.records = self.mapping[HEADER_SIZE:].view(RECORD_DTYPE)
+        self.header['capacity'] = self.capacity
+
+    def _unmap(self):
+        # mmap.close() fails while a numpy view still exports its buffer
+        del self.header, self.records, self.mapping
+        self.mmap.close()
+
+    def append_block(self, timestamps, sensor_values):
+        """
+        Args:
+            timestamps (numpy.ndarray): int64 timestamps in ns.
+            sensor_values (numpy.ndarray): (N, 208) uint8 sensor values.
+        """
+        end = self.rows_written + len(timestamps)
+        if end > self.capacity:
+            self._grow(max(self.grow_rows, end - self.capacity))
+        records = self.records[self.rows_written:end]
+        records['timestamp'] = timestamps
+        records['values'] = sensor_values
+        # The rows are complete before they are counted
+        self.rows_written = end
+        self.header['count'] = end
+        if self.flush_interval and time.monotonic() - self.last_sync >= self.flush_interval:
+            self.sync()
+
+    def sync(self):
+        with timer('raw_sync'):
+            self.mmap.flush()
+        self.last_sync = time.monotonic()
+
+    def timestamps(self):
+        """
+        Returns:
+            numpy.ndarray: int64 timestamps of all rows written so far.
+        """
+        return self.records['timestamp'][:self.rows_written].copy()
+
+    def close(self):
+        """
+        Store the attributes in the header, sync the rows, mark the file as closed and truncate it to the rows.
+        """
+        attrs = json.dumps(self.attrs, default=lambda value: value.item()).encode()
+        if ATTRS_OFFSET + len(attrs) <= HEADER_SIZE:
+            self.mapping[ATTRS_OFFSET:ATTRS_OFFSET + len(attrs)] = np.frombuffer(attrs, dtype=np.uint8)
+            self.header['attrs_size'] = len(attrs)
+        else:
+            print(f"{self.path}: the attributes do not fit into the header and are not stored.")
+        self.header['capacity'] = self.rows_written
+        self.sync()
+        # Only set once everything else is on disk, so a closed file is always complete
+        self.header['state'] = STATE_CLOSED
+        self.sync()
+        self._unmap()
+        self.file.truncate(HEADER_SIZE + self.rows_written * RECORD_DTYPE.itemsize)
+        self.file.close()
+
+
+class RawCapture:
+    def __init__(self, path):
+        """
+        Open a raw file for reading; the records are memory-mapped, so nothing is read until they are used.
+        """
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not a raw capture file.")
+        header = header[0]
+        if header['version'] != FORMAT_VERSION or header['record_size'] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} has format version {header['version']}, expected {FORMAT_VERSION}.")
+        self.device = header['device'].decode()
+        self.clock_origin_ns = int(header['clock_origin_ns'])
+        with open(path, 'rb') as f:
+            f.seek(ATTRS_OFFSET)
+            data = f.read(int(header['attrs_size']))
+        self.attrs = json.loads(data) if data else {}
+
+        # A file that was not closed still has its preallocated, unused records at the end
+        count = min(int(header['count']), (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize)
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,)) \
+            if count else np.zeros(0, dtype=RECORD_DTYPE)
+        # Rows counted but not synced before a power loss read back as zeros
+        while count and self.records['timestamp'][count - 1] == 0:
+            count -= 1
+        self.records = self.records[:count]
+        self.closed = header['state'] == STATE_CLOSED
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        return np.asarray(self.records['timestamp'])
+
+    def chunks(self, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Yields:
+            tuple: (timestamps, values) of consecutive blocks of at most chunk_rows rows.
+        """
+        for start in range(0, len(self.records), chunk_rows):
+            block = np.asarray(self.records[start:start + chunk_rows])
+            yield block['timestamp'], block['values']
+
+
+def default_output(raw_file, device):
+    """
+    Returns:
+        str: The HDF5 file the logger would have written, e.g. sensor_both_2024-07-25-10-00-00.h5.
+    """
+    stem = raw_file[:-len('.raw')] if raw_file.endswith('.raw') else raw_file
+    suffix = f'_{device}'
+    return (stem[:-len(suffix)] if stem.endswith(suffix) else stem) + '.h5'
+
+
+def convert(raw_files, destination_path, compact=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write the raw files of one session (one per foot) into one HDF5 recording.
+
+    Args:
+        compact (bool): Write the compact schema (recording.py) instead of float64 rows.
+        chunk_rows (int): Rows per HDF5 chunk; the rows are also read and written in blocks of this size.
+    """
+    import h5py
+    from recording import RecordingWriter
+    from sensor_layout import alignment_name
+    from timestamp_index import nearest_indices
+
+    captures = [RawCapture(path) for path in raw_files]
+    with h5py.File(destination_path, 'w') as hdf5:
+        hdf5.attrs.update({'clock': 'monotonic', 'clock_origin_ns': captures[0].clock_origin_ns})
+        for capture in captures:
+            writer = RecordingWriter(hdf5, capture.device, compact=compact, flush_rows=chunk_rows, flush_interval=0)
+            for timestamps, values in capture.chunks(chunk_rows):
+                writer.append_block(timestamps, values)
+            writer.close()
+            writer.attrs.update(capture.attrs)
+            print(f"{capture.path}: {len(capture)} rows of {capture.device}")
+
+        # The closest row of the other foot for every row, as written by the logger with --log_both
+        for source in captures:
+            for target in captures:
+                if source is not target and len(source) and len(target):
+                    hdf5.create_dataset(alignment_name(source.device, target.device),
+                                        data=nearest_indices(target.timestamps, source.timestamps))
+    print(f"Saved {destination_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert or inspect raw capture files of the logger.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='Convert the raw files of one session into an HDF5 recording.')
+    convert_parser.add_argument('raw_files', nargs='+', help='Raw files of the session, one per foot.')
+    convert_parser.add_argument('--output', default=None, help='HDF5 file to create.')
+    convert_parser.add_argument('--compact', action='store_true', help='Write the compact schema.')
+    convert_parser.add_argument('--chunk_rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows per HDF5 chunk.')
+    info_parser = commands.add_parser('info', help='Print the device, rows and duration of raw files.')
+    info_parser.add_argument('raw_files', nargs='+', help='Raw files to inspect.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        output = args.output or default_output(args.raw_files[0], RawCapture(args.raw_files[0]).device)
+        convert(args.raw_files, output, compact=args.compact, chunk_rows=args.chunk_rows)
+        return
+    for path in args.raw_files:
+        capture = RawCapture(path)
+        timestamps = capture.timestamps
+        duration = (timestamps[-1] - timestamps[0]) / 1e9 if len(timestamps) else 0
+        state = '' if capture.closed else ' (not closed, e.g. after a crash)'
+        print(f"{path}: {capture.device}, {len(capture)} rows, {duration:.1f} s, {os.path.getsize(path)} bytes{state}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+This module reads and writes sensor recordings without loading whole files into float64 arrays.
+
+Two on-disk schemas are supported for every foot (sensor_left / sensor_right):
+
+    legacy  : one dataset of shape (N, 209), float64, column 0 the timestamp in ns and columns 1-208 the sensor values
+    compact : one group with a 'timestamps' dataset (N,) int64 and a 'values' dataset (N, 208) uint8, ~8x smaller
+
+A SensorRecording gives both the same interface: int64 timestamps and uint8 (or float32) values, read lazily.
+RecordingView objects select a row range (by index or by time) and a subset of sensors without reading anything,
+and read their rows at once or chunk by chunk. Contiguous (unchunked, uncompressed) datasets, as written by the
+convert command, are memory-mapped with numpy, so random access into long sessions only touches the pages it needs.
+
+Command Line Arguments:
+    convert source destination : Copy a (legacy) recording into the compact schema with contiguous datasets.
+        --chunked : Keep the datasets chunked (resizable) instead of contiguous.
+    info path : Print the schema, rows, duration and size of the values of each foot.
+
+Usage:
+    python recording.py convert sensor_left_2024-07-25.h5 sensor_left_2024-07-25_compact.h5
+    python recording.py info sensor_left_2024-07-25_compact.h5
+
+Example:
+    import h5py
+    from recording import sensor_recordings
+
+    with h5py.File('sensor_both_2024-07-25.h5', 'r') as file:
+        for recording in sensor_recordings(file):
+            view = recording.view().between(start_ns, end_ns).select([0, 1, 2])
+            for timestamps, values in view.chunks(4096):
+                ...
+"""
+
+import argparse
+import h5py
+import numpy as np
+from packet_decoder import N_SENSORS
+from sensor_layout import sensor_datasets
+from hdf5_writer import BufferedH5Writer, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL
+
+TIMESTAMPS = 'timestamps'
+VALUES = 'values'
+DEFAULT_CHUNK_ROWS = 4096
+
+
+def memory_map(dataset):
+    """
+    Returns:
+        numpy.memmap: The data of a contiguous, uncompressed dataset mapped read-only, or None if it is chunked or not
+        allocated yet.
+    """
+    if dataset.chunks is not None or dataset.compression is not None or dataset.size == 0:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+
+class SensorRecording:
+    def __init__(self, file, name):
+        """
+        Args:
+            file (h5py.File): An open recording.
+            name (str): 'sensor_left' or 'sensor_right'.
+        """
+        self.name = name
+        self.node = file[name]
+        self.compact = isinstance(self.node, h5py.Group)
+        if self.compact:
+            self.timestamps_data = memory_map(self.node[TIMESTAMPS])
+            self.values_data = memory_map(self.node[VALUES])
+            if self.timestamps_data is None:
+                self.timestamps_data = self.node[TIMESTAMPS]
+            if self.values_data is None:
+                self.values_data = self.node[VALUES]
+        self._timestamps = None
+
+    def __len__(self):
+        return len(self.node[TIMESTAMPS]) if self.compact else len(self.node)
+
+    @property
+    def attrs(self):
+        return self.node.attrs
+
+    @property
+    def timestamps(self):
+        """
+        int64 timestamps in ns of all rows. They are read once (8 bytes per row) and kept for time lookups.
+        """
+        if self._timestamps is None:
+            if self.compact:
+                self._timestamps = np.asarray(self.timestamps_data[:], dtype=np.int64)
+            else:
+                self._timestamps = self.node[:, 0].astype(np.int64)
+        return self._timestamps
+
+    def read(self, start, stop, sensors=None, dtype=np.uint8):
+        """
+        Read the sensor values of rows start:stop.
+
+        Args:
+            start, stop (int): Row range.
+            sensors (numpy.ndarray): Optional sorted sensor indices (0-207, i.e. layout ID - 1).
+            dtype: uint8 (the raw values), float32 or any other numpy type.
+
+        Returns:
+            numpy.ndarray: (stop - start, n_sensors) array.
+        """
+        if self.compact:
+            values = self.values_data[start:stop]
+            if sensors is not None:
+                values = values[:, sensors]
+        elif sensors is None:
+            values = self.node[start:stop, 1:]
+        else:
+            values = self.node[start:stop][:, np.asarray(sensors) + 1]
+        return np.asarray(values).astype(dtype, copy=False)
+
+    def take(self, rows, sensors=None, dtype=np.uint8):
+        """
+        Read the values of arbitrary rows (e.g. from an alignment), reading only the range they span.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, N_SENSORS if sensors is None else len(sensors)), dtype=dtype)
+        first = int(rows.min())
+        return self.read(first, int(rows.max()) + 1, sensors, dtype)[rows - first]
+
+    def view(self):
+        return RecordingView(self)
+
+
+class RecordingView:
+    def __init__(self, recording, start=0, stop=None, sensors=None):
+        """
+        A lazily sliced part of a recording; nothing is read until timestamps, values() or chunks() are used.
+
+        Args:
+            recording (SensorRecording): The recording.
+            start, stop (int): Row range of the view.
+            sensors (numpy.ndarray): Optional sorted sensor indices (0-207).
+        """
+        self.recording = recording
+        n_rows = len(recording)
+        self.start = min(max(0, start), n_rows)
+        self.stop = n_rows if stop is None else min(max(self.start, stop), n_rows)
+        self.sensors = sensors
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, rows):
+        # Row slices relative to the view, e.g. view[27:151]
+        start, stop, step = rows.indices(len(self))
+        if step != 1:
+            raise ValueError("Views only support contiguous row ranges.")
+        return RecordingView(self.recording, self.start + start, self.start + stop, self.sensors)
+
+    def between(self, start_ns=None, end_ns=None):
+        """
+        Returns:
+            RecordingView: The rows with start_ns <= timestamp < end_ns (binary search on the timestamps).
+        """
+        timestamps = self.timestamps
+        start = 0 if start_ns is None else int(np.searchsorted(timestamps, start_ns, side='left'))
+        stop = len(self) if end_ns is None else int(np.searchsorted(timestamps, end_ns, side='left'))
+        return self[start:stop]
+
+    def select(self, sensors):
+        """
+        Returns:
+            RecordingView: The same rows restricted to the given sensor indices (0-207).
+        """
+        sensors = np.asarray(sensors, dtype=np.int64)
+        if self.sensors is not None:
+            sensors = np.asarray(self.sensors)[sensors]
+        return RecordingView(self.recording, self.start, self.stop, np.sort(sensors))
+
+    @property
+    def timestamps(self):
+        return self.recording.timestamps[self.start:self.stop]
+
+    def values(self, dtype=np.uint8):
+        return self.recording.read(self.start, self.stop, self.sensors, dtype)
+
+    def chunks(self, chunk_rows=DEFAULT_CHUNK_ROWS, dtype=np.uint8):
+        """
+        Yields:
+            tuple: (timestamps, values) of consecutive blocks of at most chunk_rows rows.
+        """
+        timestamps = self.timestamps
+        for start in range(self.start, self.stop, chunk_rows):
+            stop = min(start + chunk_rows, self.stop)
+            yield timestamps[start - self.start:stop - self.start], self.recording.read(start, stop, self.sensors, dtype)
+
+
+def sensor_recordings(file):
+    """
+    Returns:
+        list: A SensorRecording for each foot in the file, left foot first.
+    """
+    return [SensorRecording(file, name) for name in sensor_datasets(file)]
+
+
+class RecordingWriter:
+    def __init__(self, hdf5, name, compact=False, flush_rows=DEFAULT_FLUSH_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 chunk_rows=None, compression=None):
+        """
+        Append rows of one foot to a recording in the legacy or the compact schema (see BufferedH5Writer for the
+        buffering arguments).
+        """
+        self.compact = compact
+        writer_args = dict(flush_rows=flush_rows, flush_interval=flush_interval, chunk_rows=chunk_rows, compression=compression)
+        if compact:
+            group = hdf5.require_group(name)
+            self.node = group
+            self.writers = [BufferedH5Writer(group, TIMESTAMPS, n_columns=None, dtype='int64', **writer_args),
+                            BufferedH5Writer(group, VALUES, n_columns=N_SENSORS, dtype='uint8', **writer_args)]
+        else:
+            self.writers = [BufferedH5Writer(hdf5, name, n_columns=N_SENSORS + 1, dtype='float64', **writer_args)]
+            self.node = self.writers[0].dataset
+
+    @property
+    def attrs(self):
+        return self.node.attrs
+
+    @property
+    def rows_written(self):
+        return self.writers[0].rows_written
+
+    def append_block(self, timestamps, sensor_values):
+        """
+        Args:
+            timestamps (numpy.ndarray): int64 timestamps in ns.
+            sensor_values (numpy.ndarray): (N, 208) uint8 sensor values.
+        """
+        if self.compact:
+            self.writers[0].append_block(timestamps)
+            self.writers[1].append_block(sensor_values)
+            return
+        rows = np.empty((len(sensor_values), N_SENSORS + 1), dtype='float64')
+        rows[:, 0] = timestamps
+        rows[:, 1:] = sensor_values
+        self.writers[0].append_block(rows)
+
+    def timestamps(self):
+        """
+        Returns:
+            numpy.ndarray: int64 timestamps of all rows written so far.
+        """
+        if self.compact:
+            return self.writers[0].dataset[:].astype(np.int64)
+        return self.writers[0].dataset[:, 0].astype(np.int64)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def convert(source_path, destination_path, contiguous=True, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Copy a recording into the compact schema, chunk by chunk. Groups and attributes other than the sensor data
+    (alignment, gait_events, statistics) are copied as they are.
+
+    Args:
+        contiguous (bool): Write contiguous datasets, which SensorRecording memory-maps; otherwise chunked ones.
+    """
+    with h5py.File(source_path, 'r') as source, h5py.File(destination_path, 'w') as destination:
+        destination.attrs.update(source.attrs)
+        names = sensor_datasets(source)
+        for key in source:
+            if key not in names:
+                source.copy(source[key], destination, name=key)
+        for recording in sensor_recordings(source):
+            n_rows = len(recording)
+            group = destination.create_group(recording.name)
+            group.attrs.update(recording.attrs)
+            layout = {} if contiguous else {'chunks': True, 'maxshape': (None,)}
+            timestamps = group.create_dataset(TIMESTAMPS, data=recording.timestamps, **layout)
+            if not contiguous:
+                layout['maxshape'] = (None, N_SENSORS)
+            values = group.create_dataset(VALUES, shape=(n_rows, N_SENSORS), dtype='uint8', **layout)
+            for start in range(0, n_rows, chunk_rows):
+                stop = min(start + chunk_rows, n_rows)
+                values[start:stop] = recording.read(start, stop)
+            print(f"{recording.name}: {n_rows} rows, {timestamps.nbytes + values.nbytes} bytes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert or inspect sensor recordings.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='Copy a recording into the compact schema.')
+    convert_parser.add_argument('source', help='Recording to convert.')
+    convert_parser.add_argument('destination', help='Compact recording to create.')
+    convert_parser.add_argument('--chunked', action='store_true', help='Write chunked instead of contiguous datasets.')
+    info_parser = commands.add_parser('info', help='Print the schema and size of a recording.')
+    info_parser.add_argument('path', help='Recording to inspect.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        convert(args.source, args.destination, contiguous=not args.chunked)
+        return
+    with h5py.File(args.path, 'r') as file:
+        for recording in sensor_recordings(file):
+            timestamps = recording.timestamps
+            duration = (timestamps[-1] - timestamps[0]) / 1e9 if len(timestamps) else 0
+            schema = 'compact' if recording.compact else 'legacy'
+            mapped = ' (memory-mapped)' if recording.compact and isinstance(recording.values_data, np.memmap) else ''
+            print(f"{recording.name}: {schema}{mapped}, {len(recording)} rows, {duration:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
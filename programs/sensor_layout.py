@@ -0,0 +1,107 @@
+"""
+This module describes the sensor layout belonging to each HDF5 dataset (sensor positions, foot scan image, label)
+and reads the cross-device alignment stored by log_velostat_sensor_h5.py --log_both.
+
+Usage:
+    from sensor_layout import sensor_datasets, load_layout
+    with h5py.File(path, 'r') as file:
+        for dataset_name in sensor_datasets(file):
+            points_df, image_path, image_height_mm, scatter_size, label = load_layout(dataset_name)
+
+The config/, images/ and cache/ paths are resolved from the repository root (REPOSITORY_ROOT), so the programs can be
+run from any directory.
+"""
+
+import os
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SENSOR_LAYOUTS = {
+    # our sensor is labeled with 'Velostat Sensor **'
+    'sensor_left': {
+        'points_csv': os.path.join(REPOSITORY_ROOT, 'config/foil_sensor_positions_left.csv'),
+        'image_path': os.path.join(REPOSITORY_ROOT, 'images/foot_sole_sensor_scan_left.png'),
+        'image_height_mm': 255,
+        'scatter_size': 150,
+        'label': 'Velostat Sensor Left',
+    },
+    'sensor_right': {
+        'points_csv': os.path.join(REPOSITORY_ROOT, 'config/foil_sensor_positions_right.csv'),
+        'image_path': os.path.join(REPOSITORY_ROOT, 'images/foot_sole_sensor_scan_right.png'),
+        'image_height_mm': 255,
+        'scatter_size': 150,
+        'label': 'Velostat Sensor Right',
+    },
+}
+
+ALIGNMENT_GROUP = 'alignment'
+
+
+def sensor_datasets(file):
+    """
+    Args:
+        file (h5py.File): An open recording.
+
+    Returns:
+        list: Names of the supported sensor datasets in the file, left foot first.
+    """
+    names = [name for name in SENSOR_LAYOUTS if name in file]
+    if not names:
+        raise ValueError("HDF5 dataset not supported.")
+    return names
+
+
+def load_layout(dataset_name):
+    """
+    Args:
+        dataset_name (str): 'sensor_left' or 'sensor_right'.
+
+    Returns:
+        tuple: (points_df, image_path, image_height_mm, scatter_size, label), points sorted by sensor ID.
+    """
+    import pandas as pd
+
+    if dataset_name not in SENSOR_LAYOUTS:
+        raise ValueError("HDF5 dataset not supported.")
+    layout = SENSOR_LAYOUTS[dataset_name]
+    points_df = pd.read_csv(layout['points_csv']).sort_values(by='ID', na_position='first')
+    return points_df, layout['image_path'], layout['image_height_mm'], layout['scatter_size'], layout['label']
+
+
+def alignment_name(source, target):
+    return f'{ALIGNMENT_GROUP}/{source}_to_{target}'
+
+
+def read_alignment(file, source, target):
+    """
+    Read the precomputed row mapping between two devices of one recording.
+
+    The logger stores the mapping only when it is closed, so a recording of a crashed logger has none (and the raw
+    files of --raw get it when they are converted). If it is missing or does not cover every row of source, it is
+    computed again from the timestamps of both devices with timestamp_index.nearest_indices; the file is not changed.
+
+    Args:
+        file (h5py.File): An open recording written with --log_both.
+        source (str): Dataset whose rows are mapped, e.g. 'sensor_left'.
+        target (str): Dataset the rows are mapped to, e.g. 'sensor_right'.
+
+    Returns:
+        numpy.ndarray: For each row of source, the row of target with the closest timestamp.
+    """
+    from recording import SensorRecording
+
+    if source not in file or target not in file:
+        raise KeyError(f"No alignment from {source} to {target}: the recording does not contain both devices.")
+    source_recording = SensorRecording(file, source)
+    name = alignment_name(source, target)
+    if name in file and len(file[name]) == len(source_recording):
+        return file[name][:]
+
+    target_recording = SensorRecording(file, target)
+    if len(source_recording) == 0 or len(target_recording) == 0:
+        raise KeyError(f"No alignment from {source} to {target}: one of the devices has no rows.")
+
+    from timestamp_index import nearest_indices
+
+    print(f"No stored alignment from {source} to {target}; computing it from the timestamps.")
+    return nearest_indices(target_recording.timestamps, source_recording.timestamps)
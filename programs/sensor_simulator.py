@@ -0,0 +1,269 @@
+"""
+This script simulates the FootSole controller, so the logger can be run and tested without the insoles.
+
+Every simulated device is a pseudo-terminal pair: the simulator writes well-formed 216-byte frames (frame_head,
+checksum and 208 sensor bytes, packet_decoder.encode_frames) into the master side, and the logger opens the slave
+side like a USB serial port. The frames are either a synthetic gait pattern at a configurable rate or the rows of an
+existing HDF5 recording, replayed with their original timing (or at --rate). Frames are sent on schedule from a
+monotonic clock, so the rate does not drift. Byte drops and corrupted bytes can be injected at given rates to test
+the resynchronization of the logger.
+
+Like a real device, the simulator never waits for the reader: bytes that do not fit into the full pseudo-terminal
+buffer are lost (bytes_overflowed), so a logger that cannot keep up shows up as frame loss.
+
+Command Line Arguments:
+    --devices : Devices to simulate (default sensor_left); one pseudo-terminal is opened per device.
+    --rate : Frames per second of each device (default 21; for a replay, the default is the recorded timing).
+    --replay : HDF5 recording to replay; each device replays the foot with its name, or the first foot.
+    --loop : Start the replay again at the end (synthetic data always loops). Without it, the ports stay open but
+        silent after the replay.
+    --duration : Stop after this many seconds (default: until Ctrl-C).
+    --start_delay : Seconds to wait before the first frame, e.g. until the logger has opened the port (default 0).
+    --drop_rate : Fraction of frames in which one byte is dropped (default 0).
+    --corrupt_rate : Fraction of frames in which one byte is corrupted (default 0).
+    --seed : Seed of the synthetic data and of the injected faults.
+    --report : Write the statistics of every device to this JSON file at the end.
+
+Usage:
+    python sensor_simulator.py --devices sensor_left sensor_right --rate 21
+        sensor_left: /dev/pts/3
+        sensor_right: /dev/pts/4
+    python log_velostat_sensor_h5.py --log_both --port_left /dev/pts/3 --port_right /dev/pts/4
+
+    python sensor_simulator.py --replay data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 --drop_rate 0.01
+
+    benchmark_soak.py uses the simulator to measure the sustained frame rate, the loss rate and the memory growth of
+    the logger.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+from packet_decoder import encode_frames, PACKET_SIZE, N_SENSORS
+
+FRAME_RATE_HZ = 21  # frame rate of the controller
+WRITE_INTERVAL = 0.005  # seconds between two writes; all frames that are due are written at once
+LOOP_SECONDS = 10  # length of the synthetic pattern, repeated for longer runs
+STRIDE_S = 1.1  # synthetic gait: duration of one stride ...
+STANCE_S = 0.65  # ... of which the foot is on the ground
+
+
+def synthetic_gait(n_rows, rate_hz=FRAME_RATE_HZ, seed=0):
+    """
+    Returns:
+        numpy.ndarray: (n_rows, 208) uint8 sensor values of a walking pattern (one pressure bump per stance phase)
+        with sensor noise.
+    """
+    t = np.arange(n_rows) / rate_hz
+    phase = (t % STRIDE_S) / STANCE_S
+    mean = 2 + 40 * np.where(phase < 1, np.sin(np.pi * np.clip(phase, 0, 1)), 0)
+    noise = np.random.default_rng(seed).normal(0, 6, (n_rows, N_SENSORS))
+    return np.clip(mean[:, None] + noise, 0, 255).astype(np.uint8)
+
+
+def load_replay(path, device):
+    """
+    Returns:
+        tuple: (offsets, values) with the time of each row in seconds since the first row and its uint8 sensor
+        values, of the foot named device (or the first foot of the file).
+    """
+    import h5py
+    from recording import sensor_recordings
+
+    with h5py.File(path, 'r') as file:
+        recordings = {recording.name: recording for recording in sensor_recordings(file)}
+        recording = recordings.get(device, next(iter(recordings.values())))
+        timestamps = recording.timestamps
+        return (timestamps - timestamps[0]) / 1e9, recording.view().values()
+
+
+class FaultInjector:
+    def __init__(self, drop_rate=0.0, corrupt_rate=0.0, seed=0):
+        """
+        Args:
+            drop_rate (float): Fraction of frames that lose one byte.
+            corrupt_rate (float): Fraction of frames in which one byte is inverted.
+        """
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.rng = np.random.default_rng(seed)
+        self.dropped_bytes = 0
+        self.corrupted_frames = 0
+        self.damaged_frames = 0
+
+    def apply(self, data):
+        """
+        Returns:
+            bytes: The encoded frames with the faults applied.
+        """
+        if not self.drop_rate and not self.corrupt_rate:
+            return data
+        stream = np.frombuffer(data, dtype=np.uint8).copy()
+        n_frames = len(stream) // PACKET_SIZE
+        corrupted = np.flatnonzero(self.rng.random(n_frames) < self.corrupt_rate)
+        stream[corrupted * PACKET_SIZE + self.rng.integers(0, PACKET_SIZE, len(corrupted))] ^= 0xFF
+        dropped = np.flatnonzero(self.rng.random(n_frames) < self.drop_rate)
+        stream = np.delete(stream, dropped * PACKET_SIZE + self.rng.integers(0, PACKET_SIZE, len(dropped)))
+        self.corrupted_frames += len(corrupted)
+        self.dropped_bytes += len(dropped)
+        self.damaged_frames += len(np.union1d(corrupted, dropped))
+        return stream.tobytes()
+
+
+def open_pty():
+    """
+    Returns:
+        tuple: (master_fd, slave_fd, port) of a new pseudo-terminal in raw mode; the master is non-blocking.
+    """
+    import pty
+    import tty
+
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    os.set_blocking(master_fd, False)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+class SimulatedDevice(threading.Thread):
+    def __init__(self, name, fd, values, offsets, stop_event, faults=None, loop=True):
+        """
+        Args:
+            name (str): Device name, e.g. 'sensor_left'.
+            fd (int): Non-blocking file descriptor the frames are written to.
+            values (numpy.ndarray): (N, 208) uint8 sensor values of the frames.
+            offsets (numpy.ndarray): Send time of each frame in seconds after the start.
+            stop_event (threading.Event): Stops the device.
+            faults (FaultInjector): Optional faults applied to the frames before they are written.
+            loop (bool): Start again with the first frame after the last one.
+        """
+        super().__init__(name=f'{name}-simulator', daemon=True)
+        self.device = name
+        self.fd = fd
+        self.frames = np.frombuffer(encode_frames(values), dtype=np.uint8).reshape(-1, PACKET_SIZE)
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        # The pattern repeats after the last frame plus one frame interval
+        interval = np.median(np.diff(self.offsets)) if len(self.offsets) > 1 else 1.0 / FRAME_RATE_HZ
+        self.period = self.offsets[-1] + interval
+        self.stop_event = stop_event
+        self.faults = faults
+        self.loop = loop
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.bytes_overflowed = 0
+        self.elapsed = 0.0
+        self.finished = False
+
+    def frames_due(self, elapsed):
+        n = len(self.offsets)
+        due = int(elapsed // self.period) * n + int(np.searchsorted(self.offsets, elapsed % self.period, side='right'))
+        return due if self.loop else min(due, n)
+
+    def run(self):
+        n = len(self.offsets)
+        start = time.monotonic()
+        while not self.stop_event.wait(WRITE_INTERVAL):
+            self.elapsed = time.monotonic() - start
+            due = self.frames_due(self.elapsed)
+            if due > self.frames_sent:
+                # The frames of one write may wrap around the end of the pattern
+                self.write(self.frames[np.arange(self.frames_sent, due) % n].tobytes())
+                self.frames_sent = due
+            if not self.loop and self.frames_sent >= n:
+                self.finished = True
+                break
+
+    def write(self, data):
+        if self.faults is not None:
+            data = self.faults.apply(data)
+        try:
+            written = os.write(self.fd, data)
+        except BlockingIOError:
+            written = 0
+        # A real device does not wait for the host either; what does not fit is lost
+        self.bytes_sent += written
+        self.bytes_overflowed += len(data) - written
+
+    def stats(self):
+        stats = {
+            'frames_sent': self.frames_sent,
+            'frame_rate': self.frames_sent / self.elapsed if self.elapsed else 0.0,
+            'bytes_sent': self.bytes_sent,
+            'bytes_overflowed': self.bytes_overflowed,
+        }
+        if self.faults is not None:
+            stats.update(dropped_bytes=self.faults.dropped_bytes, corrupted_frames=self.faults.corrupted_frames,
+                         damaged_frames=self.faults.damaged_frames)
+        return stats
+
+    def summary(self):
+        stats = self.stats()
+        summary = (f"{self.device}: {stats['frames_sent']} frames sent ({stats['frame_rate']:.1f} Hz), "
+                   f"{stats['bytes_overflowed']} bytes overflowed")
+        if self.faults is not None:
+            summary += f", {stats['dropped_bytes']} bytes dropped, {stats['corrupted_frames']} frames corrupted"
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate FootSole controllers on pseudo-terminals.')
+    parser.add_argument('--devices', nargs='+', default=['sensor_left'], choices=['sensor_left', 'sensor_right'], help='Devices to simulate.')
+    parser.add_argument('--rate', type=float, default=None, help='Frames per second of each device.')
+    parser.add_argument('--replay', default=None, help='HDF5 recording to replay.')
+    parser.add_argument('--loop', action='store_true', help='Start the replay again at the end.')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds.')
+    parser.add_argument('--start_delay', type=float, default=0.0, help='Seconds to wait before the first frame.')
+    parser.add_argument('--drop_rate', type=float, default=0.0, help='Fraction of frames in which one byte is dropped.')
+    parser.add_argument('--corrupt_rate', type=float, default=0.0, help='Fraction of frames in which one byte is corrupted.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data and the injected faults.')
+    parser.add_argument('--report', default=None, help='Write the statistics of every device to this JSON file.')
+    args = parser.parse_args(argv)
+
+    stop_event = threading.Event()
+    devices, fds = [], []
+    for seed, device in enumerate(args.devices, start=args.seed):
+        if args.replay:
+            offsets, values = load_replay(args.replay, device)
+            if args.rate:
+                offsets = np.arange(len(values)) / args.rate
+        else:
+            rate = args.rate or FRAME_RATE_HZ
+            values = synthetic_gait(max(1, round(LOOP_SECONDS * rate)), rate, seed)
+            offsets = np.arange(len(values)) / rate
+        faults = FaultInjector(args.drop_rate, args.corrupt_rate, seed) if args.drop_rate or args.corrupt_rate else None
+        master_fd, slave_fd, port = open_pty()
+        fds += [master_fd, slave_fd]
+        devices.append(SimulatedDevice(device, master_fd, values, offsets, stop_event, faults,
+                                       loop=args.loop or not args.replay))
+        print(f"{device}: {port}", flush=True)
+
+    try:
+        time.sleep(args.start_delay)
+        for device in devices:
+            device.start()
+        deadline = None if args.duration is None else time.monotonic() + args.duration
+        finished = False
+        while deadline is None or time.monotonic() < deadline:
+            if not finished and all(device.finished for device in devices):
+                # Like a device that stops sending, the ports stay open, so the logger does not see a disconnect
+                finished = True
+                print("Replay finished; the ports stay open.", flush=True)
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for device in devices:
+            device.join()
+            print(device.summary(), flush=True)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({device.device: device.stats() for device in devices}, f, indent=2)
+        for fd in fds:
+            os.close(fd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+This script summarizes every step of many recordings in one table, e.g. to compare shoes or terrains
+(normal shoes / fullsoul, wiese / stein) without looking through the rendered videos.
+
+The recordings of a folder are processed in parallel processes. Steps are segmented with the gait events of
+gait_events.py (heel strike to toe-off), and for every step the following is computed from the calibrated pressures,
+for the whole foot and for the heel, midfoot and forefoot (pressure_map.REGIONS):
+
+    contact_time_s : time from heel strike to toe-off
+    peak_kpa       : highest pressure of any sensor during the step
+    pti_kpa_s      : pressure-time integral, the highest time integral of the pressure of any sensor
+    cop_path_mm    : length of the centre-of-pressure path (per region: the part of the path within the region)
+
+The table is written column by column to an HDF5 file (one dataset per column in the group 'steps') or, for a
+.parquet output, with pandas (needs pyarrow or fastparquet, checked before any recording is processed). The result of
+every recording is cached under cache/step_summary of the repository, keyed by a hash of the file content and the
+analysis settings, so a re-run only processes new or changed recordings.
+
+Command Line Arguments:
+    paths : HDF5 recordings and/or folders; folders are searched recursively for *.h5 files.
+    --output : Summary table, .h5 or .parquet (default step_summary.h5).
+    --workers : Number of processes (default: number of CPU cores).
+    --calibration : Optional calibration file with one pressure curve per sensor cell.
+    --no_cache : Process every recording again.
+
+Usage:
+    python step_summary.py data --output step_summary.h5 --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+from sensor_layout import REPOSITORY_ROOT
+
+CACHE_DIR = os.path.join(REPOSITORY_ROOT, 'cache', 'step_summary')
+PARQUET_ENGINES = ('pyarrow', 'fastparquet')  # engines pandas can write .parquet files with
+SUMMARY_VERSION = 1  # increase when the computed columns change, so cached results are not reused
+HASH_BLOCK = 1 << 20
+SUMMARY_GROUP = 'steps'
+
+
+def file_hash(path, extra=''):
+    """
+    Returns:
+        str: SHA-1 of the file content (read in 1 MB blocks) and the extra settings string.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    digest.update(extra.encode())
+    return digest.hexdigest()
+
+
+def step_ranges(events):
+    """
+    Pair each heel strike with the next toe-off.
+
+    Returns:
+        tuple: (start_rows, stop_rows) of the complete steps; stop is the toe-off row (inclusive).
+    """
+    from gait_events import EVENT_KINDS
+
+    strikes = events['row'][events['kind'] == EVENT_KINDS.index('heel_strike')]
+    toe_offs = events['row'][events['kind'] == EVENT_KINDS.index('toe_off')]
+    next_toe_off = np.searchsorted(toe_offs, strikes)
+    complete = next_toe_off < len(toe_offs)
+    return strikes[complete], toe_offs[next_toe_off[complete]]
+
+
+def step_metrics(timestamps, pressures, pressure_map):
+    """
+    Compute the metrics of one step.
+
+    Args:
+        timestamps (numpy.ndarray): int64 timestamps in ns of the rows of the step.
+        pressures (numpy.ndarray): (rows, 208) pressures in kPa.
+        pressure_map (pressure_map.PressureMap): Layout of the foot.
+
+    Returns:
+        dict: Metric name -> value, for the whole foot and prefixed with each region name.
+    """
+    seconds = (timestamps - timestamps[0]) / 1e9
+    sensor_pti = np.trapezoid(pressures, seconds, axis=0) if len(pressures) > 1 else np.zeros(pressures.shape[1])
+    sensor_peak = pressures.max(axis=0)
+
+    cop = pressure_map.centre_of_pressure(pressures)
+    segment_length = np.hypot(*np.diff(cop, axis=0).T)
+    segment_region = pressure_map.region_index(cop[:-1, 1])
+
+    metrics = {
+        'contact_time_s': seconds[-1],
+        'peak_kpa': sensor_peak.max(),
+        'pti_kpa_s': sensor_pti.max(),
+        'cop_path_mm': np.nansum(segment_length),
+    }
+    regions = pressure_map.region_matrix.astype(bool)
+    for region, name in enumerate(pressure_map.region_names):
+        metrics[f'{name}_peak_kpa'] = sensor_peak[regions[:, region]].max()
+        metrics[f'{name}_pti_kpa_s'] = sensor_pti[regions[:, region]].max()
+        metrics[f'{name}_cop_path_mm'] = np.nansum(segment_length[segment_region == region])
+    return metrics
+
+
+def summarize_recording(path, calibration_path=None):
+    """
+    Returns:
+        dict: Column name -> numpy array with one entry per step of every foot of the recording.
+    """
+    import h5py
+    from recording import sensor_recordings
+    from gait_events import detect_events
+    from pressure_map import PressureMap
+    from velostat_sensor_to_pressure import DEFAULT_CALIBRATION, PressureCalibration
+
+    calibration = PressureCalibration.from_file(calibration_path) if calibration_path else DEFAULT_CALIBRATION
+    rows = []
+    with h5py.File(path, 'r') as file:
+        try:
+            recordings = sensor_recordings(file)
+        except ValueError:
+            # Not a sensor recording (e.g. an earlier summary table in the same folder)
+            return {}
+        for recording in recordings:
+            pressure_map = PressureMap.for_layout(recording.name)
+            starts, stops = step_ranges(detect_events(recording))
+            timestamps = recording.timestamps
+            for step, (start, stop) in enumerate(zip(starts, stops)):
+                pressures = calibration.convert(recording.read(start, stop + 1)) / 1e3
+                metrics = step_metrics(timestamps[start:stop + 1], pressures, pressure_map)
+                rows.append({'foot': recording.name, 'step': step, 'start_ns': timestamps[start], **metrics})
+    if not rows:
+        return {}
+    return {name: np.array([row[name] for row in rows]) for name in rows[0]}
+
+
+def _summarize(job):
+    # Worker entry point of the process pool
+    path, key, calibration_path = job
+    return path, key, summarize_recording(path, calibration_path)
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, f'{key}.npz')
+
+
+def load_cached(key):
+    path = cache_path(key)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        return {name: cached[name] for name in cached.files}
+
+
+def store_cached(key, columns):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.savez(cache_path(key), **columns)
+
+
+def combine(results):
+    """
+    Returns:
+        dict: The columns of all recordings concatenated, with a leading 'file' column.
+    """
+    results = [(path, columns) for path, columns in results if columns]
+    if not results:
+        return {}
+    table = {'file': np.concatenate([np.full(len(columns['step']), path) for path, columns in results])}
+    for name in results[0][1]:
+        table[name] = np.concatenate([columns[name] for _, columns in results])
+    return table
+
+
+def parquet_engine():
+    """
+    Returns:
+        str: Name of the first installed Parquet engine of pandas, or None if there is none.
+    """
+    import importlib.util
+
+    return next((engine for engine in PARQUET_ENGINES if importlib.util.find_spec(engine) is not None), None)
+
+
+def write_table(table, output):
+    """
+    Write the columns as a Parquet file (.parquet, needs pandas with pyarrow) or as HDF5 datasets.
+    """
+    if output.endswith('.parquet'):
+        import pandas as pd
+
+        pd.DataFrame(table).to_parquet(output, engine=parquet_engine() or 'auto', index=False)
+        return
+    import h5py
+
+    with h5py.File(output, 'w') as file:
+        group = file.create_group(SUMMARY_GROUP)
+        for name, column in table.items():
+            if column.dtype.kind == 'U':
+                column = column.astype(h5py.string_dtype())
+            group.create_dataset(name, data=column)
+        group.attrs['columns'] = json.dumps(list(table))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize every step of many recordings in one table.')
+    parser.add_argument('paths', nargs='+', help='HDF5 recordings or folders containing recordings.')
+    parser.add_argument('--output', default='step_summary.h5', help='Summary table (.h5 or .parquet).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes.')
+    parser.add_argument('--calibration', default=None, help='Calibration file with per-cell pressure curves.')
+    parser.add_argument('--no_cache', action='store_true', help='Process every recording again.')
+    args = parser.parse_args(argv)
+    # Checked before any recording is processed, so a missing engine does not discard the results at the very end
+    if args.output.endswith('.parquet') and parquet_engine() is None:
+        parser.error(f"--output {args.output} needs one of the Parquet engines {', '.join(PARQUET_ENGINES)} "
+                     f"(pip install pyarrow), or use an .h5 output.")
+
+    from concurrent.futures import ProcessPoolExecutor
+    from auto_sync import recording_paths
+
+    # The settings are part of the cache key, so a different calibration is computed again
+    settings = f'{SUMMARY_VERSION}:' + (file_hash(args.calibration) if args.calibration else 'default')
+    results, jobs = {}, []
+    paths = [path for path in recording_paths(args.paths) if os.path.abspath(path) != os.path.abspath(args.output)]
+    for path in paths:
+        key = file_hash(path, settings)
+        cached = None if args.no_cache else load_cached(key)
+        if cached is None:
+            jobs.append((path, key, args.calibration))
+        else:
+            results[path] = cached
+    print(f"{len(paths)} recordings, {len(paths) - len(jobs)} from the cache, {len(jobs)} to process")
+
+    if len(jobs) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as executor:
+            processed = list(executor.map(_summarize, jobs))
+    else:
+        processed = [_summarize(job) for job in jobs]
+    for path, key, columns in processed:
+        store_cached(key, columns)
+        results[path] = columns
+
+    for path in paths:
+        columns = results[path]
+        if not columns:
+            print(f"{path}: no complete steps")
+            continue
+        print(f"{path}: {len(columns['step'])} steps, contact {np.mean(columns['contact_time_s']):.2f} s, "
+              f"peak {np.mean(columns['peak_kpa']):.1f} kPa, PTI {np.mean(columns['pti_kpa_s']):.1f} kPa s")
+    table = combine((path, results[path]) for path in paths)
+    if table:
+        write_table(table, args.output)
+        print(f"Summary of {len(table['step'])} steps saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
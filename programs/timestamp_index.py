@@ -0,0 +1,121 @@
+"""
+This module maps timestamps of one stream onto the rows of another stream without nearest-timestamp searches
+over the whole recording. Timestamps are int64 nanoseconds and must be sorted.
+
+A TimestampIndex is built once per recording; afterwards any number of query times (e.g. the times of all video
+frames) are mapped to sensor rows in one vectorized binary search (searchsorted), optionally with linear
+interpolation between the two neighbouring samples.
+
+Usage:
+    from timestamp_index import TimestampIndex, nearest_indices
+
+    index = TimestampIndex(timestamps_ns)
+    rows = index.map_frames(total_frames)  # sensor row for every video frame
+    lower, upper, weight = index.bracket(index.frame_times(total_frames))
+
+    right_rows = nearest_indices(right_timestamps, left_timestamps)  # row of sensor_right closest to each left row
+"""
+
+import numpy as np
+
+
+class TimestampIndex:
+    def __init__(self, timestamps):
+        """
+        Args:
+            timestamps (numpy.ndarray): Sorted timestamps in ns (int64, or float64 as stored in the legacy files).
+        """
+        self.timestamps = np.asarray(timestamps).astype(np.int64)
+        if len(self.timestamps) == 0:
+            raise ValueError("Cannot look up timestamps in an empty stream.")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def nearest(self, query):
+        """
+        Find the row closest to each query time.
+
+        Args:
+            query (numpy.ndarray): int64 timestamps in ns to look up.
+
+        Returns:
+            numpy.ndarray: int64 row index for every query time.
+        """
+        query = np.asarray(query, dtype=np.int64)
+        if len(self.timestamps) == 1:
+            return np.zeros(query.shape, dtype=np.int64)
+        upper = np.clip(np.searchsorted(self.timestamps, query), 1, len(self.timestamps) - 1)
+        lower = upper - 1
+        closer_lower = np.abs(query - self.timestamps[lower]) <= np.abs(self.timestamps[upper] - query)
+        return np.where(closer_lower, lower, upper).astype(np.int64)
+
+    def bracket(self, query):
+        """
+        Find the two rows around each query time and the interpolation weight of the upper one.
+
+        Args:
+            query (numpy.ndarray): int64 timestamps in ns to look up.
+
+        Returns:
+            tuple: (lower, upper, weight); query times outside the recording get the first/last row with weight 0.
+        """
+        query = np.asarray(query, dtype=np.int64)
+        upper = np.clip(np.searchsorted(self.timestamps, query, side='right'), 1, len(self.timestamps) - 1)
+        lower = np.maximum(upper - 1, 0)
+        span = (self.timestamps[upper] - self.timestamps[lower]).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(span > 0, (query - self.timestamps[lower]) / span, 0.0)
+        return lower, upper, np.clip(weight, 0.0, 1.0)
+
+    def interpolate(self, values, query):
+        """
+        Linearly interpolate rows of values at the query times.
+
+        Args:
+            values (numpy.ndarray): Array with one row per timestamp, e.g. (N, 208) pressures.
+            query (numpy.ndarray): int64 timestamps in ns.
+
+        Returns:
+            numpy.ndarray: One interpolated row per query time (float).
+        """
+        lower, upper, weight = self.bracket(query)
+        weight = weight.reshape(weight.shape + (1,) * (values.ndim - 1))
+        return values[lower] * (1 - weight) + values[upper] * weight
+
+    def frame_times(self, n_frames):
+        """
+        Returns:
+            numpy.ndarray: n_frames int64 times evenly spaced from the first to the last timestamp, i.e. the times of
+            the frames of a video that starts and ends with the recording.
+        """
+        start, end = self.timestamps[0], self.timestamps[-1]
+        return start + np.rint(np.linspace(0, end - start, n_frames)).astype(np.int64)
+
+    def map_frames(self, n_frames):
+        """
+        Returns:
+            numpy.ndarray: The row closest to the time of each of n_frames evenly spaced video frames.
+        """
+        return self.nearest(self.frame_times(n_frames))
+
+    def seconds(self, rows):
+        """
+        Returns:
+            numpy.ndarray: Time of the given rows in seconds since the first row.
+        """
+        return (self.timestamps[rows] - self.timestamps[0]) / 1e9
+
+
+def nearest_indices(timestamps, query):
+    """
+    Find the row of timestamps closest to each query time with a binary search (searchsorted).
+
+    Args:
+        timestamps (numpy.ndarray): Sorted int64 timestamps in ns of the reference stream.
+        query (numpy.ndarray): int64 timestamps in ns to look up.
+
+    Returns:
+        numpy.ndarray: int64 row index into timestamps for every query time.
+    """
+    return TimestampIndex(timestamps).nearest(query)
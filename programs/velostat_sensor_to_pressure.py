@@ -6,14 +6,25 @@ Usage:
     This module contains a function `lookup_pressure` which takes a sensor output value and returns the estimated pressure 
     in Pa. It can be imported and used in other scripts as needed.
 
+    Because the raw sensor values are always integers between 0 and 255, a calibration curve can also be compiled
+    into a 256-entry lookup table. `PressureCalibration` converts whole (N, 208) blocks of sensor values with a single
+    indexing operation and supports a separate curve for every sensor cell, loaded from a calibration file.
+
 Example:
     from velostat_sensor_to_pressure import lookup_pressure
     pressure = lookup_pressure(150)
     print(f"Estimated Pressure: {pressure:.2f} Pa")
+
+    from velostat_sensor_to_pressure import DEFAULT_CALIBRATION
+    pressures = DEFAULT_CALIBRATION.convert(sensor_values)  # float32 array in Pa, same shape as sensor_values
+
+Calibration file:
+    A CSV file with the columns sensor_output and pressure_pa, and an optional column sensor_id (1-208).
+    Rows without a sensor_id (or with sensor_id 0) form the curve of all cells that have no curve of their own;
+    if there are no such rows, the built-in curve below is used for them.
 """
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 # Initialize data arrays for sensor output and corresponding pressures in Pascal
 sensor_output = np.array([
@@ -33,8 +44,128 @@ pressure_pa = np.array([
     94542.992579
 ])
 
-# Set up the interpolation function with extrapolation
-_pressure_from_sensor_output = interp1d(sensor_output, pressure_pa, fill_value="extrapolate")
+# The interpolation function with extrapolation is set up on first use, so importing this module does not load scipy
+_pressure_from_sensor_output = None
+
+N_LEVELS = 256  # raw sensor values are uint8
+N_SENSORS = 208
+
+
+def compile_lut(sensor_output, pressure_pa):
+    """
+    Compile a calibration curve into a lookup table with one pressure per raw sensor value.
+
+    Values between the calibration points are interpolated linearly; values outside are extrapolated linearly from
+    the first or last segment, like interp1d(..., fill_value="extrapolate").
+
+    Args:
+        sensor_output (array): Sensor output values of the calibration points.
+        pressure_pa (array): Pressure in Pa of the calibration points.
+
+    Returns:
+        numpy.ndarray: float32 array of length 256.
+
+    Raises:
+        ValueError: If the curve has fewer than two points, non-finite values or repeated sensor outputs.
+    """
+    order = np.argsort(sensor_output)
+    x = np.asarray(sensor_output, dtype=np.float64)[order]
+    y = np.asarray(pressure_pa, dtype=np.float64)[order]
+    if len(x) < 2:
+        raise ValueError(f"A calibration curve needs at least two points, got {len(x)}.")
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        raise ValueError("The calibration curve contains missing or non-finite values.")
+    if len(np.unique(x)) != len(x):
+        raise ValueError("The calibration curve has several points with the same sensor output.")
+    levels = np.arange(N_LEVELS, dtype=np.float64)
+    lut = np.interp(levels, x, y)
+    below = levels < x[0]
+    above = levels > x[-1]
+    lut[below] = y[0] + (levels[below] - x[0]) * (y[1] - y[0]) / (x[1] - x[0])
+    lut[above] = y[-1] + (levels[above] - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2])
+    return lut.astype(np.float32)
+
+
+class PressureCalibration:
+    def __init__(self, luts):
+        """
+        Args:
+            luts (numpy.ndarray): Lookup tables of shape (256,) for one curve shared by all cells, or (n_cells, 256)
+                for one curve per sensor cell.
+        """
+        luts = np.asarray(luts, dtype=np.float32)
+        self.per_cell = luts.ndim == 2
+        self.luts = luts
+        if self.per_cell:
+            # Flattened table; each cell's values are offset into its own 256-entry block
+            self._flat = np.ascontiguousarray(luts).ravel()
+            self._offsets = np.arange(luts.shape[0], dtype=np.intp) * N_LEVELS
+
+    @classmethod
+    def from_curve(cls, sensor_output, pressure_pa):
+        return cls(compile_lut(sensor_output, pressure_pa))
+
+    @classmethod
+    def from_file(cls, path, n_sensors=N_SENSORS):
+        """
+        Load a calibration file (see the module docstring for the format).
+
+        Args:
+            path (str): Path to the CSV calibration file.
+            n_sensors (int): Number of sensor cells.
+
+        Returns:
+            PressureCalibration: With one curve per cell if the file has a sensor_id column, otherwise one shared curve.
+
+        Raises:
+            ValueError: If a sensor_id is out of range or a curve (the shared one or a cell's) cannot be compiled,
+                e.g. because it has fewer than two points.
+        """
+        # A file with a single row is read as a 0-d array
+        table = np.atleast_1d(np.genfromtxt(path, delimiter=',', names=True))
+
+        def curve(rows, name):
+            try:
+                return compile_lut(table['sensor_output'][rows], table['pressure_pa'][rows])
+            except ValueError as e:
+                raise ValueError(f"Invalid calibration curve of {name} in {path}: {e}") from e
+
+        if 'sensor_id' not in table.dtype.names:
+            return cls(curve(slice(None), 'the file'))
+
+        sensor_ids = np.nan_to_num(table['sensor_id']).astype(int)
+        shared = sensor_ids == 0
+        default_lut = curve(shared, 'sensor_id 0') if shared.any() else compile_lut(sensor_output, pressure_pa)
+        luts = np.tile(default_lut, (n_sensors, 1))
+        for sensor_id in np.unique(sensor_ids[~shared]):
+            if not 1 <= sensor_id <= n_sensors:
+                raise ValueError(f"Invalid sensor_id {sensor_id} in {path}.")
+            luts[sensor_id - 1] = curve(sensor_ids == sensor_id, f'sensor_id {sensor_id}')
+        return cls(luts)
+
+    def convert(self, sensor_values):
+        """
+        Convert raw sensor values to pressure in Pa with a single table lookup.
+
+        Args:
+            sensor_values (numpy.ndarray): Raw values between 0 and 255, e.g. a (N, 208) block. Float input (as stored
+                in the legacy float64 files) is rounded to the nearest integer.
+
+        Returns:
+            numpy.ndarray: float32 pressures in Pa with the same shape as sensor_values.
+        """
+        sensor_values = np.asarray(sensor_values)
+        if sensor_values.dtype != np.uint8:
+            sensor_values = np.clip(np.rint(sensor_values), 0, N_LEVELS - 1).astype(np.uint8)
+        if not self.per_cell:
+            return self.luts[sensor_values]
+        if sensor_values.shape[-1] != len(self._offsets):
+            raise ValueError(f"Expected {len(self._offsets)} sensor cells, got {sensor_values.shape[-1]}.")
+        return np.take(self._flat, sensor_values + self._offsets)
+
+
+DEFAULT_CALIBRATION = PressureCalibration.from_curve(sensor_output, pressure_pa)
+
 
 def lookup_pressure(sensor_value):
     """
@@ -46,4 +177,8 @@ def lookup_pressure(sensor_value):
     Returns:
         float: The estimated pressure in Pa.
     """
+    global _pressure_from_sensor_output
+    if _pressure_from_sensor_output is None:
+        from scipy.interpolate import interp1d
+        _pressure_from_sensor_output = interp1d(sensor_output, pressure_pa, fill_value="extrapolate")
     return _pressure_from_sensor_output(sensor_value)
@@ -0,0 +1,145 @@
+"""
+This module provides the outputs rendered frames are written to.
+
+    PngSink         : one PNG file per frame (the previous behaviour of viz_generate_frames.py)
+    OpenCVVideoSink : raw RGB frames encoded directly with cv2.VideoWriter
+    FfmpegPipeSink  : raw RGB frames piped into an ffmpeg subprocess (e.g. libx264)
+    QueuedSink      : wraps a sink and encodes on a background thread, fed through a bounded frame queue
+
+Streaming the canvas buffers straight into an encoder avoids writing, listing and decoding one PNG per frame.
+
+Usage:
+    sink = open_sink('walk.mp4', fps=30, size=(2920, 1600), encoder='ffmpeg')
+    sink.write(frame_number, rgb)
+    sink.close()
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from instrumentation import timer
+
+ENCODERS = ('cv2', 'ffmpeg')
+QUEUE_FRAMES = 16  # frames buffered between rendering and encoding
+
+
+class PngSink:
+    def __init__(self, output_dir):
+        import cv2
+
+        self.cv2 = cv2
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, frame_number, rgb):
+        path = os.path.join(self.output_dir, f'frame_{frame_number:04d}.png')
+        with timer('encode'):
+            self.cv2.imwrite(path, self.cv2.cvtColor(rgb, self.cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        pass
+
+
+class OpenCVVideoSink:
+    def __init__(self, path, fps, size, fourcc='mp4v'):
+        import cv2
+
+        self.cv2 = cv2
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"Could not open {path} for writing with fourcc {fourcc}.")
+
+    def write(self, frame_number, rgb):
+        with timer('encode'):
+            self.writer.write(self.cv2.cvtColor(rgb, self.cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        self.writer.release()
+
+
+class FfmpegPipeSink:
+    def __init__(self, path, fps, size, codec='libx264', crf=20):
+        import numpy as np
+
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg was not found; install it or use the cv2 encoder.")
+        width, height = size
+        command = [ffmpeg, '-loglevel', 'error', '-y',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                   '-c:v', codec, '-crf', str(crf), '-pix_fmt', 'yuv420p', path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.np = np
+
+    def write(self, frame_number, rgb):
+        with timer('encode'):
+            self.process.stdin.write(memoryview(self.np.ascontiguousarray(rgb)))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}.")
+
+
+class QueuedSink:
+    """
+    Encode on a background thread. write() copies the frame (the renderer reuses its buffer) and blocks when
+    max_frames frames are waiting, which bounds the memory used between rendering and encoding.
+    """
+
+    def __init__(self, sink, max_frames=QUEUE_FRAMES):
+        self.sink = sink
+        self.frames = queue.Queue(max_frames)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='encoder', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self.sink.write(*item)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, frame_number, rgb):
+        if self.error is not None:
+            raise self.error
+        # Time the renderer waits for the encoder when the queue is full
+        with timer('encode_queue_wait'):
+            self.frames.put((frame_number, rgb.copy()))
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+
+def open_sink(output, fps=None, size=None, encoder='cv2', queue_frames=QUEUE_FRAMES):
+    """
+    Args:
+        output (str): A video file (.mp4, .avi, ...) to stream into, or a folder for PNG frames.
+        fps (float): Frame rate of the video.
+        size (tuple): (width, height) of the frames.
+        encoder (str): 'cv2' or 'ffmpeg' for video files.
+        queue_frames (int): Size of the frame queue in front of a video encoder.
+
+    Returns:
+        A sink with write(frame_number, rgb) and close().
+    """
+    if os.path.splitext(output)[1] == '':
+        return PngSink(output)
+    if encoder == 'ffmpeg':
+        sink = FfmpegPipeSink(output, fps, size)
+    elif encoder == 'cv2':
+        sink = OpenCVVideoSink(output, fps, size)
+    else:
+        raise ValueError(f"Unknown encoder: {encoder}")
+    return QueuedSink(sink, queue_frames)
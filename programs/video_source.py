@@ -0,0 +1,159 @@
+"""
+This module reads the frames of the walking video for the renderer (parallel_render.py).
+
+Phone videos (.MOV/.mp4) have long groups of pictures, so every seek (CAP_PROP_POS_FRAMES) decodes again from the
+previous keyframe. A VideoSource therefore seeks at most once per call of frames() and then decodes sequentially on a
+background thread, which fills a bounded prefetch queue while the renderer draws the previous frames. Each frame is
+downscaled to the size it is displayed at (never upscaled) right after decoding, so the queue holds small frames and
+matplotlib does not resample the full-resolution image for every frame.
+
+The source also maps its frames to the sensor rows: output frame n is video frame first_frame + n, and because the
+video starts and ends with the recording, the n_frames frames are spread evenly over the timestamps of the recording.
+
+Usage:
+    source = VideoSource('walk.MOV', first_frame=27, n_frames=500)
+    frame_rows, interpolation = source.sensor_rows(TimestampIndex(timestamps))
+    source.size = (960, 540)  # display size, e.g. FrameRenderer.video_display_size()
+    for frame_number, rgb in source.frames(0, 100):
+        ...
+    source.close()
+"""
+
+import queue
+import threading
+from instrumentation import timer
+
+PREFETCH_FRAMES = 16  # decoded frames waiting for the renderer
+PUT_TIMEOUT = 0.1  # seconds; the reader checks this often whether the consumer stopped
+
+
+class VideoSource:
+    def __init__(self, path, first_frame=0, n_frames=None, size=None, prefetch=PREFETCH_FRAMES):
+        """
+        Args:
+            path (str): Path to the video file.
+            first_frame (int): Video frame shown as output frame 0, e.g. the start frame found by auto_sync.py.
+            n_frames (int): Number of output frames; defaults to the rest of the video.
+            size (tuple): Optional (width, height) the frames are downscaled to fit into.
+            prefetch (int): Maximum number of decoded frames waiting in the queue.
+        """
+        import cv2
+
+        self.cv2 = cv2
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Could not open video {path}.")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.first_frame = first_frame
+        self.n_frames = self.frame_count - first_frame if n_frames is None else n_frames
+        self.size = size
+        self.prefetch = prefetch
+        self.position = 0  # next video frame of the sequential reader
+        self.held = None  # (frame_number, BGR image) of the last read(), so frames() does not decode it again
+
+    def __len__(self):
+        return self.n_frames
+
+    def sensor_rows(self, index, interpolate=False):
+        """
+        Map every output frame to the sensor rows shown with it.
+
+        Args:
+            index (timestamp_index.TimestampIndex): Timestamps of the recording the video starts and ends with.
+            interpolate (bool): Also return the rows and weights to interpolate between the two nearest rows.
+
+        Returns:
+            tuple: (frame_rows, interpolation) with the nearest row of each frame and (lower, upper, weight) or None.
+        """
+        with timer('timestamp_lookup'):
+            frame_times = index.frame_times(self.n_frames)
+            return index.nearest(frame_times), index.bracket(frame_times) if interpolate else None
+
+    def convert(self, frame):
+        # Downscale before the colour conversion, which is then cheaper as well
+        if self.size is not None and (frame.shape[1] > self.size[0] or frame.shape[0] > self.size[1]):
+            scale = min(self.size[0] / frame.shape[1], self.size[1] / frame.shape[0])
+            width, height = max(1, round(frame.shape[1] * scale)), max(1, round(frame.shape[0] * scale))
+            frame = self.cv2.resize(frame, (width, height), interpolation=self.cv2.INTER_AREA)
+        return self.cv2.cvtColor(frame, self.cv2.COLOR_BGR2RGB)
+
+    def _seek(self, video_frame):
+        # Only when the requested frame is not the next one of the sequential reader
+        if video_frame != self.position:
+            with timer('video_seek'):
+                self.cap.set(self.cv2.CAP_PROP_POS_FRAMES, video_frame)
+            self.position = video_frame
+
+    def _decode(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            # Past the end of the video; the position is unknown, so the next call seeks again
+            self.position = -1
+            return None
+        self.position += 1
+        return frame
+
+    def read(self, frame_number):
+        """
+        Returns:
+            numpy.ndarray: RGB image of output frame frame_number (downscaled to size), or None if the video is shorter.
+        """
+        self._seek(self.first_frame + frame_number)
+        with timer('video_read'):
+            frame = self._decode()
+        self.held = (frame_number, frame) if frame is not None else None
+        return None if frame is None else self.convert(frame)
+
+    def frames(self, start=0, stop=None):
+        """
+        Decode output frames start:stop ahead on a background thread.
+
+        Yields:
+            tuple: (frame_number, rgb) in order; rgb is None for frames beyond the end of the video.
+        """
+        stop = self.n_frames if stop is None else stop
+        frames = queue.Queue(self.prefetch)
+        stop_event = threading.Event()
+        reader = threading.Thread(target=self._read_ahead, args=(start, stop, frames, stop_event),
+                                  name='video-reader', daemon=True)
+        reader.start()
+        try:
+            for frame_number in range(start, stop):
+                item = frames.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield frame_number, item
+        finally:
+            stop_event.set()
+            reader.join()
+
+    def _read_ahead(self, start, stop, frames, stop_event):
+        try:
+            held, self.held = self.held, None
+            if held is None or held[0] != start:
+                held = None
+                self._seek(self.first_frame + start)
+            for frame_number in range(start, stop):
+                with timer('video_read'):
+                    frame = held[1] if held is not None and frame_number == start else self._decode()
+                    item = None if frame is None else self.convert(frame)
+                if not self._put(frames, item, stop_event):
+                    return
+        except Exception as e:
+            self._put(frames, e, stop_event)
+
+    @staticmethod
+    def _put(frames, item, stop_event):
+        # Wait for space in the queue, unless the consumer stopped iterating
+        while not stop_event.is_set():
+            try:
+                frames.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def close(self):
+        self.cap.release()
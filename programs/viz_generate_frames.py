@@ -8,6 +8,19 @@ Command Line Arguments:
     hdf5_path1 : Specifies the path to the first HDF5 file containing Velostat sensor pressure data.
     hdf5_path2 : Specifies the path to the second HDF5 file containing Velostat sensor pressure data.
     video_path : Path to the video file synchronized with the force data (Requires same start and end time as the data)
+    --index_start, --index_end : Rows of the recording the video starts and ends with. By default they are taken from
+        the sync file written by auto_sync.py (recording.sync.json), or detected automatically if there is none.
+    --calibration : Optional calibration file with one pressure curve per sensor cell (see velostat_sensor_to_pressure.py)
+    --interpolate : Interpolate the sensor values between the two samples around each video frame
+    --heatmap : Draw the interpolated pressure map and the centre of pressure of each foot (pressure_map.py)
+    --output_dir : Folder the PNG frames are written to (default frames/nrshoes_stone2)
+    --video_output : Stream the frames straight into this video file instead of writing PNG frames
+    --encoder : Encoder of --video_output, cv2 (VideoWriter, mp4v) or ffmpeg (libx264 through a pipe)
+    --fps : Frame rate of --video_output (default: frame rate of the input video)
+    --workers, --chunk_size, --memory_limit_mb : Render contiguous segments of the timeline in parallel processes
+    --instrument : Time the timestamp lookup, video seek/read, scatter update, drawing and encoding of every frame and
+        save a JSON report to this file (instrumentation.py)
+    --profile : cProfile the rendering and save the statistics to this file (renders in one process)
     e.g. python viz_generate_frames.py data/2024-07-25_normal_shoes/nrshoes_left_stone2.h5 data/2024-07-25_normal_shoes/nrshoes_left_stone2.MOV
 
 Usage:
@@ -16,82 +29,68 @@ Usage:
 
 Features:
     - Reads and processes force data from HDF5 files, including data about sensor positions and timestamps.
+    - Cuts the data to the first and last flat-foot peak found by auto_sync.py; if the sync file also contains the
+      matching video frames with enough confidence, only that part of the video is rendered.
     - Displays synchronized video alongside real-time sensor data visualizations.
-    - Uses a color-mapped scatter plot to represent sensor data on images of the sensor layout.
+    - Uses a color-mapped scatter plot to represent sensor data on images of the sensor layout, optionally on top of
+      a continuous pressure map with the centre of pressure.
+    - Renders with pressure_renderer.FrameRenderer: the static parts of the figure are drawn once, and each frame only
+      redraws the video image, one scatter collection per foot and the time marker.
+    - Reads the video with video_source.VideoSource: frames are decoded sequentially ahead of the rendering on a
+      background thread and downscaled to the size they are displayed at, instead of seeking for every frame.
     - Dynamically updates visualizations as the video progresses to show changes in force over time.
     - Allows examination of average pressure over time in a shared x-axis plot for comparison between two datasets.
-    - Saves each frame of the visualization to an output directory for further use or examination.
+    - Saves each frame of the visualization to an output directory for further use or examination, or streams the
+      rendered frames straight into a video encoder (--video_output) without intermediate PNG files.
 """
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
-import h5py
-import cv2
-import os
-from datetime import datetime
-import matplotlib.dates as mdates
-from matplotlib.colors import LogNorm
-from matplotlib.gridspec import GridSpec
-from matplotlib.ticker import LogLocator, ScalarFormatter
 import argparse
-from velostat_sensor_to_pressure import lookup_pressure
-from scipy.signal import find_peaks, butter, filtfilt
-
+import os
+import time
+from sensor_layout import load_layout, read_alignment
+from video_sink import ENCODERS
+from auto_sync import read_sync, detect_sensor_sync, MIN_CONFIDENCE
+import instrumentation
 
-# Parse command line arguments for the HDF5 files
-parser = argparse.ArgumentParser(description='Visualize force data from two HDF5 files with sensor maps.')
-parser.add_argument('hdf5_path1', help='Path to the first HDF5 file containing force data.')
-parser.add_argument('video_path', help='Path to the video file synchronized with the force data.')
-args = parser.parse_args()
 
+def load_data(hdf5_path, index_start=None, index_end=None):
+    import h5py
+    from recording import sensor_recordings
 
-def load_data(hdf5_path):
     with h5py.File(hdf5_path, 'r') as file:
-        dataset_name = list(file.keys())[0]
-        # if dataset_name == 'e-skin':
-        #     points_df = pd.read_csv('config/e-skin_foot_force_cell_positions.csv')
-        #     image_path = 'images/e-skin_foot_sensor.png'
-        #     image_height_mm = 314
-        #     scatter_size = 350
-        #     label = 'E-Skin Shoe Right'
-        # elif dataset_name == 'sensor_data':
-        #     points_df = pd.read_csv('config/foil_sensor_positions_right.csv')
-        #     image_path = 'images/foot_sole_sensor_scan_right.png'
-        #     image_height_mm = 255
-        #     scatter_size = 150
-        #     label = 'Velostat Sensor Right'
-        
-        # our sensor is labeled with 'Velostat Sensor **'
-        if dataset_name == 'sensor_left':
-            points_df = pd.read_csv('config/foil_sensor_positions_left.csv')
-            image_path = 'images/foot_sole_sensor_scan_left.png'
-            image_height_mm = 255
-            scatter_size = 150
-            label = 'Velostat Sensor Left'
-            
-        else:
-            raise ValueError("HDF5 dataset not supported.")
-        
-        data = file[dataset_name][:]
-
-        # Remember to modify this if your walking video and the collected data are not synchronized.
-        # You can use "index_find.py" to find the corresponding values of index_start and index_end for each set of collected data.
-        index_start= 27
-        index_end = 151
-
-        # timestamps = [datetime.fromtimestamp(ts / 1e9) for ts in data[:, 0]]
-        timestamps = [datetime.fromtimestamp(ts / 1e9) for ts in data[index_start:index_end, 0]]
+        # Files logged with --log_both contain both feet; the first foot defines the timeline
+        recordings = sensor_recordings(file)
+        first = recordings[0]
+
+        # The walking video starts and ends with the first and last flat-foot peak. Without indices from the command
+        # line or the sync file of auto_sync.py, the peaks are detected here (see auto_sync.py and index_find.py).
+        if index_start is None or index_end is None:
+            sync = detect_sensor_sync(first.timestamps, first.view().values())
+            print(f"Detected sync peaks: index_start {sync['index_start']}, index_end {sync['index_end']}")
+            index_start = sync['index_start'] if index_start is None else index_start
+            index_end = sync['index_end'] if index_end is None else index_end
+
+        # Only the synchronized rows are read; timestamps stay int64 nanoseconds and sensor values uint8
+        view = first.view()[index_start:index_end]
+        timestamps = view.timestamps
         
-        # sensor_values = data[:, 1:]
-        # sensor_values = data[60:355,1:]
-        sensor_values = data[index_start:index_end,1:]
-        points_df = points_df.sort_values(by='ID', na_position='first')
+        feet = []
+        for recording in recordings:
+            points_df, image_path, image_height_mm, scatter_size, label = load_layout(recording.name)
+            if recording is first:
+                sensor_values = view.values()
+            else:
+                # Rows of the other foot closest in time to each row of the first foot, stored by the logger
+                rows = read_alignment(file, first.name, recording.name)[index_start:index_end]
+                sensor_values = recording.take(rows)
+            feet.append((sensor_values, points_df, image_path, image_height_mm, scatter_size, label))
         
-        return timestamps, sensor_values, points_df, image_path, image_height_mm, scatter_size, label
+        return timestamps, feet, [recording.name for recording in recordings]
     
 
 def create_video_from_frames(frames_directory, output_video_path, fps):
+    import cv2
+
     # Get the list of frame files
     frame_files = [f for f in sorted(os.listdir(frames_directory)) if f.endswith('.png')]
     # Read the first frame to get the frame size
@@ -112,128 +111,105 @@ def create_video_from_frames(frames_directory, output_video_path, fps):
     print(f"Video saved to {output_video_path}")
 
 
-timestamps1, sensor_values1, points_df1, image_path1, image_height_mm1, scatter_size1, label1 = load_data(args.hdf5_path1)
-
-# Convert sensor value to pressure in kPA
-sensor_values1 = lookup_pressure(sensor_values1) / 1e3
-
-# Create main figure and subplots
-fig = plt.figure(figsize=(14.6, 8))
-gs = GridSpec(2, 11, figure=fig)
-ax0 = fig.add_subplot(gs[0, :5])
-ax1 = fig.add_subplot(gs[1, :5])
-ax2 = fig.add_subplot(gs[:, 5:8])
-
-# Load the video
-cap = cv2.VideoCapture(args.video_path)
-fps = cap.get(cv2.CAP_PROP_FPS)
-total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-# Video display in ax0
-frame_number = 0
-ret, frame = cap.read()
-frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-im_video = ax0.imshow(frame)
-ax0.axis('off')  # Hide axes
-
-# Plotting the time series in ax1
-ax1.plot(timestamps1, np.mean(sensor_values1, axis=1), label=label1)
-ax1.set_title('Average Pressure Over Time')
-ax1.set_xlabel('UTC Time')
-ax1.set_ylabel('Average Pressure (kPa)')
-locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
-formatter = mdates.ConciseDateFormatter(locator)
-ax1.xaxis.set_major_locator(locator)
-ax1.xaxis.set_major_formatter(formatter)
-# ax1.set_xlim([min(timestamps1[0], timestamps2[0]), max(timestamps1[-1], timestamps2[-1])])
-ax1.grid(True)
-ax1.legend()
-
-# Set the y-axis limit
-ax1.set_ylim(top=8)
-
-# Vertical line on the time series plot
-vline = ax1.axvline(timestamps1[0], color='r')
-
-# Color normalization
-norm = LogNorm(vmin=sensor_values1.min()*3.0, vmax=65) # vmax=sensor_values1.max()*0.7, 
-
-# Setting up scatter plots
-scatters1 = []
-scatters2 = []
-sensor_mask1 = np.zeros(sensor_values1.shape[1], dtype=bool) 
-for ax, image_path, image_height_mm, scatter_size, points_df, sensor_values, sensor_mask, label in zip(
-    [ax2],
-    [image_path1],
-    [image_height_mm1],
-    [scatter_size1],
-    [points_df1],
-    [sensor_values1],
-    [sensor_mask1],
-    [label1]):
-    
-    image = plt.imread(image_path)
-    image_width_mm = (image.shape[1] / image.shape[0]) * image_height_mm
-    ax.imshow(image, extent=[0, image_width_mm, 0, image_height_mm], cmap='gray', alpha=0.2)
-    ax.set_title(label)
-    ax.set_xlabel('Width (mm)')
-    ax.set_ylabel('Height (mm)')
-
-    # Scatter plot for sensor data
-    scatters = []
-    for index, row in points_df.iterrows():
-        sensor_id = int(row['ID']) - 1
-        sensor_mask[sensor_id] = True
-        sensor_value = sensor_values[0, sensor_id]
-        scatter = ax.scatter(row['X_in_mm'], row['Y_in_mm'], color=plt.cm.jet(norm(sensor_value)), s=scatter_size)
-        scatters.append(scatter)
-    if ax == ax2:
-        scatters1 = scatters
-    else:
-        scatters2 = scatters
-
-# Colorbar setup
-sm = plt.cm.ScalarMappable(cmap='jet', norm=norm)
-cbar = plt.colorbar(sm, ax=ax2, label='Pressure (kPa)')
-
-# Define the number of ticks using LogLocator
-locator = LogLocator(subs='all')
-cbar.ax.yaxis.set_major_locator(locator)
-
-# Formatter for the Colorbar ticks
-formatter = ScalarFormatter()
-formatter.set_scientific(False)
-cbar.ax.yaxis.set_major_formatter(formatter)
-
-# Create a directory to store frames
-output_dir = 'frames/nrshoes_stone2'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-plt.tight_layout()
-
-for frame_number , time in enumerate(np.linspace(timestamps1[0], timestamps1[-1], total_frames)):
-    # Extract index nearest to selected time
-    idx1 = (np.abs(np.array(mdates.date2num(timestamps1)) - mdates.date2num(time))).argmin()
-    
-    # Update the video frame
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-    ret, frame = cap.read()
-    if ret:
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        im_video.set_data(frame)
-    
-    # Update Scatter
-    new_data1 = sensor_values1[idx1, sensor_mask1]
-    for scatter, new_value in zip(scatters1, new_data1):
-        scatter.set_facecolor(plt.cm.jet(norm(new_value)))
-        scatter.set_edgecolor(plt.cm.jet(norm(new_value)))
-    fig.canvas.draw_idle()
-    
-    # Update the marker line
-    vline.set_xdata([timestamps1[idx1], timestamps1[idx1]])
-    
-    plt.savefig(os.path.join(output_dir, f'frame_{frame_number:04d}.png'), dpi=200)
+def main(argv=None):
+    # Parse command line arguments for the HDF5 files
+    parser = argparse.ArgumentParser(description='Visualize force data from two HDF5 files with sensor maps.')
+    parser.add_argument('hdf5_path1', help='Path to the first HDF5 file containing force data.')
+    parser.add_argument('video_path', help='Path to the video file synchronized with the force data.')
+    parser.add_argument('--index_start', type=int, default=None, help='First row of the recording (default: from the sync file).')
+    parser.add_argument('--index_end', type=int, default=None, help='End row of the recording (default: from the sync file).')
+    parser.add_argument('--calibration', default=None, help='Calibration file with per-cell pressure curves.')
+    parser.add_argument('--interpolate', action='store_true', help='Interpolate the sensor values between the two samples around each video frame.')
+    parser.add_argument('--heatmap', action='store_true', help='Draw the pressure map and centre of pressure of each foot.')
+    parser.add_argument('--output_dir', default='frames/nrshoes_stone2', help='Folder the PNG frames are written to.')
+    parser.add_argument('--video_output', default=None, help='Video file the frames are streamed into instead of PNG files.')
+    parser.add_argument('--encoder', choices=ENCODERS, default='cv2', help='Encoder used for --video_output.')
+    parser.add_argument('--fps', type=float, default=None, help='Frame rate of --video_output (default: frame rate of the input video).')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes rendering frames in parallel.')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Frames per contiguous segment given to a worker.')
+    parser.add_argument('--memory_limit_mb', type=float, default=None, help='Memory limit for all workers; fewer workers are started if needed.')
+    parser.add_argument('--instrument', default=None, help='Time the rendering stages and save a JSON report to this file.')
+    parser.add_argument('--profile', default=None, help='cProfile the rendering (in one process) and save the statistics to this file.')
+    args = parser.parse_args(argv)
+
+    instrumentation.enable(args.instrument is not None)
+    profiler = None
+    if args.profile:
+        # The profile only covers the calling process, so the frames are not rendered by worker processes
+        if args.workers > 1:
+            print("Profiling renders all frames in one process.")
+            args.workers = 1
+        profiler = instrumentation.Profiler(args.profile)
+        profiler.start()
+    start = time.monotonic()
+
+    # Heavy dependencies are imported only when frames are actually generated
+    from velostat_sensor_to_pressure import DEFAULT_CALIBRATION, PressureCalibration
+    from timestamp_index import TimestampIndex
+    from parallel_render import RenderJob, render_frames
+    from pressure_renderer import frame_size
+    from video_sink import open_sink
+    from video_source import VideoSource
+
+    # Sync points stored by auto_sync.py; command line indices take precedence
+    sync = read_sync(args.hdf5_path1) or {}
+    index_start = sync.get('index_start') if args.index_start is None else args.index_start
+    index_end = sync.get('index_end') if args.index_end is None else args.index_end
+    timestamps1, feet, dataset_names = load_data(args.hdf5_path1, index_start, index_end)
+    index1 = TimestampIndex(timestamps1)
+
+    # Convert sensor value to pressure in kPA
+    calibration = PressureCalibration.from_file(args.calibration) if args.calibration else DEFAULT_CALIBRATION
+    sensor_values = [calibration.convert(foot[0]) / 1e3 for foot in feet]
+
+    # Only the video frames between the two sync events, if auto_sync.py found them in the video with enough
+    # confidence (sidecars of older versions have none and are not trusted)
+    first_frame, n_frames = 0, None
+    if 'video' in sync:
+        confidence = sync['video'].get('confidence', 0.0)
+        if confidence >= MIN_CONFIDENCE:
+            first_frame = sync['video']['start_frame']
+            n_frames = sync['video']['end_frame'] - first_frame
+            print(f"Video frames {first_frame}-{sync['video']['end_frame']} from the sync file (confidence {confidence:.2f})")
+        else:
+            print(f"The video sync events of the sync file have a low confidence ({confidence:.2f}) and are ignored; "
+                  f"the whole video is used. Check them and set their confidence to 1, or run auto_sync.py --video "
+                  f"--overwrite.")
+    # Frame count, frame rate and frame times of the video; the workers open their own sources to decode it
+    video = VideoSource(args.video_path, first_frame, n_frames)
+    video.close()
+    total_frames = video.n_frames
+
+    # Sensor row nearest to the time of every video frame, found in one vectorized pass
+    frame_rows, interpolation = video.sensor_rows(index1, args.interpolate)
+
+    # Sensor-to-grid weights of each foot, computed once per layout and cached on disk
+    pressure_maps = None
+    if args.heatmap:
+        from pressure_map import PressureMap
+
+        pressure_maps = [PressureMap.for_layout(name) for name in dataset_names]
+
+    # Each worker draws the static parts of its figure once; each frame only redraws video, scatters and time marker
+    job = RenderJob(args.video_path, timestamps1, sensor_values, [foot[1:] for foot in feet], frame_rows,
+                    args.output_dir, interpolation, first_frame, pressure_maps)
+    sink = None
+    if args.video_output:
+        sink = open_sink(args.video_output, args.fps or video.fps, frame_size(), args.encoder)
+    render_frames(job, workers=args.workers, chunk_size=args.chunk_size, memory_limit_mb=args.memory_limit_mb, sink=sink)
+    if args.video_output:
+        print(f"Video saved to {args.video_output}")
+    if profiler:
+        profiler.stop()
+    if args.instrument:
+        print(instrumentation.summary())
+        instrumentation.write_report(args.instrument, program='viz_generate_frames', recording=args.hdf5_path1,
+                                     video=args.video_path, frames=int(total_frames), workers=args.workers,
+                                     duration_s=time.monotonic() - start)
+        print(f"Instrumentation report saved to {args.instrument}")
+
+if __name__ == '__main__':
+    main()
 
 
 # # Define the frames directory and output video path, if you want to use def create_video_from_frames()